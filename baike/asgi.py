@@ -0,0 +1,14 @@
+"""
+ASGI config for baike project.
+
+检索、词条详情和统计使用异步视图（见baike.asgi_urls），其余接口与WSGI相同。
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'baike.settings')
+os.environ.setdefault('ROOT_URLCONF', 'baike.asgi_urls')
+
+application = get_asgi_application()
@@ -0,0 +1,12 @@
+"""ASGI入口使用的URL配置：读多写少的接口由异步视图处理，其余沿用baike.urls"""
+
+from django.urls import include, path
+
+from encyclopedia import async_views
+
+urlpatterns = [
+    path('api/entries/<int:pk>/', async_views.entry_detail, name='entry-detail'),
+    path('api/search/', async_views.search, name='search-list'),
+    path('api/encyclopedia/statistics/', async_views.statistics, name='statistics'),
+    path('', include('baike.urls')),
+]
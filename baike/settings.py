@@ -3,10 +3,12 @@ Django settings for baike project.
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
+# 运行时生成的文件缓存和指标快照，已加入.gitignore；测试运行时由baike.test_runner换成临时目录
+RUNTIME_DIR = BASE_DIR / 'var'
 
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = config('SECRET_KEY', default='django-insecure-your-secret-key-here')
@@ -36,17 +38,20 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'encyclopedia.instrumentation.ServerTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'encyclopedia.routing.ReadRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'baike.urls'
+# ASGI入口把它设为baike.asgi_urls，以异步视图处理检索、词条详情和统计
+ROOT_URLCONF = config('ROOT_URLCONF', default='baike.urls')
 
 TEMPLATES = [
     {
@@ -65,15 +70,92 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'baike.wsgi.application'
+ASGI_APPLICATION = 'baike.asgi.application'
 
 # Database
+# DATABASE_PROFILE=tuned时为SQLite开启WAL等连接参数、持久连接和BEGIN IMMEDIATE写事务，
+# 见encyclopedia.sqlite；stock保持SQLite默认行为
+DATABASE_PROFILE = config('DATABASE_PROFILE', default='stock')
+SQLITE_TUNED = DATABASE_PROFILE == 'tuned'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=600 if SQLITE_TUNED else 0, cast=int),
+        'CONN_HEALTH_CHECKS': SQLITE_TUNED,
     }
 }
 
+# 只读副本与分析库：DATABASE_REPLICAS为逗号分隔的别名，DATABASE_ANALYTICS为统计查询的别名，
+# 本地每个别名对应一个SQLite文件（db.<别名>.sqlite3），由 manage.py sync_replicas 从主库复制
+DATABASE_REPLICAS = config('DATABASE_REPLICAS', default='', cast=Csv())
+DATABASE_ANALYTICS = config('DATABASE_ANALYTICS', default='')
+for _alias in [*DATABASE_REPLICAS, DATABASE_ANALYTICS]:
+    if _alias and _alias not in DATABASES:
+        DATABASES[_alias] = {
+            **DATABASES['default'],
+            'NAME': BASE_DIR / f'db.{_alias}.sqlite3',
+            'TEST': {'MIRROR': 'default'},
+        }
+
+DATABASE_ROUTERS = ['encyclopedia.routing.ReplicaRouter']
+# 写请求之后该客户端继续读主库的秒数
+READ_YOUR_WRITES_SECONDS = config('READ_YOUR_WRITES_SECONDS', default=5, cast=int)
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    'cache_size': config('SQLITE_CACHE_SIZE', default=-64000, cast=int),
+    'temp_store': 'MEMORY',
+} if SQLITE_TUNED else {}
+# 事务以BEGIN IMMEDIATE开启，写锁只在事务期间持有，等待时间由busy_timeout决定
+SQLITE_SERIALIZE_WRITES = config('SQLITE_SERIALIZE_WRITES', default=SQLITE_TUNED, cast=bool)
+
+# Cache
+# entry_detail缓存词条详情的公共部分，entry_version保存使其失效的版本号。各进程必须共用这两个缓存，
+# 否则一个进程（包括run_jobs）的修改不会让其他进程的缓存失效。默认是同一台机器上
+# 所有进程共享的文件缓存；多台机器部署时改为
+# django.core.cache.backends.db.DatabaseCache（LOCATION为表名，需先执行createcachetable）。
+# 只有单进程运行时才可改为进程内的locmem.LocMemCache。
+# entry_version不能淘汰版本号，MAX_ENTRIES应远大于词条、用户和分类数之和
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'auth_generation': {
+        'BACKEND': config('AUTH_CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('AUTH_CACHE_LOCATION', default=str(RUNTIME_DIR / 'cache' / 'auth-generation')),
+    },
+    'entry_detail': {
+        'BACKEND': config('ENTRY_CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('ENTRY_CACHE_LOCATION', default=str(RUNTIME_DIR / 'cache' / 'entry-detail')),
+        'TIMEOUT': config('ENTRY_CACHE_TIMEOUT', default=3600, cast=int),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('ENTRY_CACHE_MAX_ENTRIES', default=5000, cast=int),
+        },
+    },
+    'entry_version': {
+        'BACKEND': config('ENTRY_VERSION_CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('ENTRY_VERSION_CACHE_LOCATION', default=str(RUNTIME_DIR / 'cache' / 'entry-version')),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': config('ENTRY_VERSION_CACHE_MAX_ENTRIES', default=10_000_000, cast=int),
+        },
+    },
+}
+
+ENTRY_DETAIL_CACHE = 'entry_detail'
+ENTRY_VERSION_CACHE = 'entry_version'
+
+# Token认证的进程内快照：每个进程最多缓存MAX_ENTRIES个token，TTL秒后重新查询；
+# 吊销代号保存在auth_generation缓存中，须为各工作进程共享的后端（默认文件缓存）
+AUTH_TOKEN_GENERATION_CACHE = 'auth_generation'
+AUTH_TOKEN_CACHE_TTL = config('AUTH_TOKEN_CACHE_TTL', default=300, cast=int)
+AUTH_TOKEN_CACHE_MAX_ENTRIES = config('AUTH_TOKEN_CACHE_MAX_ENTRIES', default=10000, cast=int)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -114,7 +196,7 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachingTokenAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
 }
@@ -153,4 +235,80 @@ LOGOUT_REDIRECT_URL = '/'
 ACCOUNT_LOGOUT_ON_GET = True
 
 # Email backend for development
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
\ No newline at end of file
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# 全文检索后端，留空时SQLite使用FTS5索引，其他数据库退化为icontains查询
+SEARCH_BACKEND = config('SEARCH_BACKEND', default='')
+
+# 浏览次数写回缓冲：详情页访问先在进程内计数，每隔FLUSH_INTERVAL秒批量写回，
+# 缓冲的词条数达到MAX_BACKLOG时立即写回
+VIEW_COUNT_BUFFERED = config('VIEW_COUNT_BUFFERED', default=True, cast=bool)
+VIEW_COUNT_FLUSH_INTERVAL = config('VIEW_COUNT_FLUSH_INTERVAL', default=5.0, cast=float)
+VIEW_COUNT_MAX_BACKLOG = config('VIEW_COUNT_MAX_BACKLOG', default=1000, cast=int)
+
+# 热门排行：浏览和点赞按半衰期指数衰减后加权求和，refresh_trending物化全站和各分类前TOP_K名
+TRENDING_HALF_LIFE_HOURS = config('TRENDING_HALF_LIFE_HOURS', default=24.0, cast=float)
+TRENDING_VIEW_WEIGHT = config('TRENDING_VIEW_WEIGHT', default=1.0, cast=float)
+TRENDING_LIKE_WEIGHT = config('TRENDING_LIKE_WEIGHT', default=5.0, cast=float)
+TRENDING_TOP_K = config('TRENDING_TOP_K', default=50, cast=int)
+
+# 图片缩放版本：按最长边像素生成WebP和JPEG，由IMAGE_VARIANT_WORKERS个后台线程生成
+ENTRY_IMAGE_VARIANTS = {'thumb': 320, 'medium': 960, 'large': 1920}
+AVATAR_VARIANTS = {'small': 64, 'medium': 256}
+IMAGE_VARIANT_QUALITY = config('IMAGE_VARIANT_QUALITY', default=80, cast=int)
+IMAGE_VARIANT_WORKERS = config('IMAGE_VARIANT_WORKERS', default=2, cast=int)
+
+# 后台任务队列（encyclopedia.jobs）：EAGER时在请求中同步执行，关闭后写入队列，
+# 由 manage.py run_jobs 执行；失败后按BACKOFF * 2^(n-1)秒（不超过BACKOFF_MAX）重试，
+# 超过MAX_ATTEMPTS次放弃；领取后LEASE_SECONDS内未完成的任务会被重新领取
+JOB_QUEUE_EAGER = config('JOB_QUEUE_EAGER', default=True, cast=bool)
+JOB_MAX_ATTEMPTS = config('JOB_MAX_ATTEMPTS', default=5, cast=int)
+JOB_RETRY_BACKOFF = config('JOB_RETRY_BACKOFF', default=10.0, cast=float)
+JOB_RETRY_BACKOFF_MAX = config('JOB_RETRY_BACKOFF_MAX', default=3600.0, cast=float)
+JOB_LEASE_SECONDS = config('JOB_LEASE_SECONDS', default=300, cast=int)
+JOB_POLL_INTERVAL = config('JOB_POLL_INTERVAL', default=1.0, cast=float)
+
+# 请求级性能埋点（encyclopedia.instrumentation）：按SAMPLE_RATE抽样，被抽样的请求可返回
+# Server-Timing响应头，慢请求和慢查询以JSON写入encyclopedia.performance日志
+PERF_SAMPLE_RATE = config('PERF_SAMPLE_RATE', default=0.1, cast=float)
+# Server-Timing含查询次数等内部信息，默认只在DEBUG下开启；开启后非DEBUG时只返回给
+# INTERNAL_IPS中的地址和管理员
+PERF_SERVER_TIMING = config('PERF_SERVER_TIMING', default=DEBUG, cast=bool)
+INTERNAL_IPS = config('INTERNAL_IPS', default='', cast=Csv())
+PERF_SLOW_REQUEST_MS = config('PERF_SLOW_REQUEST_MS', default=500.0, cast=float)
+PERF_SLOW_QUERY_MS = config('PERF_SLOW_QUERY_MS', default=100.0, cast=float)
+PERF_LOG_FILE = config('PERF_LOG_FILE', default='')
+
+# Prometheus指标（encyclopedia.metrics）：各进程每隔FLUSH_INTERVAL秒把快照写入METRICS_DIR，
+# /metrics汇总全部进程的快照；METRICS_DIR留空时只输出当前进程的指标。
+# 部署前应清空METRICS_DIR；ALLOWED_IPS为空时不限制抓取来源
+METRICS_DIR = config('METRICS_DIR', default=str(RUNTIME_DIR / 'metrics'))
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5.0, cast=float)
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='127.0.0.1,::1', cast=Csv())
+
+# 接口基准测试（manage.py benchmark_endpoints）结果的默认保存目录，文件名含时间和提交号
+BENCHMARK_RESULTS_DIR = config('BENCHMARK_RESULTS_DIR', default=str(BASE_DIR / 'benchmarks'))
+
+TEST_RUNNER = 'baike.test_runner.IsolatedRuntimeRunner'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'performance': {'format': '%(asctime)s %(message)s'},
+    },
+    'handlers': {
+        'performance': {
+            'class': 'logging.FileHandler' if PERF_LOG_FILE else 'logging.StreamHandler',
+            'formatter': 'performance',
+            **({'filename': PERF_LOG_FILE, 'encoding': 'utf-8'} if PERF_LOG_FILE else {}),
+        },
+    },
+    'loggers': {
+        'encyclopedia.performance': {
+            'handlers': ['performance'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
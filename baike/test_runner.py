@@ -0,0 +1,37 @@
+"""
+测试运行器
+
+测试与开发服务器、基准测试默认共用RUNTIME_DIR下的文件缓存和指标快照目录；测试数据库的
+主键会重复使用，沿用这些文件会读到上一次运行缓存的词条或把测试的指标计入/metrics。
+运行测试期间把所有缓存换成进程内的LocMemCache，并清空METRICS_DIR，只统计当前进程的指标。
+缓冲的浏览次数在删除测试数据库之前写回，不会在进程退出时写进开发数据库。
+"""
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class IsolatedRuntimeRunner(DiscoverRunner):
+    """在进程内的缓存中运行测试，不读写共享的缓存和指标目录"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._runtime_settings = override_settings(
+            CACHES={
+                alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+                for alias in settings.CACHES
+            },
+            METRICS_DIR='',
+        )
+        self._runtime_settings.enable()
+
+    def teardown_databases(self, old_config, **kwargs):
+        from encyclopedia.counters import view_counter
+
+        view_counter.stop()
+        super().teardown_databases(old_config, **kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        self._runtime_settings.disable()
+        super().teardown_test_environment(**kwargs)
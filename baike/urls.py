@@ -4,11 +4,13 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from encyclopedia.metrics import metrics_view
 from . import views
 
 urlpatterns = [
     path('', views.api_root, name='api_root'),
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('api/', include('encyclopedia.urls')),
     path('api/auth/', include('users.urls')),
 ]
@@ -1,13 +1,15 @@
 from django.contrib import admin
-from .models import Category, Entry, EntryImage, EntryHistory, Favorite
+from . import jobs
+from .models import Category, Entry, EntryImage, EntryHistory, Favorite, Like, DailyEntryStat, TrendingEntry, Job
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     """分类管理"""
-    list_display = ['name', 'description', 'created_at']
+    list_display = ['name', 'description', 'entry_count', 'created_at']
     list_filter = ['created_at']
     search_fields = ['name', 'description']
+    readonly_fields = ['entry_count']
     ordering = ['name']
 
 
@@ -22,7 +24,8 @@ class EntryHistoryInline(admin.TabularInline):
     """编辑历史内联管理"""
     model = EntryHistory
     extra = 0
-    readonly_fields = ['editor', 'old_content', 'new_content', 'edit_summary', 'edited_at']
+    fields = ['revision', 'editor', 'edit_summary', 'edited_at']
+    readonly_fields = ['revision', 'editor', 'edit_summary', 'edited_at']
     can_delete = False
 
 
@@ -70,11 +73,20 @@ class EntryImageAdmin(admin.ModelAdmin):
 @admin.register(EntryHistory)
 class EntryHistoryAdmin(admin.ModelAdmin):
     """编辑历史管理"""
-    list_display = ['entry', 'editor', 'edit_summary', 'edited_at']
+    list_display = ['entry', 'revision', 'editor', 'edit_summary', 'is_keyframe', 'edited_at']
     list_filter = ['edited_at', 'editor']
     search_fields = ['entry__title', 'editor__username', 'edit_summary']
-    readonly_fields = ['entry', 'editor', 'old_content', 'new_content', 'edit_summary', 'edited_at']
+    fields = ['entry', 'revision', 'editor', 'edit_summary', 'edited_at', 'old_content', 'new_content']
+    readonly_fields = fields
     ordering = ['-edited_at']
+    
+    @admin.display(description='原内容')
+    def old_content(self, obj):
+        return obj.get_contents()[0]
+    
+    @admin.display(description='新内容')
+    def new_content(self, obj):
+        return obj.get_contents()[1]
 
 
 @admin.register(Favorite)
@@ -83,4 +95,46 @@ class FavoriteAdmin(admin.ModelAdmin):
     list_display = ['user', 'entry', 'created_at']
     list_filter = ['created_at']
     search_fields = ['user__username', 'entry__title']
-    ordering = ['-created_at']
\ No newline at end of file
+    ordering = ['-created_at']
+
+
+@admin.register(Like)
+class LikeAdmin(admin.ModelAdmin):
+    """点赞管理"""
+    list_display = ['user', 'entry', 'created_at']
+    list_filter = ['created_at']
+    search_fields = ['user__username', 'entry__title']
+    ordering = ['-created_at']
+
+
+@admin.register(DailyEntryStat)
+class DailyEntryStatAdmin(admin.ModelAdmin):
+    """每日统计管理"""
+    list_display = ['date', 'author', 'category', 'entry_count', 'view_count', 'like_count']
+    list_filter = ['date', 'category']
+    search_fields = ['author__username']
+    ordering = ['-date']
+
+
+@admin.register(TrendingEntry)
+class TrendingEntryAdmin(admin.ModelAdmin):
+    """热门排行管理"""
+    list_display = ['scope', 'rank', 'entry', 'score', 'computed_at']
+    list_filter = ['scope']
+    ordering = ['scope', 'rank']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """后台任务管理"""
+    list_display = ['id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'created_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'dedup_key', 'sequence_key']
+    readonly_fields = ['locked_by', 'locked_until', 'last_error', 'created_at']
+    ordering = ['id']
+    actions = ['retry_jobs']
+    
+    @admin.action(description='重新执行选中的任务')
+    def retry_jobs(self, request, queryset):
+        count = jobs.retry_failed(queryset)
+        self.message_user(request, f'已重新排队 {count} 个任务')
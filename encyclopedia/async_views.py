@@ -0,0 +1,127 @@
+"""
+读多写少接口的异步版本，由ASGI入口（baike/asgi.py -> baike.asgi_urls）挂载
+
+互不依赖的查询通过asyncio.gather在线程池中并发执行，每个查询使用所在线程自己的数据库连接；
+等待数据库时不占用事件循环，慢检索不会阻塞同一进程中的其他请求。
+认证、权限语义与同步视图一致；写操作、字段裁剪等少见情况直接转交同步的DRF视图处理。
+"""
+
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.http import JsonResponse
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import cache as entry_cache
+from .models import Entry
+from .serializers import is_favorited
+from .views import EntryViewSet, build_statistics, search_category_results, search_entry_results
+
+
+entry_detail_view = EntryViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+})
+
+
+def _closing_connections(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # 线程池中的线程不经过请求周期，按CONN_MAX_AGE关闭本线程的连接
+            close_old_connections()
+    return wrapper
+
+
+def run_query(func, *args):
+    """在线程池中执行一个同步的数据库操作"""
+    return sync_to_async(_closing_connections(func), thread_sensitive=False)(*args)
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data, status=status, encoder=DjangoJSONEncoder, json_dumps_params={'ensure_ascii': False}
+    )
+
+
+async def authenticate(request):
+    """用DRF默认的认证类认证请求，返回DRF Request"""
+    drf_request = Request(
+        request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    )
+    try:
+        await run_query(lambda: drf_request.user)
+    except exceptions.AuthenticationFailed as exc:
+        return None, json_response({'detail': exc.detail}, status=exc.status_code)
+    return drf_request, None
+
+
+async def search(request):
+    """综合搜索：词条检索和分类检索并发执行"""
+    if request.method != 'GET':
+        return json_response({'detail': exceptions.MethodNotAllowed(request.method).detail}, status=405)
+    query = request.GET.get('q', '')
+    if not query:
+        return json_response({'error': 'Search query parameter q is required'}, status=400)
+
+    drf_request, error = await authenticate(request)
+    if error:
+        return error
+    entries, categories = await asyncio.gather(
+        run_query(search_entry_results, query, {'request': drf_request}),
+        run_query(search_category_results, query),
+    )
+    return json_response({'entries': entries, 'categories': categories, 'query': query})
+
+
+async def entry_detail(request, pk):
+    """词条详情：存在性检查、详情缓存和收藏状态并发读取，缓存未命中时交给同步视图生成"""
+    if request.method != 'GET' or 'fields' in request.GET or 'expand' in request.GET:
+        return await sync_to_async(entry_detail_view)(request, pk=pk)
+
+    drf_request, error = await authenticate(request)
+    if error:
+        return error
+    row, data, favorited = await asyncio.gather(
+        run_query(lambda: (
+            Entry.objects.filter(is_published=True, pk=pk)
+            .values_list('view_count', 'like_count')
+            .first()
+        )),
+        run_query(entry_cache.get_entry_detail, pk),
+        run_query(is_favorited, {'request': drf_request}, pk),
+    )
+    if row is None:
+        return json_response({'detail': exceptions.NotFound().detail}, status=404)
+    if data is None:
+        return await sync_to_async(entry_detail_view)(request, pk=pk)
+
+    view_count, like_count = row
+    entry = Entry(pk=pk, view_count=view_count)
+    await run_query(entry.increment_view_count)
+    data['view_count'] = entry.view_count
+    data['like_count'] = like_count
+    data['is_favorited'] = favorited
+    return json_response(data)
+
+
+async def statistics(request):
+    """词条统计：汇总表上只有一次分组查询，在线程池中执行以免阻塞事件循环"""
+    if request.method != 'GET':
+        return json_response({'detail': exceptions.MethodNotAllowed(request.method).detail}, status=405)
+    drf_request, error = await authenticate(request)
+    if error:
+        return error
+    if not drf_request.user.is_authenticated:
+        return json_response({'detail': exceptions.NotAuthenticated().detail}, status=403)
+    data, status = await run_query(build_statistics, drf_request.user, request.GET)
+    return json_response(data, status=status)
@@ -0,0 +1,370 @@
+"""
+接口基准测试
+
+ENDPOINTS列出encyclopedia.urls和users.urls中参与压测的路由，路径中的占位符由数据库中的样本数据
+（Fixtures，热门词条、有历史的词条、大分类、标题中的词）按请求序号轮流填充，同一语料上每次压测的请求相同。
+每个接口先预热，再以固定并发发出固定数量的请求，记录吞吐量、延迟分位数和失败数；
+被抽样请求（PERF_SAMPLE_RATE）的Server-Timing头中的查询次数和查询耗时一并记录。
+
+请求可以通过Django测试客户端在进程内发出，也可以通过HTTP发往本地启动的服务器（base_url），
+后者包含网络和应用服务器的开销，服务器须与本进程使用同一个数据库。
+结果保存为JSON，附带提交号和语料规模；compare()按延迟分位数和吞吐量与基线结果比较。
+"""
+
+import json
+import math
+import os
+import platform
+import re
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from urllib.parse import quote, urlsplit
+
+import django
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Max
+from django.test import Client
+from django.urls import URLPattern, URLResolver, resolve
+from django.utils import timezone
+
+from . import corpus
+from .models import Category, Entry, EntryHistory, Like
+
+
+SAMPLE_SIZE = 50
+ROUTE_MODULES = ('encyclopedia.urls', 'users.urls')
+
+_SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+class Endpoint:
+    """一个压测接口，path中的{占位符}由Fixtures.params填充"""
+
+    def __init__(self, name, path, method='GET', auth=False, data=None, write=False, max_requests=None):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.auth = auth
+        self.data = data
+        # 写接口会修改数据，默认不压测；成对出现（点赞/取消点赞）以便压测后恢复
+        self.write = write
+        # 本身就慢的接口（登录需计算密码哈希）限制请求数
+        self.max_requests = max_requests
+
+
+ENDPOINTS = [
+    Endpoint('category-list', '/api/categories/'),
+    Endpoint('category-detail', '/api/categories/{category}/'),
+    Endpoint('entry-list', '/api/entries/'),
+    Endpoint('entry-list-category', '/api/entries/?category={category}'),
+    Endpoint('entry-list-search', '/api/entries/?search={word}'),
+    Endpoint('entry-detail', '/api/entries/{entry}/'),
+    Endpoint('entry-history', '/api/entries/{history_entry}/history/'),
+    Endpoint('entry-revision', '/api/entries/{history_entry}/history/{revision}/'),
+    Endpoint('entry-history-diff', '/api/entries/{history_entry}/history/diff/?from=1&to={revision}'),
+    Endpoint('entry-trending', '/api/entries/trending/'),
+    Endpoint('entry-liked', '/api/entries/liked/?ids={entry_ids}', auth=True),
+    Endpoint('entry-like', '/api/entries/{unliked_entry}/like/', method='POST', auth=True, write=True),
+    Endpoint('entry-unlike', '/api/entries/{unliked_entry}/unlike/', method='POST', auth=True, write=True),
+    Endpoint('search-list', '/api/search/?q={word}'),
+    Endpoint('favorite-list', '/api/favorites/', auth=True),
+    Endpoint('favorite-check', '/api/favorites/check/?entry_ids={entry_ids}', auth=True),
+    Endpoint('statistics', '/api/encyclopedia/statistics/', auth=True),
+    Endpoint('login', '/api/auth/login/', method='POST', data={'username': '{username}', 'password': '{password}'},
+             max_requests=50),
+    Endpoint('profile', '/api/auth/profile/', auth=True),
+    Endpoint('check_auth', '/api/auth/check-auth/', auth=True),
+]
+
+
+class Fixtures:
+    """从数据库中取出的样本，按请求序号轮流使用"""
+
+    def __init__(self, user, password):
+        entries = list(
+            Entry.objects.filter(is_published=True)
+            .order_by('-view_count', 'id')
+            .values_list('id', 'title')[:SAMPLE_SIZE]
+        )
+        self.entries = [entry_id for entry_id, _ in entries]
+        # 标题开头的两个字作为检索词，热门词条的标题更可能被检索
+        self.words = [quote(title[:2]) for _, title in entries if title]
+        self.categories = list(
+            Category.objects.order_by('-entry_count', 'id').values_list('id', flat=True)[:SAMPLE_SIZE]
+        )
+        self.revisions = list(
+            EntryHistory.objects.filter(entry__is_published=True)
+            .values('entry_id')
+            .annotate(revision=Max('revision'))
+            .order_by('-revision', 'entry_id')
+            .values_list('entry_id', 'revision')[:SAMPLE_SIZE]
+        )
+        liked = Like.objects.filter(user=user).values('entry_id')
+        self.unliked = list(
+            Entry.objects.filter(is_published=True).exclude(pk__in=liked)
+            .order_by('-view_count', 'id')
+            .values_list('id', flat=True)[:SAMPLE_SIZE]
+        )
+        self.username = user.get_username()
+        self.password = password
+
+    def params(self, index):
+        """第index个请求的占位符取值，样本为空的占位符不提供"""
+        params = {
+            'entry_ids': ','.join(map(str, self.entries[:20])),
+            'username': self.username,
+            'password': self.password,
+        }
+        for name, values in (
+            ('entry', self.entries),
+            ('word', self.words),
+            ('category', self.categories),
+            ('unliked_entry', self.unliked),
+        ):
+            if values:
+                params[name] = values[index % len(values)]
+        if self.revisions:
+            params['history_entry'], params['revision'] = self.revisions[index % len(self.revisions)]
+        return params
+
+
+def _format(value, params):
+    if isinstance(value, dict):
+        return {key: _format(item, params) for key, item in value.items()}
+    return value.format(**params)
+
+
+class ClientTransport:
+    """通过Django测试客户端在进程内发出请求，每个线程一个客户端"""
+    name = 'client'
+
+    def __init__(self, token):
+        self.headers = {'Authorization': f'Token {token}'} if token else {}
+        self._local = threading.local()
+
+    def _client(self, auth):
+        key = 'auth' if auth else 'anonymous'
+        client = getattr(self._local, key, None)
+        if client is None:
+            # 视图异常按500计入失败数，不中断压测
+            client = Client(headers=self.headers if auth else {}, raise_request_exception=False)
+            setattr(self._local, key, client)
+        return client
+
+    def request(self, endpoint, path, data):
+        client = self._client(endpoint.auth)
+        try:
+            if endpoint.method == 'GET':
+                response = client.get(path)
+            else:
+                response = client.generic(
+                    endpoint.method, path, json.dumps(data or {}), content_type='application/json'
+                )
+        finally:
+            close_old_connections()
+        return response.status_code, response.get('Server-Timing', '')
+
+
+class HttpTransport:
+    """通过HTTP向base_url发出请求"""
+    name = 'http'
+
+    def __init__(self, token, base_url, timeout=30):
+        self.token = token
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, endpoint, path, data):
+        headers = {'Accept': 'application/json'}
+        if endpoint.auth and self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        body = None
+        if endpoint.method != 'GET':
+            body = json.dumps(data or {}).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=endpoint.method)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status, response.headers.get('Server-Timing', '')
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.headers.get('Server-Timing', '')
+        except (urllib.error.URLError, OSError):
+            return 0, ''
+
+
+def percentile(values, percent):
+    """已排序列表的最近秩分位数"""
+    if not values:
+        return None
+    return values[max(0, min(len(values) - 1, math.ceil(percent / 100 * len(values)) - 1))]
+
+
+def summarize(results, elapsed):
+    """汇总一个接口的(耗时, 状态码, Server-Timing)列表，耗时单位为毫秒"""
+    latencies = sorted(latency * 1000 for latency, _, _ in results)
+    statuses = Counter(status for _, status, _ in results)
+    timings = [_SERVER_TIMING_DB.search(timing) for _, _, timing in results]
+    timings = [match for match in timings if match]
+    return {
+        'requests': len(results),
+        'errors': sum(count for status, count in statuses.items() if not 200 <= status < 400),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput': round(len(results) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 2),
+            'p50': round(percentile(latencies, 50), 2),
+            'p90': round(percentile(latencies, 90), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'max': round(latencies[-1], 2),
+        },
+        # 只统计返回了Server-Timing（被抽样）的请求
+        'db_queries': round(sum(int(match.group(2)) for match in timings) / len(timings), 2) if timings else None,
+        'db_ms': round(sum(float(match.group(1)) for match in timings) / len(timings), 2) if timings else None,
+    }
+
+
+def run_endpoint(transport, endpoint, fixtures, requests, concurrency, warmup):
+    """压测一个接口，占位符缺少样本时返回None"""
+    try:
+        calls = [
+            (endpoint.path.format(**params), _format(endpoint.data, params) if endpoint.data else None)
+            for params in map(fixtures.params, range(max(requests, warmup)))
+        ]
+    except KeyError:
+        return None
+    if endpoint.max_requests:
+        requests = min(requests, endpoint.max_requests)
+
+    for path, data in calls[:warmup]:
+        transport.request(endpoint, path, data)
+
+    def hit(call):
+        path, data = call
+        started = time.perf_counter()
+        status, timing = transport.request(endpoint, path, data)
+        return time.perf_counter() - started, status, timing
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(hit, calls[:requests]))
+    return summarize(results, time.perf_counter() - started)
+
+
+def _walk(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _walk(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern.name
+
+
+def route_names():
+    """encyclopedia.urls和users.urls中全部具名路由"""
+    names = set()
+    for module in ROUTE_MODULES:
+        names.update(_walk(import_module(module).urlpatterns))
+    return names
+
+
+def uncovered_routes(endpoints):
+    """没有被任何压测接口覆盖的路由名"""
+    # 占位符都以1代入，只用于匹配路由
+    covered = {
+        resolve(urlsplit(endpoint.path.format_map(defaultdict(lambda: 1))).path).url_name
+        for endpoint in endpoints
+    }
+    return sorted(route_names() - covered)
+
+
+def _git(*args):
+    try:
+        result = subprocess.run(
+            ['git', *args], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def metadata(transport, requests, concurrency, warmup):
+    """与结果一起保存的环境信息，比较两次结果时据此判断是否可比"""
+    status = _git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'commit': _git('rev-parse', 'HEAD'),
+        'dirty': bool(status) if status is not None else None,
+        'created_at': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'transport': transport.name,
+        'base_url': getattr(transport, 'base_url', None),
+        'requests': requests,
+        'concurrency': concurrency,
+        'warmup': warmup,
+        'perf_sample_rate': settings.PERF_SAMPLE_RATE,
+        'job_queue_eager': settings.JOB_QUEUE_EAGER,
+        'corpus': corpus.counts(),
+    }
+
+
+def result_path(result, directory=None):
+    """结果文件的默认路径：<时间>-<提交号>.json"""
+    directory = directory or settings.BENCHMARK_RESULTS_DIR
+    stamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+    commit = (result['meta']['commit'] or 'unknown')[:10]
+    return os.path.join(directory, f'{stamp}-{commit}.json')
+
+
+def save(result, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def latest_result(directory=None, exclude=None):
+    """结果目录中最新的结果文件，没有时返回None"""
+    directory = directory or settings.BENCHMARK_RESULTS_DIR
+    if not os.path.isdir(directory):
+        return None
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.endswith('.json') and os.path.join(directory, name) != exclude
+    )
+    return paths[-1] if paths else None
+
+
+def compare(baseline, current, threshold):
+    """
+    逐个接口比较p50、p99延迟和吞吐量，返回(接口, 指标, 基线值, 当前值, 变化比例, 是否退化)列表
+
+    延迟上升或吞吐量下降超过threshold（比例，例如0.1）视为退化。
+    """
+    rows = []
+    for name, result in current['endpoints'].items():
+        base = baseline['endpoints'].get(name)
+        if not base or not result:
+            continue
+        for metric, old, new, higher_is_worse in (
+            ('p50', base['latency_ms']['p50'], result['latency_ms']['p50'], True),
+            ('p99', base['latency_ms']['p99'], result['latency_ms']['p99'], True),
+            ('throughput', base['throughput'], result['throughput'], False),
+        ):
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            regressed = change > threshold if higher_is_worse else -change > threshold
+            rows.append((name, metric, old, new, change, regressed))
+    return rows
@@ -0,0 +1,122 @@
+"""
+词条详情的版本化缓存
+
+缓存的是与用户无关的详情序列化结果，浏览数、点赞数和收藏状态在响应时合并。
+每个词条、作者和分类各有一个版本号，缓存内容记录生成时的三个版本号，
+读取时版本不一致即视为失效，因此作者改名、分类改名时只需递增一个版本号。
+
+详情数据存放在Django缓存框架的ENTRY_DETAIL_CACHE别名中，可以按MAX_ENTRIES淘汰；
+版本号单独存放在不淘汰的ENTRY_VERSION_CACHE别名中。两者都必须由所有进程共用，
+默认是本机共享的文件缓存，多台机器部署时应配置为数据库缓存。
+版本号丢失时以当前时间重新起算，不会回到旧值而让按旧版本号缓存的内容重新生效。
+
+版本号在事务提交后才递增：提交前递增的话，并发请求可能按新版本号缓存未提交前的旧数据。
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from . import instrumentation
+
+
+KEY_PREFIX = 'entry-detail'
+
+# 随请求变化、不进入缓存的字段
+PER_REQUEST_FIELDS = ('view_count', 'like_count', 'is_favorited')
+
+
+def _cache():
+    return caches[settings.ENTRY_DETAIL_CACHE]
+
+
+def _versions():
+    return caches[settings.ENTRY_VERSION_CACHE]
+
+
+def _payload_key(entry_id):
+    return f'{KEY_PREFIX}:payload:{entry_id}'
+
+
+def _version_key(kind, object_id):
+    return f'{KEY_PREFIX}:version:{kind}:{object_id}'
+
+
+def _version_keys(entry_id, author_id, category_id):
+    return [
+        _version_key('entry', entry_id),
+        _version_key('user', author_id),
+        _version_key('category', category_id),
+    ]
+
+
+def _initial_version():
+    return time.time_ns()
+
+
+def _bump_version(kind, object_id):
+    cache = _versions()
+    key = _version_key(kind, object_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # 版本号本身不过期
+        cache.add(key, _initial_version(), None)
+
+
+def get_versions(entry_id, author_id, category_id):
+    """读取当前版本号，应在从数据库加载词条之前调用"""
+    cache = _versions()
+    keys = _version_keys(entry_id, author_id, category_id)
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # 其他进程可能同时初始化，以add写入后重新读取
+        for key in missing:
+            cache.add(key, _initial_version(), None)
+        versions.update(cache.get_many(missing))
+    return tuple(versions.get(key) for key in keys)
+
+
+def get_entry_detail(entry_id):
+    """返回缓存的详情数据，未命中或已失效时返回None"""
+    payload = _cache().get(_payload_key(entry_id))
+    if payload is not None:
+        current = get_versions(entry_id, payload['author_id'], payload['category_id'])
+        if current != payload['versions']:
+            payload = None
+    instrumentation.record_cache('entry_detail', payload is not None)
+    return None if payload is None else dict(payload['data'])
+
+
+def set_entry_detail(entry, data, versions):
+    """缓存详情数据，versions为加载词条前读取的版本号"""
+    data = {key: value for key, value in data.items() if key not in PER_REQUEST_FIELDS}
+    _cache().set(_payload_key(entry.pk), {
+        'author_id': entry.author_id,
+        'category_id': entry.category_id,
+        'versions': versions,
+        'data': data,
+    })
+
+
+def _invalidate_entry(entry_id):
+    _bump_version('entry', entry_id)
+    _cache().delete(_payload_key(entry_id))
+
+
+def invalidate_entry(entry_id):
+    """词条内容或图片变化时使缓存失效"""
+    transaction.on_commit(lambda: _invalidate_entry(entry_id))
+
+
+def invalidate_user(user_id):
+    """作者信息变化时使其所有词条的缓存失效"""
+    transaction.on_commit(lambda: _bump_version('user', user_id))
+
+
+def invalidate_category(category_id):
+    """分类信息变化时使其所有词条的缓存失效"""
+    transaction.on_commit(lambda: _bump_version('category', category_id))
@@ -0,0 +1,360 @@
+"""
+基准测试用的合成语料
+
+按固定随机种子生成用户、分类、词条、编辑历史、收藏、点赞和图片，参数相同时每次生成的数据相同，
+不同提交之间的基准结果因此可以直接比较。
+
+- 正文由按齐普夫分布抽取的常用汉字词组成，长度服从以content_length为中位数的对数正态分布。
+- 词条的浏览热度服从帕累托分布，收藏和点赞集中在热门词条上。
+- 编辑历史通过改写、插入、删除段落模拟，按history.build_revision保存为差量，
+  词条正文即最后一个版本的内容。
+
+全部使用bulk_create写入，不触发信号；冗余计数、全文索引、每日统计和热门排行在写入后统一重建。
+合成用户和分类以SYNTHETIC_PREFIX开头，clear()删除它们及其词条，不影响其他数据；
+合成图片写入存储中单独的IMAGE_DIRECTORY，不与用户上传的图片混在一起。
+"""
+
+import io
+import math
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from users.models import UserProfile
+
+from . import history
+from . import images as entry_images
+from . import stats
+from . import trending
+from .models import Category, Entry, EntryHistory, EntryImage, Favorite, Like
+from .search import get_search_backend
+
+
+SYNTHETIC_PREFIX = 'bench_'
+# 全部合成用户的登录密码，基准测试用它登录
+PASSWORD = 'bench-password'
+BATCH_SIZE = 500
+
+CHARACTERS = (
+    '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后'
+    '多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还'
+    '因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结'
+    '解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级'
+    '少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领'
+    '七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清己美再采转更单风切打白教速花带安场身车例真务具万每'
+)
+VOCABULARY_SIZE = 3000
+# 合成图片在存储中的目录，与用户上传的encyclopedia/images/分开
+IMAGE_DIRECTORY = 'synthetic/images/'
+# 图片尺寸，与用户上传的照片相近，生成缩放版本的开销才有代表性
+IMAGE_SIZE = (1600, 1200)
+
+
+def _cumulative(weights):
+    total = 0
+    result = []
+    for weight in weights:
+        total += weight
+        result.append(total)
+    return result
+
+
+class TextGenerator:
+    """从固定词表生成中文文本，词频服从齐普夫分布"""
+
+    def __init__(self, rng):
+        self.rng = rng
+        words = set()
+        while len(words) < VOCABULARY_SIZE:
+            words.add(''.join(rng.choices(CHARACTERS, k=rng.choice((1, 2, 2, 2, 3, 4)))))
+        self.words = sorted(words)
+        rng.shuffle(self.words)
+        self.cum_weights = _cumulative([1 / (rank + 1) for rank in range(len(self.words))])
+
+    def word(self):
+        return self.rng.choices(self.words, cum_weights=self.cum_weights)[0]
+
+    def phrase(self, min_words=2, max_words=4):
+        return ''.join(self.word() for _ in range(self.rng.randint(min_words, max_words)))
+
+    def sentence(self):
+        clauses = [self.phrase(2, 6) for _ in range(self.rng.randint(1, 3))]
+        return '，'.join(clauses) + self.rng.choice('。。。。；！？')
+
+    def paragraph(self, length):
+        parts = []
+        size = 0
+        while size < length:
+            part = self.sentence()
+            parts.append(part)
+            size += len(part)
+        return ''.join(parts)
+
+    def content(self, length):
+        """生成约length个字的正文，段落以换行分隔"""
+        paragraphs = []
+        size = 0
+        while size < length:
+            paragraph = self.paragraph(min(length - size, self.rng.randint(80, 400)))
+            paragraphs.append(paragraph)
+            size += len(paragraph)
+        return '\n'.join(paragraphs)
+
+
+def _edit(text, generator, rng):
+    """对正文做一次段落级编辑：改写、插入或删除一段"""
+    paragraphs = text.split('\n')
+    index = rng.randrange(len(paragraphs))
+    action = rng.random()
+    if action < 0.6:
+        paragraphs[index] = generator.paragraph(max(len(paragraphs[index]), 40))
+        summary = f'修订第{index + 1}段'
+    elif action < 0.85 or len(paragraphs) == 1:
+        paragraphs.insert(index, generator.paragraph(rng.randint(80, 300)))
+        summary = f'补充第{index + 1}段'
+    else:
+        del paragraphs[index]
+        summary = f'删除第{index + 1}段'
+    return '\n'.join(paragraphs), summary
+
+
+def _image_content(rng):
+    """生成一张带色块的JPEG，颜色和布局随机，压缩后的大小接近普通照片"""
+    image = Image.new('RGB', IMAGE_SIZE, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    width, height = IMAGE_SIZE
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        draw.ellipse(
+            (x, y, x + rng.randint(20, width // 3), y + rng.randint(20, height // 3)),
+            fill=tuple(rng.randrange(256) for _ in range(3))
+        )
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return ContentFile(buffer.getvalue())
+
+
+def _weighted_sample(rng, population, cum_weights, count):
+    """按权重不重复地抽取至多count个元素"""
+    count = min(count, len(population))
+    chosen = set()
+    # 热门元素很快被抽完，限制尝试次数，避免count接近总数时长时间空转
+    for _ in range(count * 10):
+        if len(chosen) >= count:
+            break
+        chosen.add(rng.choices(population, cum_weights=cum_weights)[0])
+    return chosen
+
+
+def exists():
+    return User.objects.filter(username__startswith=SYNTHETIC_PREFIX).exists()
+
+
+def counts():
+    """当前数据库中各模型的行数，随基准结果一起保存"""
+    return {
+        'users': User.objects.count(),
+        'categories': Category.objects.count(),
+        'entries': Entry.objects.count(),
+        'history': EntryHistory.objects.count(),
+        'favorites': Favorite.objects.count(),
+        'likes': Like.objects.count(),
+        'images': EntryImage.objects.count(),
+    }
+
+
+def clear():
+    """删除合成用户（连同其词条、历史、收藏和点赞）、合成分类和图片文件，返回删除的词条数"""
+    entries = Entry.objects.filter(author__username__startswith=SYNTHETIC_PREFIX)
+    for image in EntryImage.objects.filter(entry__in=entries).exclude(image=''):
+        names = [image.image.name] + [
+            name for variant in image.variants.values()
+            for key, name in variant.items() if key not in ('width', 'height')
+        ]
+        for name in names:
+            default_storage.delete(name)
+    entry_count = entries.count()
+    with transaction.atomic():
+        User.objects.filter(username__startswith=SYNTHETIC_PREFIX).delete()
+        Category.objects.filter(name__startswith=SYNTHETIC_PREFIX).delete()
+    return entry_count
+
+
+def rebuild_derived():
+    """按明细数据重建冗余计数、全文索引、每日统计和热门排行"""
+    for command in ('reconcile_like_counts', 'reconcile_category_counts', 'reconcile_profile_counts'):
+        call_command(command, stdout=io.StringIO())
+    with transaction.atomic():
+        get_search_backend().rebuild()
+    stats.backfill()
+    trending.reseed()
+    trending.refresh()
+
+
+def generate(users=200, categories=20, entries=5000, content_length=1500, content_sigma=0.6,
+             history_depth=5, favorites=20, likes=30, images=0.05, days=365, seed=42, progress=None):
+    """
+    生成合成语料，返回各模型写入的行数
+
+    history_depth为每个词条编辑次数的上限（均匀分布），favorites和likes为每个用户的平均数，
+    images为带图片的词条比例，days为创建时间分布的天数；progress(message)用于输出进度。
+    """
+    rng = random.Random(seed)
+    generator = TextGenerator(rng)
+    now = timezone.now()
+    start = now - timedelta(days=days)
+    report = progress or (lambda message: None)
+    created = dict.fromkeys(('users', 'categories', 'entries', 'history', 'favorites', 'likes', 'images'), 0)
+
+    # 用户：共用一个密码哈希，逐个计算会占去大部分生成时间
+    password = make_password(PASSWORD)
+    user_objects = User.objects.bulk_create([
+        User(
+            username=f'{SYNTHETIC_PREFIX}user_{index:05d}',
+            email=f'{SYNTHETIC_PREFIX}user_{index:05d}@example.com',
+            password=password,
+            date_joined=start + timedelta(seconds=rng.uniform(0, days * 86400)),
+        )
+        for index in range(users)
+    ], batch_size=BATCH_SIZE)
+    UserProfile.objects.bulk_create([
+        UserProfile(user=user, bio=generator.sentence()) for user in user_objects
+    ], batch_size=BATCH_SIZE)
+    user_ids = [user.pk for user in user_objects]
+    created['users'] = len(user_ids)
+    report(f'用户 {len(user_ids)}')
+
+    category_ids = [
+        category.pk for category in Category.objects.bulk_create([
+            Category(name=f'{SYNTHETIC_PREFIX}{index:03d}{generator.word()}', description=generator.sentence())
+            for index in range(categories)
+        ])
+    ]
+    created['categories'] = len(category_ids)
+    # 少数活跃作者贡献大部分词条，少数大分类包含大部分词条
+    author_weights = _cumulative([rng.paretovariate(1.5) for _ in user_ids])
+    category_weights = _cumulative([rng.paretovariate(1.2) for _ in category_ids])
+
+    # 创建时间升序，与自增主键的顺序一致
+    created_times = sorted(start + timedelta(seconds=rng.uniform(0, days * 86400)) for _ in range(entries))
+    titles = set()
+    entry_ids = []
+    popularity = []
+    for offset in range(0, entries, BATCH_SIZE):
+        batch = []
+        revisions = []
+        for created_at in created_times[offset:offset + BATCH_SIZE]:
+            title = generator.phrase(1, 3)
+            while title in titles:
+                title = f'{title}{generator.word()}'
+            titles.add(title)
+
+            length = int(rng.lognormvariate(math.log(content_length), content_sigma))
+            content = generator.content(max(20, min(length, content_length * 20)))
+            author_id = rng.choices(user_ids, cum_weights=author_weights)[0]
+            edits = []
+            edited_at = created_at
+            for _ in range(rng.randint(0, history_depth)):
+                new_content, summary = _edit(content, generator, rng)
+                edited_at += timedelta(seconds=rng.uniform(0, (now - edited_at).total_seconds() / 2))
+                edits.append((content, new_content, summary, edited_at, rng.choice(user_ids)))
+                content = new_content
+
+            weight = rng.paretovariate(1.1)
+            popularity.append(weight)
+            batch.append(Entry(
+                title=title,
+                content=content,
+                summary=content.split('\n', 1)[0][:100],
+                category_id=(
+                    rng.choices(category_ids, cum_weights=category_weights)[0]
+                    if category_ids and rng.random() < 0.95 else None
+                ),
+                author_id=author_id,
+                is_published=rng.random() < 0.95,
+                view_count=int(weight * 20),
+            ))
+            revisions.append((created_at, edits))
+
+        with transaction.atomic():
+            batch = Entry.objects.bulk_create(batch)
+            # auto_now_add和auto_now会在bulk_create时写入当前时间，这里改回生成的时间
+            for entry, (created_at, edits) in zip(batch, revisions):
+                entry.created_at = created_at
+                entry.updated_at = edits[-1][3] if edits else created_at
+            Entry.objects.bulk_update(batch, ['created_at', 'updated_at'], batch_size=BATCH_SIZE)
+
+            history_rows = []
+            for entry, (_, edits) in zip(batch, revisions):
+                previous = None
+                for old_content, new_content, summary, edited_at, editor_id in edits:
+                    previous = EntryHistory(
+                        entry_id=entry.pk,
+                        editor_id=editor_id,
+                        edit_summary=summary,
+                        **history.build_revision(previous, old_content, new_content)
+                    )
+                    previous.edited_at = edited_at
+                    history_rows.append(previous)
+            edited_times = [row.edited_at for row in history_rows]
+            history_rows = EntryHistory.objects.bulk_create(history_rows, batch_size=BATCH_SIZE)
+            for row, edited_at in zip(history_rows, edited_times):
+                row.edited_at = edited_at
+            EntryHistory.objects.bulk_update(history_rows, ['edited_at'], batch_size=BATCH_SIZE)
+
+        entry_ids.extend(entry.pk for entry in batch)
+        created['entries'] += len(batch)
+        created['history'] += len(history_rows)
+        report(f'词条 {created["entries"]}/{entries}，历史 {created["history"]}')
+
+    # 收藏和点赞集中在热门词条上，时间晚于词条创建时间
+    entry_weights = _cumulative(popularity)
+    entry_times = dict(zip(entry_ids, created_times))
+    for model, mean, key in ((Favorite, favorites, 'favorites'), (Like, likes, 'likes')):
+        rows = []
+        for user_id in user_ids:
+            count = int(rng.expovariate(1 / mean)) if mean > 0 else 0
+            for entry_id in _weighted_sample(rng, entry_ids, entry_weights, count):
+                rows.append(model(user_id=user_id, entry_id=entry_id))
+        times = [
+            entry_times[row.entry_id] + timedelta(
+                seconds=rng.uniform(0, (now - entry_times[row.entry_id]).total_seconds())
+            )
+            for row in rows
+        ]
+        with transaction.atomic():
+            rows = model.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+            for row, created_at in zip(rows, times):
+                row.created_at = created_at
+            model.objects.bulk_update(rows, ['created_at'], batch_size=BATCH_SIZE)
+        created[key] = len(rows)
+        report(f'{model._meta.verbose_name} {len(rows)}')
+
+    image_entries = [entry_id for entry_id in entry_ids if rng.random() < images]
+    for offset in range(0, len(image_entries), BATCH_SIZE):
+        batch = [
+            EntryImage(
+                entry_id=entry_id,
+                image=default_storage.save(
+                    f'{IMAGE_DIRECTORY}{SYNTHETIC_PREFIX}{entry_id}.jpg', _image_content(rng)
+                ),
+                caption=generator.phrase(),
+            )
+            for entry_id in image_entries[offset:offset + BATCH_SIZE]
+        ]
+        for image in EntryImage.objects.bulk_create(batch):
+            entry_images.generate(image)
+        created['images'] += len(batch)
+        report(f'图片 {created["images"]}/{len(image_entries)}')
+
+    report('重建冗余计数、全文索引、每日统计和热门排行')
+    rebuild_derived()
+    return created
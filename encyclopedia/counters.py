@@ -0,0 +1,162 @@
+"""
+词条浏览次数的写回缓冲
+
+详情页每次访问只在进程内计数，由后台线程按flush_interval定期合并写回，
+每个增量值只执行一条 UPDATE ... SET view_count = view_count + n，
+避免每次读请求都争用SQLite的写锁。进程退出时会写回剩余计数。
+写回时跳过已删除的词条；写回失败的计数放回缓冲重试，连续失败max_retries次后丢弃，
+不会因为一批坏数据让缓冲一直积压。
+"""
+
+import atexit
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from . import stats
+from . import trending
+
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCountBuffer:
+    """按词条累积浏览次数并批量写回数据库"""
+
+    def __init__(self, flush_interval=5.0, max_backlog=1000, enabled=True, max_retries=3):
+        self.flush_interval = flush_interval
+        self.max_backlog = max_backlog
+        self.enabled = enabled
+        self.max_retries = max_retries
+        self._pending = Counter()
+        self._failures = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._owner_pid = os.getpid()
+        atexit.register(self.stop)
+
+    @property
+    def backlog(self):
+        """尚未写回的浏览次数"""
+        with self._lock:
+            return sum(self._pending.values())
+
+    def pending(self, entry_id):
+        """指定词条尚未写回的浏览次数"""
+        with self._lock:
+            return self._pending.get(entry_id, 0)
+
+    def record(self, entry_id, count=1):
+        """记录浏览并返回该词条尚未写回的次数"""
+        self._ensure_process()
+        with self._lock:
+            self._pending[entry_id] += count
+            pending = self._pending[entry_id]
+            overflow = len(self._pending) >= self.max_backlog
+        self._ensure_started()
+        # 积压的词条过多时由当前请求直接写回，限制内存占用；写回失败不影响请求本身
+        if overflow:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('写回浏览次数失败')
+        return pending
+
+    def flush(self):
+        """写回全部缓冲计数，返回写回的浏览次数"""
+        from .models import Entry
+
+        self._ensure_process()
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, Counter()
+            if not pending:
+                return 0
+
+            try:
+                with transaction.atomic():
+                    # 缓冲期间被删除的词条不再写回
+                    existing = set(Entry.objects.filter(pk__in=list(pending)).values_list('pk', flat=True))
+                    pending = Counter({
+                        entry_id: count for entry_id, count in pending.items() if int(entry_id) in existing
+                    })
+                    # 增量相同的词条合并为一条UPDATE
+                    by_increment = defaultdict(list)
+                    for entry_id, count in pending.items():
+                        by_increment[count].append(entry_id)
+                    for count, entry_ids in by_increment.items():
+                        Entry.objects.filter(pk__in=entry_ids).update(
+                            view_count=F('view_count') + count
+                        )
+                    stats.record_views(pending)
+                    trending.record_views(pending)
+            except Exception:
+                self._requeue(pending)
+                raise
+            self._failures = 0
+            return sum(pending.values())
+
+    def _requeue(self, pending):
+        """写回失败时把计数放回缓冲等待重试，连续失败过多时丢弃"""
+        self._failures += 1
+        if self._failures > self.max_retries:
+            logger.error('连续%d次写回浏览次数失败，丢弃%d次浏览', self._failures, sum(pending.values()))
+            self._failures = 0
+            return
+        with self._lock:
+            self._pending.update(pending)
+
+    def stop(self):
+        """停止后台线程并写回剩余计数"""
+        self._stopped.set()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('写回浏览次数失败')
+
+    def _ensure_process(self):
+        """fork出的子进程没有后台线程，也不沿用父进程尚未写回的计数和锁"""
+        if os.getpid() == self._owner_pid:
+            return
+        self._pending = Counter()
+        self._failures = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._owner_pid = os.getpid()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='view-count-flusher', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('写回浏览次数失败')
+            finally:
+                # 后台线程不经过请求周期，需手动关闭本线程的数据库连接
+                connection.close()
+
+
+view_counter = ViewCountBuffer(
+    flush_interval=settings.VIEW_COUNT_FLUSH_INTERVAL,
+    max_backlog=settings.VIEW_COUNT_MAX_BACKLOG,
+    enabled=settings.VIEW_COUNT_BUFFERED,
+)
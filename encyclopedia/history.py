@@ -0,0 +1,148 @@
+"""
+词条编辑历史的差量存储
+
+每条历史记录只保存本次编辑的行级差量（原内容 -> 新内容）和新内容的哈希。
+关键帧额外保存编辑前的完整内容；每隔KEYFRAME_INTERVAL个版本，或编辑前内容
+与上一版本的新内容对不上（例如在管理后台直接修改过词条）时写入关键帧。
+还原任意版本时，从不晚于该版本的最近关键帧开始依次应用差量。
+"""
+
+import difflib
+import hashlib
+import json
+
+from django.db import transaction
+from django.db.models import Max
+
+
+KEYFRAME_INTERVAL = 20
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def make_delta(old, new):
+    """生成把old变为new的行级差量（JSON）"""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append(['=', i2 - i1])
+            continue
+        if i2 > i1:
+            ops.append(['-', i2 - i1])
+        if j2 > j1:
+            ops.append(['+', new_lines[j1:j2]])
+    return json.dumps(ops, ensure_ascii=False, separators=(',', ':'))
+
+
+def apply_delta(old, delta):
+    """对old应用差量，返回新内容"""
+    lines = old.splitlines(keepends=True)
+    result = []
+    position = 0
+    for op in json.loads(delta):
+        if op[0] == '=':
+            result.extend(lines[position:position + op[1]])
+            position += op[1]
+        elif op[0] == '-':
+            position += op[1]
+        else:
+            result.extend(op[1])
+    return ''.join(result)
+
+
+def build_revision(previous, old_content, new_content):
+    """计算新版本需要保存的字段，previous为上一条历史记录（可为None）"""
+    revision = previous.revision + 1 if previous else 1
+    is_keyframe = (
+        previous is None
+        or (revision - 1) % KEYFRAME_INTERVAL == 0
+        or previous.content_hash != content_hash(old_content)
+    )
+    return {
+        'revision': revision,
+        'is_keyframe': is_keyframe,
+        'base_content': old_content if is_keyframe else '',
+        'content_delta': make_delta(old_content, new_content),
+        'content_hash': content_hash(new_content),
+    }
+
+
+def record_edit(entry, editor, old_content, new_content, edit_summary='', edited_at=None):
+    """为词条追加一条编辑历史，edited_at为空时使用当前时间"""
+    from .models import EntryHistory
+
+    with transaction.atomic():
+        previous = (
+            EntryHistory.objects.filter(entry=entry)
+            .only('revision', 'content_hash')
+            .order_by('-revision')
+            .first()
+        )
+        history = EntryHistory.objects.create(
+            entry=entry,
+            editor=editor,
+            edit_summary=edit_summary,
+            **build_revision(previous, old_content, new_content)
+        )
+        if edited_at is not None:
+            # edited_at为auto_now_add，创建时总是取当前时间，延后写入的历史需改回编辑时间
+            EntryHistory.objects.filter(pk=history.pk).update(edited_at=edited_at)
+            history.edited_at = edited_at
+        return history
+
+
+def replay_revisions(histories):
+    """按版本顺序依次还原一个词条的历史记录，逐条产出(history, old_content, new_content)
+
+    histories须从第一个版本或某个关键帧开始且版本连续。
+    """
+    new = ''
+    for history in histories:
+        old = history.base_content if history.is_keyframe else new
+        new = apply_delta(old, history.content_delta)
+        yield history, old, new
+
+
+def get_revision_contents(entry_id, revision):
+    """还原指定版本编辑前后的内容，返回(old_content, new_content)"""
+    from .models import EntryHistory
+
+    history = EntryHistory.objects.filter(entry_id=entry_id)
+    keyframe = (
+        history.filter(revision__lte=revision, is_keyframe=True)
+        .aggregate(revision=Max('revision'))['revision']
+    )
+    if keyframe is None:
+        raise EntryHistory.DoesNotExist
+    rows = (
+        history.filter(revision__gte=keyframe, revision__lte=revision)
+        .order_by('revision')
+        .values_list('revision', 'base_content', 'content_delta', 'is_keyframe')
+    )
+    current = None
+    old = new = ''
+    for current, base_content, delta, is_keyframe in rows:
+        old = base_content if is_keyframe else new
+        new = apply_delta(old, delta)
+    if current != revision:
+        raise EntryHistory.DoesNotExist
+    return old, new
+
+
+def diff_revisions(entry_id, from_revision, to_revision):
+    """返回两个版本新内容之间的unified diff文本"""
+    _, old = get_revision_contents(entry_id, from_revision)
+    _, new = get_revision_contents(entry_id, to_revision)
+    # 按不带换行符的行比较，最后一行没有换行符时也不会和下一行粘在一起
+    return '\n'.join(difflib.unified_diff(
+        old.splitlines(),
+        new.splitlines(),
+        fromfile=f'r{from_revision}',
+        tofile=f'r{to_revision}',
+        lineterm='',
+    ))
@@ -0,0 +1,187 @@
+"""
+图片的缩放版本
+
+上传的词条图片和头像在事务提交后交给后台线程池或任务队列，用Pillow按ENTRY_IMAGE_VARIANTS /
+AVATAR_VARIANTS中的最长边生成WebP和JPEG两种格式的缩放版本，与原图存放在同一目录
+（foo.jpg -> foo.jpg__medium.webp），生成结果的路径和尺寸记录在模型的variants字段中。
+序列化时variants为空的旧图片会在此时排队补生成，生成完成前客户端回退使用原图。
+关闭JOB_QUEUE_EAGER时生成任务写入后台任务队列（encyclopedia.jobs），进程重启不会丢失。
+"""
+
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+# 模型 -> (原图字段, 变体记录字段, 变体尺寸配置项)
+IMAGE_FIELDS = {
+    'encyclopedia.EntryImage': ('image', 'variants', 'ENTRY_IMAGE_VARIANTS'),
+    'users.UserProfile': ('avatar', 'avatar_variants', 'AVATAR_VARIANTS'),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight = set()
+# 生成失败的实例在本进程内不再重试，避免损坏的图片在每次序列化时反复排队
+_failed = set()
+
+
+def variant_name(name, variant, extension):
+    """变体文件与原图同目录，保留原图扩展名以免foo.png与foo.jpg的变体互相覆盖"""
+    return f'{name}__{variant}.{extension}'
+
+
+def render_variants(name, specs, storage=default_storage):
+    """为存储中的原图生成全部变体，返回写入variants字段的字典"""
+    with storage.open(name, 'rb') as f:
+        original = ImageOps.exif_transpose(Image.open(f))
+        original.load()
+
+    variants = {}
+    for variant, size in specs.items():
+        image = original.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        files = {}
+        for extension, image_format in FORMATS.items():
+            # JPEG不支持透明通道和调色板
+            encoded = image if extension == 'webp' or image.mode == 'RGB' else image.convert('RGB')
+            buffer = io.BytesIO()
+            encoded.save(buffer, image_format, quality=settings.IMAGE_VARIANT_QUALITY, optimize=True)
+            path = variant_name(name, variant, extension)
+            if storage.exists(path):
+                storage.delete(path)
+            files[extension] = storage.save(path, ContentFile(buffer.getvalue()))
+        variants[variant] = {'width': image.width, 'height': image.height, **files}
+    return variants
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS,
+                thread_name_prefix='image-variants'
+            )
+        return _executor
+
+
+def generate(instance):
+    """同步生成一个模型实例的图片变体并写回变体记录字段"""
+    field_name, variants_field, specs_setting = IMAGE_FIELDS[instance._meta.label]
+    name = getattr(instance, field_name).name
+    variants = render_variants(name, getattr(settings, specs_setting))
+    # 原图在生成期间被替换时不覆盖新图片的结果
+    type(instance).objects.filter(pk=instance.pk, **{field_name: name}).update(**{variants_field: variants})
+    setattr(instance, variants_field, variants)
+    if hasattr(instance, 'entry_id'):
+        from . import cache as entry_cache
+
+        entry_cache.invalidate_entry(instance.entry_id)
+    return variants
+
+
+def _run(instance, key):
+    try:
+        generate(instance)
+    except Exception:
+        _failed.add(key)
+        logger.exception('生成图片变体失败：%s', key)
+    finally:
+        _in_flight.discard(key)
+        # 工作线程不经过请求周期，需手动关闭本线程的数据库连接
+        connection.close()
+
+
+def _dedup_key(instance):
+    return f'image_variants:{instance._meta.label}:{instance.pk}'
+
+
+def schedule(instance):
+    """安排生成变体，同一实例只排队一次
+
+    部署了任务队列时写入队列由worker生成，否则在当前事务提交后交给本进程的后台线程池。
+    """
+    field_name, _, _ = IMAGE_FIELDS[instance._meta.label]
+    if not getattr(instance, field_name):
+        return
+    key = (instance._meta.label, instance.pk)
+    with _executor_lock:
+        if key in _in_flight or key in _failed:
+            return
+        _in_flight.add(key)
+    if not settings.JOB_QUEUE_EAGER:
+        from . import jobs
+        from . import tasks
+
+        # 由worker生成，本进程内不再重复入队，重新上传时由schedule_if_changed清除标记
+        dedup_key = _dedup_key(instance)
+        if not jobs.has_failed(dedup_key):
+            tasks.generate_image_variants.enqueue(instance._meta.label, instance.pk, dedup_key=dedup_key)
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run, instance, key))
+
+
+def track_change(instance, update_fields=None):
+    """pre_save时调用：原图新建或被替换时清空旧的变体记录并标记需要生成
+
+    update_fields不含原图字段时（例如只更新计数）原图不会变化，不查询旧值。
+    """
+    field_name, variants_field, _ = IMAGE_FIELDS[instance._meta.label]
+    if update_fields is not None and field_name not in update_fields:
+        return
+    name = getattr(instance, field_name).name
+    if instance._state.adding:
+        previous = None
+    else:
+        previous = (
+            type(instance).objects.filter(pk=instance.pk)
+            .values_list(field_name, flat=True)
+            .first()
+        )
+    instance._image_changed = bool(name) and name != previous
+    if name != previous:
+        setattr(instance, variants_field, {})
+
+
+def schedule_if_changed(instance):
+    """post_save时调用：原图有变化时安排生成变体"""
+    if getattr(instance, '_image_changed', False):
+        instance._image_changed = False
+        key = (instance._meta.label, instance.pk)
+        _failed.discard(key)
+        if not settings.JOB_QUEUE_EAGER:
+            from . import jobs
+
+            _in_flight.discard(key)
+            jobs.clear_failed(_dedup_key(instance))
+        schedule(instance)
+
+
+def variant_urls(instance, request=None):
+    """返回{变体: {width, height, webp, jpeg}}，变体缺失时安排补生成并返回空字典"""
+    field_name, variants_field, _ = IMAGE_FIELDS[instance._meta.label]
+    if not getattr(instance, field_name):
+        return {}
+    variants = getattr(instance, variants_field)
+    if not variants:
+        schedule(instance)
+        return {}
+    urls = {}
+    for variant, info in variants.items():
+        urls[variant] = dict(info)
+        for extension in FORMATS:
+            url = default_storage.url(info[extension])
+            urls[variant][extension] = request.build_absolute_uri(url) if request else url
+    return urls
@@ -0,0 +1,234 @@
+"""
+词条的批量导入
+
+逐行读取JSONL（兼容export的输出，type为category的行会创建分类）或CSV，
+分类和作者通过预加载的名称 -> id映射解析，标题与预加载的标题集合去重，
+每batch_size条在一个事务中bulk_create，并同时写入全文索引和每日统计。
+bulk_create不触发保存信号，分类词条数和用户词条数在导入结束后统一校正一次。
+
+每个批次提交后可把已读取的行数写入检查点文件，中断后用同一检查点重跑会跳过这些行。
+输入读到一半出错（压缩文件截断、CSV或JSON格式错误等）时，已提交的批次保留，
+抛出的InvalidInput带有截至出错时的统计。
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import transaction
+
+from . import stats
+from .models import Category, Entry
+from .search import get_search_backend
+
+
+DEFAULT_BATCH_SIZE = 1000
+FORMATS = ('jsonl', 'csv')
+
+# 读取和解析输入时可能出现的错误；gzip截断为BadGzipFile(OSError)或EOFError，
+# JSON格式错误为ValueError
+INPUT_ERRORS = (ValueError, UnicodeDecodeError, EOFError, OSError, csv.Error)
+
+# JSONL中的值可以是任意JSON类型，这些字段只接受字符串，其他类型的行计为无效
+ENTRY_TEXT_FIELDS = ('title', 'content', 'summary', 'category', 'author')
+CATEGORY_TEXT_FIELDS = ('name', 'description')
+
+
+class InvalidInput(Exception):
+    """输入无法继续读取，result为出错前已提交批次的统计"""
+
+    def __init__(self, message, result):
+        super().__init__(message)
+        self.result = result
+
+
+def detect_format(filename):
+    """按文件名推断格式，.gz后缀表示gzip压缩"""
+    name = filename.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return 'csv' if name.endswith('.csv') else 'jsonl'
+
+
+def open_text(stream, filename=''):
+    """把二进制流包装为逐行读取的文本流，按需解压gzip"""
+    if filename.lower().endswith('.gz'):
+        stream = gzip.GzipFile(fileobj=stream)
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+
+def read_rows(text, file_format):
+    """逐行产出记录字典"""
+    if file_format == 'csv':
+        yield from csv.DictReader(text)
+        return
+    for line in text:
+        line = line.strip()
+        if line:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError('每行应为一个JSON对象')
+            yield row
+
+
+def read_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['rows']
+
+
+def write_checkpoint(path, rows):
+    # 先写临时文件再替换，避免中断时留下损坏的检查点
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'rows': rows}, f)
+    os.replace(tmp_path, path)
+
+
+class EntryImporter:
+    """批量导入词条和分类"""
+
+    def __init__(self, default_author=None, batch_size=DEFAULT_BATCH_SIZE, checkpoint=None, progress=None):
+        self.default_author = default_author
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        self.progress = progress
+        self.categories = dict(Category.objects.values_list('name', 'id'))
+        self.authors = {}
+        self.titles = set(Entry.objects.values_list('title', flat=True).iterator())
+        self.search_backend = get_search_backend()
+        self.result = {
+            'read': 0,
+            'created': 0,
+            'categories_created': 0,
+            'duplicates': 0,
+            'invalid': 0,
+            'errors': [],
+        }
+
+    def run(self, rows):
+        """导入全部记录，返回统计结果"""
+        started = time.monotonic()
+        skip = read_checkpoint(self.checkpoint)
+        rows = islice(rows, skip, None)
+        self.result['read'] = skip
+
+        error = None
+        try:
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    self._import_batch(batch)
+                self.result['read'] += len(batch)
+                if self.checkpoint:
+                    write_checkpoint(self.checkpoint, self.result['read'])
+                if self.progress:
+                    self.progress(self.result, time.monotonic() - started)
+        except INPUT_ERRORS as exc:
+            error = exc
+
+        # bulk_create不触发信号，冗余计数统一校正一次；出错时已提交的批次同样需要校正
+        call_command('reconcile_category_counts', stdout=io.StringIO())
+        call_command('reconcile_profile_counts', stdout=io.StringIO())
+
+        elapsed = time.monotonic() - started
+        self.result['elapsed'] = round(elapsed, 3)
+        self.result['rows_per_second'] = round((self.result['read'] - skip) / elapsed, 1) if elapsed else 0
+        if error is not None:
+            raise InvalidInput(f'第 {self.result["read"]} 行之后的输入无法读取：{error}', self.result) from error
+        return self.result
+
+    def _import_batch(self, rows):
+        entries = []
+        for line, row in enumerate(rows, start=self.result['read'] + 1):
+            if row.get('type') == 'category':
+                if self._check_types(row, CATEGORY_TEXT_FIELDS, line):
+                    self._resolve_category(row.get('name'), row.get('description') or '')
+                continue
+            entry = self._build_entry(row, line)
+            if entry is not None:
+                entries.append(entry)
+        if not entries:
+            return
+        created = Entry.objects.bulk_create(entries)
+        self.search_backend.index_entries(created)
+        stats.record_entries_created(created)
+        self.result['created'] += len(created)
+
+    def _build_entry(self, row, line):
+        if not self._check_types(row, ENTRY_TEXT_FIELDS, line):
+            return None
+        is_published = row.get('is_published')
+        if is_published is not None and not isinstance(is_published, (str, bool, int)):
+            self._invalid(line, 'is_published应为布尔值')
+            return None
+        title = (row.get('title') or '').strip()
+        content = row.get('content') or ''
+        if not title or len(title) > 200 or not content:
+            self._invalid(line, '标题或内容为空，或标题超过200字')
+            return None
+        if title in self.titles:
+            self.result['duplicates'] += 1
+            return None
+        author_id = self._resolve_author(row.get('author'))
+        if author_id is None:
+            self._invalid(line, f'作者不存在：{row.get("author")}')
+            return None
+
+        self.titles.add(title)
+        if isinstance(is_published, str):
+            is_published = is_published.strip().lower()
+            # 空单元格视为未提供，与缺少该列一样使用模型默认值
+            is_published = is_published not in ('0', 'false', 'no') if is_published else None
+        entry = Entry(
+            title=title,
+            content=content,
+            summary=(row.get('summary') or '')[:500],
+            category_id=self._resolve_category(row.get('category')),
+            author_id=author_id
+        )
+        if is_published is not None:
+            entry.is_published = bool(is_published)
+        return entry
+
+    def _resolve_category(self, name, description=''):
+        name = (name or '').strip()
+        if not name:
+            return None
+        if name not in self.categories:
+            category, created = Category.objects.get_or_create(
+                name=name, defaults={'description': description}
+            )
+            self.categories[name] = category.pk
+            self.result['categories_created'] += int(created)
+        return self.categories[name]
+
+    def _resolve_author(self, username):
+        username = (username or '').strip()
+        if not username:
+            return self.default_author.pk if self.default_author else None
+        if username not in self.authors:
+            # 作者数量远少于词条数，按需查询后缓存
+            self.authors[username] = User.objects.filter(username=username).values_list('id', flat=True).first()
+        return self.authors[username]
+
+    def _check_types(self, row, fields, line):
+        wrong = [field for field in fields if row.get(field) is not None and not isinstance(row[field], str)]
+        if wrong:
+            self._invalid(line, f'字段应为字符串：{"、".join(wrong)}')
+        return not wrong
+
+    def _invalid(self, line, message):
+        self.result['invalid'] += 1
+        # 只保留前若干条错误，避免大文件把结果撑大
+        if len(self.result['errors']) < 100:
+            self.result['errors'].append({'row': line, 'error': message})
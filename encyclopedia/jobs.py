@@ -0,0 +1,259 @@
+"""
+基于数据库的后台任务队列
+
+任务与业务数据写在同一个数据库、同一个事务中，事务回滚时任务也不会入队；
+worker（manage.py run_jobs）按计划时间领取任务并在租约内执行，不需要外部消息中间件。
+
+- 至少执行一次：删除任务行和任务的写操作在同一个事务中提交；worker中途退出时事务回滚，
+  租约到期后任务会被其他worker重新领取。
+- 失败重试：按指数退避（带随机抖动）重新排队，超过最多执行次数后标记为已放弃，保留错误信息。
+- 去重：等待执行的任务中dedup_key唯一，重复入队会被忽略。
+- 顺序：sequence_key相同的任务按入队顺序逐个执行。
+
+JOB_QUEUE_EAGER开启时enqueue直接在当前进程中同步执行任务，不写入队列，
+未部署worker的开发环境与此前行为相同；drain()可在当前进程中同步执行队列中的全部到期任务。
+"""
+
+import logging
+import os
+import random
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# 任务名 -> Task
+registry = {}
+
+
+class LeaseExpired(Exception):
+    """任务执行超过租约，已被其他worker重新领取"""
+
+
+class Task:
+    """注册到队列的任务，直接调用时同步执行，enqueue时写入队列"""
+
+    def __init__(self, func, name, max_attempts=None):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args):
+        return self.func(*args)
+
+    def enqueue(self, *args, dedup_key=None, sequence_key=None, delay=0):
+        return enqueue(self.name, *args, dedup_key=dedup_key, sequence_key=sequence_key, delay=delay)
+
+
+def task(name=None, max_attempts=None):
+    """把函数注册为任务，参数须可JSON序列化"""
+    def decorator(func):
+        registered = Task(func, name or f'{func.__module__}.{func.__name__}', max_attempts)
+        registry[registered.name] = registered
+        return registered
+    return decorator
+
+
+def enqueue(name, *args, dedup_key=None, sequence_key=None, delay=0):
+    """写入一个任务，随当前事务提交生效；同步执行时返回None"""
+    from .models import Job
+
+    if settings.JOB_QUEUE_EAGER:
+        registry[name](*args)
+        return None
+
+    max_attempts = registry[name].max_attempts or settings.JOB_MAX_ATTEMPTS
+    job = Job(
+        name=name,
+        args=list(args),
+        dedup_key=dedup_key,
+        sequence_key=sequence_key,
+        max_attempts=max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    if dedup_key is None:
+        job.save()
+        return job
+    # 已有相同dedup_key的等待任务时忽略
+    Job.objects.bulk_create([job], ignore_conflicts=True)
+    return job
+
+
+def has_failed(dedup_key):
+    """是否有相同dedup_key的任务已被放弃"""
+    from .models import Job
+
+    return Job.objects.filter(dedup_key=dedup_key, status=Job.FAILED).exists()
+
+
+def clear_failed(dedup_key):
+    """删除相同dedup_key的已放弃任务"""
+    from .models import Job
+
+    Job.objects.filter(dedup_key=dedup_key, status=Job.FAILED).delete()
+
+
+def _claimable(now):
+    from .models import Job
+
+    # 同一顺序键中还有更早的未完成任务时不领取
+    earlier = Job.objects.filter(
+        sequence_key=OuterRef('sequence_key'), id__lt=OuterRef('id')
+    ).exclude(status=Job.FAILED)
+    return Job.objects.filter(
+        Q(status=Job.PENDING, run_at__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now)
+    ).filter(~Exists(earlier))
+
+
+def claim(limit=10):
+    """领取至多limit个到期任务，租约到期未完成的任务可被重新领取"""
+    from .models import Job
+
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    claimable = _claimable(now)
+    # 单条UPDATE完成领取，多个worker之间不会领到同一个任务
+    claimed = claimable.filter(
+        pk__in=claimable.order_by('run_at', 'id').values('pk')[:limit]
+    ).update(
+        status=Job.RUNNING,
+        attempts=F('attempts') + 1,
+        locked_by=token,
+        locked_until=now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+    )
+    if not claimed:
+        return []
+    return list(Job.objects.filter(locked_by=token).order_by('run_at', 'id'))
+
+
+def backoff(attempts):
+    """第attempts次执行失败后的重试间隔（秒）"""
+    delay = min(settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1), settings.JOB_RETRY_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1)
+
+
+def execute(job):
+    """执行一个已领取的任务，成功返回True"""
+    from .models import Job
+
+    try:
+        with transaction.atomic():
+            # 先删除任务行：事务以写操作开始，SQLite会在busy_timeout内等待写锁，
+            # 而不是在先读后写的锁升级时直接报database is locked；任务失败时删除随事务回滚
+            deleted, _ = Job.objects.filter(pk=job.pk, locked_by=job.locked_by).delete()
+            if not deleted:
+                raise LeaseExpired(job.pk)
+            registry[job.name](*job.args)
+    except LeaseExpired:
+        logger.warning('任务执行超过租约，结果已回滚：%s #%s', job.name, job.pk)
+        return False
+    except Exception:
+        logger.exception('任务执行失败：%s #%s', job.name, job.pk)
+        _fail(job, traceback.format_exc())
+        return False
+    metrics.inc('baike_jobs_total', task=job.name, result='succeeded')
+    return True
+
+
+def _fail(job, error):
+    from .models import Job
+
+    jobs = Job.objects.filter(pk=job.pk, locked_by=job.locked_by)
+    if job.attempts >= job.max_attempts or job.name not in registry:
+        jobs.update(status=Job.FAILED, locked_until=None, last_error=error)
+        metrics.inc('baike_jobs_total', task=job.name, result='failed')
+        return
+    metrics.inc('baike_jobs_total', task=job.name, result='retried')
+    try:
+        with transaction.atomic():
+            jobs.update(
+                status=Job.PENDING,
+                run_at=timezone.now() + timedelta(seconds=backoff(job.attempts)),
+                locked_by='',
+                locked_until=None,
+                last_error=error,
+            )
+    except IntegrityError:
+        # 期间已有相同dedup_key的任务入队，由它完成
+        jobs.delete()
+
+
+def work_once(limit=10):
+    """领取并执行一批任务，返回执行的任务数"""
+    jobs = claim(limit)
+    for job in jobs:
+        if job.name not in registry:
+            _fail(job, f'未注册的任务：{job.name}')
+        elif job.attempts > job.max_attempts:
+            # 之前每次执行都在完成前中断（例如worker进程崩溃），不再重试
+            _fail(job, job.last_error or '执行多次中断')
+        else:
+            execute(job)
+    return len(jobs)
+
+
+def drain(limit=10):
+    """在当前进程中同步执行全部到期任务，返回执行的任务数"""
+    count = 0
+    while True:
+        executed = work_once(limit)
+        if not executed:
+            return count
+        count += executed
+
+
+def work(batch_size=10, poll_interval=None, stopping=None):
+    """worker主循环，stopping为可选的Event，设置后执行完当前批次退出"""
+    poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    logger.info('任务worker启动：pid %s', os.getpid())
+    while stopping is None or not stopping.is_set():
+        try:
+            executed = work_once(batch_size)
+        except Exception:
+            logger.exception('领取任务失败')
+            executed = 0
+        finally:
+            # 长时间运行的进程不经过请求周期，按CONN_MAX_AGE关闭数据库连接
+            close_old_connections()
+        if not executed:
+            if stopping is None:
+                time.sleep(poll_interval)
+            else:
+                stopping.wait(poll_interval)
+
+
+def retry_failed(queryset=None):
+    """把已放弃的任务重新排队并清零执行次数，返回重新排队的任务数"""
+    from .models import Job
+
+    queryset = Job.objects.all() if queryset is None else queryset
+    count = 0
+    for job in queryset.filter(status=Job.FAILED):
+        try:
+            with transaction.atomic():
+                Job.objects.filter(pk=job.pk).update(
+                    status=Job.PENDING, attempts=0, run_at=timezone.now(), locked_by='', locked_until=None
+                )
+            count += 1
+        except IntegrityError:
+            # 已有相同dedup_key的等待任务
+            job.delete()
+    return count
+
+
+def queue_depth():
+    """按状态统计队列中的任务数"""
+    from .models import Job
+
+    counts = dict(Job.objects.values_list('status').annotate(count=Count('id')).order_by())
+    return {status: counts.get(status, 0) for status, _ in Job.STATUS_CHOICES}
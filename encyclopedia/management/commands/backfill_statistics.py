@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from encyclopedia import stats
+
+
+class Command(BaseCommand):
+    """按词条表重建每日统计汇总"""
+    help = '清空并回填词条每日统计，已有的浏览数和点赞数计入词条创建当天'
+
+    def handle(self, *args, **options):
+        count = stats.backfill()
+        self.stdout.write(self.style.SUCCESS(f'已写入 {count} 行每日统计'))
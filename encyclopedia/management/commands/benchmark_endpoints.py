@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from encyclopedia import benchmark, corpus
+
+
+class Command(BaseCommand):
+    """压测encyclopedia.urls和users.urls中的接口，结果保存为JSON并可与基线比较"""
+    help = '逐个接口压测吞吐量和延迟分位数，结果写入BENCHMARK_RESULTS_DIR，--compare与之前的结果比较'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='每个接口的请求数')
+        parser.add_argument('--concurrency', type=int, default=8, help='并发线程数')
+        parser.add_argument('--warmup', type=int, default=10, help='每个接口计时前的预热请求数')
+        parser.add_argument('--base-url', help='向该地址的服务器发HTTP请求，不指定则用测试客户端在进程内请求')
+        parser.add_argument('--username', default=f'{corpus.SYNTHETIC_PREFIX}user_00000', help='需要登录的接口使用的用户')
+        parser.add_argument('--password', default=corpus.PASSWORD, help='登录接口使用的密码')
+        parser.add_argument('--endpoint', action='append', help='只压测指定接口，可重复；--list查看接口名')
+        parser.add_argument('--include-writes', action='store_true', help='同时压测点赞/取消点赞等写接口')
+        parser.add_argument('--list', action='store_true', help='列出接口和未覆盖的路由后退出')
+        parser.add_argument('--output', help='结果文件路径，默认写入BENCHMARK_RESULTS_DIR')
+        parser.add_argument('--compare', help='与该结果文件比较，latest表示结果目录中最新的一次')
+        parser.add_argument('--threshold', type=float, default=10.0, help='视为退化的变化百分比')
+        parser.add_argument('--fail-on-regression', action='store_true', help='出现退化时以非零状态退出')
+
+    def handle(self, *args, **options):
+        endpoints = [
+            endpoint for endpoint in benchmark.ENDPOINTS
+            if options['include_writes'] or not endpoint.write
+        ]
+        if options['endpoint']:
+            unknown = set(options['endpoint']) - {endpoint.name for endpoint in benchmark.ENDPOINTS}
+            if unknown:
+                raise CommandError(f'未知的接口：{", ".join(sorted(unknown))}')
+            endpoints = [endpoint for endpoint in benchmark.ENDPOINTS if endpoint.name in options['endpoint']]
+
+        if options['list']:
+            for endpoint in benchmark.ENDPOINTS:
+                note = '（写接口）' if endpoint.write else ''
+                self.stdout.write(f'{endpoint.name:<22} {endpoint.method:<5} {endpoint.path}{note}')
+            self.stdout.write(f'未覆盖的路由：{", ".join(benchmark.uncovered_routes(benchmark.ENDPOINTS))}')
+            return
+
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f'用户不存在：{options["username"]}，先运行generate_corpus或用--username指定')
+        token, _ = Token.objects.get_or_create(user=user)
+        fixtures = benchmark.Fixtures(user, options['password'])
+        if options['base_url']:
+            transport = benchmark.HttpTransport(token.key, options['base_url'])
+        else:
+            transport = benchmark.ClientTransport(token.key)
+
+        baseline_path = options['compare']
+        if baseline_path == 'latest':
+            baseline_path = benchmark.latest_result()
+            if baseline_path is None:
+                self.stdout.write('结果目录中没有可比较的结果')
+        baseline = benchmark.load(baseline_path) if baseline_path else None
+
+        result = {
+            'meta': benchmark.metadata(transport, options['requests'], options['concurrency'], options['warmup']),
+            'endpoints': {},
+            'uncovered': benchmark.uncovered_routes(endpoints),
+        }
+        # 测试客户端以testserver为主机名，来源地址为127.0.0.1，视为内部地址以便读取Server-Timing
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            INTERNAL_IPS=[*settings.INTERNAL_IPS, '127.0.0.1'],
+        ):
+            for endpoint in endpoints:
+                summary = benchmark.run_endpoint(
+                    transport, endpoint, fixtures, options['requests'], options['concurrency'], options['warmup']
+                )
+                result['endpoints'][endpoint.name] = summary
+                self.stdout.write(self._format_summary(endpoint.name, summary))
+
+        output = options['output'] or benchmark.result_path(result)
+        benchmark.save(result, output)
+        self.stdout.write(self.style.SUCCESS(f'结果已写入 {output}'))
+        if result['uncovered'] and not options['endpoint']:
+            self.stdout.write(f'未覆盖的路由：{", ".join(result["uncovered"])}')
+
+        if baseline is None:
+            return
+        if baseline['meta'].get('corpus') != result['meta']['corpus']:
+            self.stdout.write(self.style.WARNING('基线的语料规模与本次不同，结果可能不可比'))
+        rows = benchmark.compare(baseline, result, options['threshold'] / 100)
+        regressions = [row for row in rows if row[5]]
+        self.stdout.write(f'与 {baseline_path}（提交 {(baseline["meta"].get("commit") or "unknown")[:10]}）比较：')
+        for name, metric, old, new, change, regressed in rows:
+            line = f'  {name:<22} {metric:<10} {old:>10} -> {new:<10} {change:+.1%}'
+            self.stdout.write(self.style.ERROR(line) if regressed else line)
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'{len(regressions)} 项指标退化超过 {options["threshold"]}%')
+
+    def _format_summary(self, name, summary):
+        if summary is None:
+            return f'{name:<22} 跳过：数据库中没有所需的样本数据'
+        latency = summary['latency_ms']
+        queries = '' if summary['db_queries'] is None else f'，查询 {summary["db_queries"]} 次/{summary["db_ms"]} ms'
+        return (
+            f'{name:<22} {summary["throughput"]:>8} 请求/秒，p50 {latency["p50"]} ms，'
+            f'p90 {latency["p90"]} ms，p99 {latency["p99"]} ms，失败 {summary["errors"]}{queries}'
+        )
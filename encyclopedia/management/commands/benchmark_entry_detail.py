@@ -0,0 +1,65 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.test import APIRequestFactory
+
+from encyclopedia.counters import view_counter
+from encyclopedia.models import Entry
+from encyclopedia.views import EntryViewSet
+
+
+class Command(BaseCommand):
+    """对比同步写入与缓冲写回两种浏览计数方式下词条详情接口的吞吐量"""
+    help = '压测词条详情接口，比较同步更新浏览次数与写回缓冲的吞吐量'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='每种模式的请求总数')
+        parser.add_argument('--threads', type=int, default=8, help='并发线程数')
+        parser.add_argument('--entries', type=int, default=20, help='参与压测的词条数')
+
+    def handle(self, *args, **options):
+        entries = list(
+            Entry.objects.filter(is_published=True)
+            .order_by('-created_at')
+            .values_list('id', 'view_count')[:options['entries']]
+        )
+        if not entries:
+            raise CommandError('没有已发布的词条可供压测')
+        # 压测结束后恢复原始浏览次数
+        original_counts = dict(entries)
+        entry_ids = list(original_counts)
+
+        view = EntryViewSet.as_view({'get': 'retrieve'})
+        factory = APIRequestFactory()
+
+        def hit(i):
+            entry_id = entry_ids[i % len(entry_ids)]
+            request = factory.get(f'/api/entries/{entry_id}/')
+            request.user = AnonymousUser()
+            try:
+                return view(request, pk=entry_id).status_code
+            finally:
+                connection.close()
+
+        enabled = view_counter.enabled
+        try:
+            for label, buffered in (('同步写入', False), ('缓冲写回', True)):
+                view_counter.enabled = buffered
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                    statuses = list(pool.map(hit, range(options['requests'])))
+                elapsed = time.perf_counter() - started
+                backlog = view_counter.backlog
+                view_counter.flush()
+                errors = sum(1 for code in statuses if code != 200)
+                self.stdout.write(
+                    f'{label}: {options["requests"] / elapsed:.1f} 请求/秒，'
+                    f'失败 {errors} 次，结束时积压 {backlog} 次浏览'
+                )
+        finally:
+            view_counter.enabled = enabled
+            for entry_id, view_count in original_counts.items():
+                Entry.objects.filter(pk=entry_id).update(view_count=view_count)
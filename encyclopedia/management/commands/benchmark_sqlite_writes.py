@@ -0,0 +1,122 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from encyclopedia.sqlite import apply_pragmas
+
+
+class Command(BaseCommand):
+    """在临时数据库上对比SQLite默认配置与调优配置在并发写入下的锁错误和吞吐量"""
+    help = '并发读写压测：默认回滚日志 / WAL调优 / WAL调优+BEGIN IMMEDIATE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='写线程数')
+        parser.add_argument('--readers', type=int, default=4, help='读线程数')
+        parser.add_argument('--operations', type=int, default=300, help='每个写线程的写事务数')
+        parser.add_argument('--rows', type=int, default=100, help='被更新的行数')
+
+    def handle(self, *args, **options):
+        tuned_pragmas = {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 5000,
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64000,
+            'temp_store': 'MEMORY',
+        }
+        # 未设置SQLITE_PRAGMAS时（stock配置）用上面的调优参数做对比
+        tuned_pragmas = settings.SQLITE_PRAGMAS or tuned_pragmas
+        profiles = [
+            ('默认配置', {'journal_mode': 'DELETE'}, False),
+            ('WAL调优', tuned_pragmas, False),
+            ('WAL调优+BEGIN IMMEDIATE', tuned_pragmas, True),
+        ]
+        for label, pragmas, immediate in profiles:
+            result = self._run(pragmas, immediate, options)
+            self.stdout.write(
+                f'{label}: 写 {result["writes"] / result["elapsed"]:.0f} 事务/秒，'
+                f'读 {result["reads"] / result["elapsed"]:.0f} 次/秒，'
+                f'锁错误 {result["lock_errors"]} 次，计数{"一致" if result["consistent"] else "不一致"}'
+            )
+
+    def _run(self, pragmas, immediate, options):
+        directory = tempfile.mkdtemp(prefix='baike-sqlite-bench-')
+        path = os.path.join(directory, 'bench.sqlite3')
+        setup = sqlite3.connect(path)
+        setup.execute('CREATE TABLE entry (id INTEGER PRIMARY KEY, view_count INTEGER NOT NULL)')
+        setup.executemany('INSERT INTO entry VALUES (?, 0)', [(i,) for i in range(options['rows'])])
+        setup.commit()
+        setup.close()
+
+        done = threading.Event()
+        counters = {'writes': 0, 'reads': 0, 'lock_errors': 0}
+        counters_lock = threading.Lock()
+
+        def connect():
+            # 与Django一致：Python默认5秒超时，事务由显式BEGIN开启
+            conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            apply_pragmas(conn.cursor(), pragmas)
+            return conn
+
+        def write_transaction(conn, row_id):
+            # 先读后写，模拟ORM中常见的读-改-写事务；immediate时开始即取得写锁
+            conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+            try:
+                conn.execute('SELECT view_count FROM entry WHERE id = ?', (row_id,)).fetchone()
+                conn.execute('UPDATE entry SET view_count = view_count + 1 WHERE id = ?', (row_id,))
+                conn.execute('COMMIT')
+            except sqlite3.OperationalError:
+                conn.execute('ROLLBACK')
+                raise
+
+        def writer(seed):
+            conn = connect()
+            for i in range(options['operations']):
+                row_id = (seed * 7919 + i) % options['rows']
+                try:
+                    write_transaction(conn, row_id)
+                    key = 'writes'
+                except sqlite3.OperationalError as exc:
+                    if 'locked' not in str(exc) and 'busy' not in str(exc):
+                        raise
+                    key = 'lock_errors'
+                with counters_lock:
+                    counters[key] += 1
+            conn.close()
+
+        def reader():
+            conn = connect()
+            while not done.is_set():
+                try:
+                    conn.execute('SELECT SUM(view_count) FROM entry').fetchone()
+                    with counters_lock:
+                        counters['reads'] += 1
+                except sqlite3.OperationalError:
+                    with counters_lock:
+                        counters['lock_errors'] += 1
+            conn.close()
+
+        readers = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        writers = [threading.Thread(target=writer, args=(n,)) for n in range(options['writers'])]
+        started = time.perf_counter()
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        for thread in readers:
+            thread.join()
+
+        check = sqlite3.connect(path)
+        total = check.execute('SELECT SUM(view_count) FROM entry').fetchone()[0]
+        check.close()
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+        return {**counters, 'elapsed': elapsed, 'consistent': total == counters['writes']}
@@ -0,0 +1,74 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from encyclopedia import querybudget
+from encyclopedia.models import Entry
+
+
+class Command(BaseCommand):
+    """检查每个接口的查询次数上限和热点查询的查询计划，供CI在合成语料上运行"""
+    help = '逐个接口检查查询次数不超过上限且不随分页大小增长，语料足够大时检查热点表是否被全表扫描'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='发起请求的用户，默认取收藏和点赞最多的用户')
+        parser.add_argument('--route', action='append', help='只检查指定路由名，可重复')
+        parser.add_argument('--min-entries', type=int, default=1000, help='词条数达到该值才检查查询计划')
+        parser.add_argument('--skip-plans', action='store_true', help='不检查查询计划')
+        parser.add_argument('--show-sql', action='store_true', help='输出未通过检查的请求执行的SQL')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(f'用户不存在：{options["username"]}')
+        try:
+            fixtures = querybudget.Fixtures(user)
+        except ValueError as exc:
+            raise CommandError(f'{exc}，先运行generate_corpus')
+        token = querybudget.get_token(fixtures.user)
+
+        check_plans = not options['skip_plans']
+        entry_count = Entry.objects.count()
+        if check_plans and entry_count < options['min_entries']:
+            self.stdout.write(self.style.WARNING(
+                f'只有 {entry_count} 个词条，少于 {options["min_entries"]}，小表的查询计划没有参考价值，跳过计划检查'
+            ))
+            check_plans = False
+
+        checks = querybudget.CHECKS
+        if options['route']:
+            checks = [check for check in checks if check.name in options['route']]
+            if not checks:
+                raise CommandError(f'没有匹配的路由：{", ".join(options["route"])}')
+
+        failed = 0
+        for check in checks:
+            result = querybudget.run_check(check, fixtures, token, check_plans=check_plans)
+            label = f'{check.method:<6} {check.path}'
+            if 'skipped' in result:
+                self.stdout.write(self.style.WARNING(f'跳过 {label}：{result["skipped"]}'))
+                continue
+            queries = ' -> '.join(str(count) for count in result['queries'].values())
+            if not result['failures']:
+                self.stdout.write(f'通过 {label}：{queries} 次查询（上限 {check.max_queries}）')
+                continue
+            failed += 1
+            self.stdout.write(self.style.ERROR(f'失败 {label}：{queries} 次查询（上限 {check.max_queries}）'))
+            for failure in result['failures']:
+                self.stdout.write(f'    {failure}')
+            for sql, scan in result['scans']:
+                self.stdout.write(f'    {scan}：{sql}')
+            if options['show_sql']:
+                for size, statements in result['sql'].items():
+                    self.stdout.write(f'    规模{size}：')
+                    for sql in statements:
+                        self.stdout.write(f'      {sql}')
+
+        uncovered = querybudget.uncovered_routes()
+        if uncovered:
+            failed += 1
+            self.stdout.write(self.style.ERROR(f'没有检查的路由：{", ".join(uncovered)}'))
+        if failed:
+            raise CommandError(f'{failed} 项检查未通过')
+        self.stdout.write(self.style.SUCCESS(f'{len(checks)} 项检查全部通过'))
@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from encyclopedia import export
+
+
+class Command(BaseCommand):
+    """流式导出分类和词条，供定时备份任务使用"""
+    help = '以NDJSON（可选gzip）格式导出分类、词条及编辑历史'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', default='-', help='输出文件路径，默认输出到标准输出')
+        parser.add_argument('--gzip', action='store_true', help='gzip压缩输出')
+        parser.add_argument('--history', action='store_true', help='附带每个词条的编辑历史')
+        parser.add_argument('--updated-since', help='只导出此后修改过的词条，ISO日期或日期时间')
+        parser.add_argument('--chunk-size', type=int, default=export.DEFAULT_CHUNK_SIZE, help='每批读取的词条数')
+
+    def handle(self, *args, **options):
+        updated_since = None
+        if options['updated_since']:
+            try:
+                updated_since = export.parse_since(options['updated_since'])
+            except ValueError:
+                raise CommandError('--updated-since 必须是ISO日期或日期时间')
+
+        chunks = export.iter_export(
+            updated_since=updated_since,
+            include_history=options['history'],
+            compress=options['gzip'],
+            chunk_size=options['chunk_size']
+        )
+        if options['output'] == '-':
+            output = sys.stdout.buffer
+            for chunk in chunks:
+                output.write(chunk)
+            output.flush()
+            return
+
+        written = 0
+        with open(options['output'], 'wb') as output:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        self.stderr.write(self.style.SUCCESS(f'已导出到 {options["output"]}，共 {written} 字节'))
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from encyclopedia import corpus
+
+
+class Command(BaseCommand):
+    """生成供基准测试使用的合成语料，相同参数和种子生成相同的数据"""
+    help = '按指定规模生成合成用户、分类、词条、编辑历史、收藏、点赞和图片'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='用户数')
+        parser.add_argument('--categories', type=int, default=20, help='分类数')
+        parser.add_argument('--entries', type=int, default=5000, help='词条数')
+        parser.add_argument('--content-length', type=int, default=1500, help='正文长度的中位数（字）')
+        parser.add_argument('--content-sigma', type=float, default=0.6, help='正文长度对数正态分布的σ')
+        parser.add_argument('--history-depth', type=int, default=5, help='每个词条编辑次数的上限')
+        parser.add_argument('--favorites', type=float, default=20, help='每个用户平均收藏数')
+        parser.add_argument('--likes', type=float, default=30, help='每个用户平均点赞数')
+        parser.add_argument('--images', type=float, default=0.05, help='带图片的词条比例')
+        parser.add_argument('--days', type=int, default=365, help='词条创建时间分布的天数')
+        parser.add_argument('--seed', type=int, default=42, help='随机种子')
+        parser.add_argument('--clear', action='store_true', help='先删除已有的合成数据')
+        parser.add_argument('--clear-only', action='store_true', help='只删除合成数据，不重新生成')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users至少为1')
+        if not 0 <= options['images'] <= 1:
+            raise CommandError('--images应在0到1之间')
+
+        if options['clear'] or options['clear_only']:
+            deleted = corpus.clear()
+            self.stdout.write(f'已删除 {deleted} 个合成词条')
+            if options['clear_only']:
+                corpus.rebuild_derived()
+                return
+        elif corpus.exists():
+            raise CommandError(f'已存在以{corpus.SYNTHETIC_PREFIX}开头的合成数据，使用--clear重新生成')
+
+        started = time.monotonic()
+        created = corpus.generate(
+            users=options['users'],
+            categories=options['categories'],
+            entries=options['entries'],
+            content_length=options['content_length'],
+            content_sigma=options['content_sigma'],
+            history_depth=options['history_depth'],
+            favorites=options['favorites'],
+            likes=options['likes'],
+            images=options['images'],
+            days=options['days'],
+            seed=options['seed'],
+            progress=self.stdout.write,
+        )
+        summary = '，'.join(f'{name} {count}' for name, count in created.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'已生成 {summary}，耗时 {time.monotonic() - started:.1f} 秒；'
+            f'合成用户的密码为 {corpus.PASSWORD}'
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from encyclopedia import images
+from encyclopedia.models import EntryImage
+from users.models import UserProfile
+
+
+class Command(BaseCommand):
+    """为尚未生成缩放版本的词条图片和头像同步补生成"""
+    help = '生成词条图片和用户头像的WebP/JPEG缩放版本'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='重新生成所有图片的缩放版本')
+
+    def handle(self, *args, **options):
+        querysets = [
+            EntryImage.objects.exclude(image=''),
+            UserProfile.objects.exclude(avatar='').exclude(avatar__isnull=True),
+        ]
+        generated = failed = 0
+        for queryset in querysets:
+            if not options['force']:
+                _, variants_field, _ = images.IMAGE_FIELDS[queryset.model._meta.label]
+                queryset = queryset.filter(**{variants_field: {}})
+            for instance in queryset.iterator():
+                try:
+                    images.generate(instance)
+                    generated += 1
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'{instance._meta.label} {instance.pk}: {exc}')
+        self.stdout.write(self.style.SUCCESS(f'已生成 {generated} 张图片的缩放版本，失败 {failed} 张'))
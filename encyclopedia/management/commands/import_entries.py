@@ -0,0 +1,53 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from encyclopedia import importer
+
+
+class Command(BaseCommand):
+    """批量导入词条，适合数十万条规模的初始化和迁移"""
+    help = '从JSONL或CSV文件（可gzip压缩）批量导入词条和分类'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='输入文件路径，.csv为CSV，其余按JSONL读取，.gz后缀表示gzip压缩')
+        parser.add_argument('--format', choices=importer.FORMATS, help='指定输入格式，默认按文件名推断')
+        parser.add_argument('--author', help='记录中未指定作者时使用的用户名')
+        parser.add_argument('--batch-size', type=int, default=importer.DEFAULT_BATCH_SIZE, help='每个事务写入的词条数')
+        parser.add_argument('--checkpoint', help='检查点文件，存在时跳过其中记录的已导入行数')
+
+    def handle(self, *args, **options):
+        default_author = None
+        if options['author']:
+            default_author = User.objects.filter(username=options['author']).first()
+            if default_author is None:
+                raise CommandError(f'用户不存在：{options["author"]}')
+
+        def progress(result, elapsed):
+            self.stdout.write(
+                f'已读取 {result["read"]} 行，新建 {result["created"]} 条，'
+                f'{result["created"] / elapsed:.0f} 条/秒'
+            )
+
+        file_format = options['format'] or importer.detect_format(options['path'])
+        with open(options['path'], 'rb') as stream:
+            rows = importer.read_rows(importer.open_text(stream, options['path']), file_format)
+            try:
+                result = importer.EntryImporter(
+                    default_author=default_author,
+                    batch_size=options['batch_size'],
+                    checkpoint=options['checkpoint'],
+                    progress=progress
+                ).run(rows)
+            except importer.InvalidInput as exc:
+                raise CommandError(
+                    f'{exc}；已新建词条 {exc.result["created"]} 条，'
+                    f'使用--checkpoint重跑可跳过已提交的行'
+                )
+
+        for error in result['errors']:
+            self.stderr.write(f'第 {error["row"]} 行：{error["error"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'导入完成：读取 {result["read"]} 行，新建词条 {result["created"]} 条、分类 {result["categories_created"]} 个，'
+            f'重复 {result["duplicates"]} 条，无效 {result["invalid"]} 条，'
+            f'耗时 {result["elapsed"]:.2f} 秒（{result["rows_per_second"]:.0f} 行/秒）'
+        ))
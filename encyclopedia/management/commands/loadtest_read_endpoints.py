@@ -0,0 +1,95 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from encyclopedia.models import Entry
+
+
+class Command(BaseCommand):
+    """在进程内对比WSGI同步视图与ASGI异步视图在并发下的延迟"""
+    help = '并发压测检索、词条详情和统计接口，输出WSGI与ASGI两条路径的p50/p99延迟'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=600, help='每条路径的请求总数')
+        parser.add_argument('--concurrency', type=int, default=16, help='并发数（WSGI为线程数，ASGI为协程数）')
+        parser.add_argument('--query', default='百科', help='检索词')
+        parser.add_argument('--username', help='统计接口使用的用户，不指定则不压测统计接口')
+
+    def handle(self, *args, **options):
+        entry_ids = list(Entry.objects.filter(is_published=True).values_list('id', flat=True)[:20])
+        if not entry_ids:
+            raise CommandError('没有已发布的词条可供压测')
+        paths = [f'/api/search/?q={options["query"]}'] + [f'/api/entries/{pk}/' for pk in entry_ids]
+        headers = {}
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(f'用户不存在：{options["username"]}')
+            token, _ = Token.objects.get_or_create(user=user)
+            headers['Authorization'] = f'Token {token.key}'
+            paths.append('/api/encyclopedia/statistics/')
+        requests = [paths[i % len(paths)] for i in range(options['requests'])]
+
+        # 测试客户端以testserver为主机名
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            # 预热缓存和数据库连接，两条路径从相同状态开始
+            warmup = Client(headers=headers)
+            for path in paths:
+                warmup.get(path)
+
+            wsgi = self._run_wsgi(requests, options['concurrency'], headers)
+            with override_settings(ROOT_URLCONF='baike.asgi_urls'):
+                asgi = asyncio.run(self._run_asgi(requests, options['concurrency'], headers))
+        for label, (latencies, elapsed, errors) in (('WSGI', wsgi), ('ASGI', asgi)):
+            self.stdout.write(self._summary(label, latencies, elapsed, errors))
+
+    def _run_wsgi(self, requests, concurrency, headers):
+        def hit(path):
+            client = Client(headers=headers)
+            started = time.perf_counter()
+            try:
+                status = client.get(path).status_code
+            finally:
+                close_old_connections()
+            return time.perf_counter() - started, status
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(hit, requests))
+        return self._collect(results, time.perf_counter() - started)
+
+    async def _run_asgi(self, requests, concurrency, headers):
+        semaphore = asyncio.Semaphore(concurrency)
+        # AsyncClient构造参数中的headers不会进入ASGI scope，需随每个请求传入
+        client = AsyncClient()
+
+        async def hit(path):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(hit(path) for path in requests))
+        return self._collect(results, time.perf_counter() - started)
+
+    def _collect(self, results, elapsed):
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(1 for _, status in results if status != 200)
+        return latencies, elapsed, errors
+
+    def _summary(self, label, latencies, elapsed, errors):
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        return (
+            f'{label}: {len(latencies) / elapsed:.0f} 请求/秒，'
+            f'p50 {statistics.median(latencies) * 1000:.1f} ms，p99 {p99 * 1000:.1f} ms，失败 {errors} 次'
+        )
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from encyclopedia.search import get_search_backend
+
+
+class Command(BaseCommand):
+    """从词条表重建全文索引"""
+    help = '清空并重建词条全文索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='每批写入的词条数')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='目标数据库别名')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend(options['database'])
+        started = time.monotonic()
+        with transaction.atomic(using=options['database']):
+            count = backend.rebuild(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'已使用 {type(backend).__name__} 重建 {count} 个词条的索引，耗时 {elapsed:.2f} 秒'
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from encyclopedia.models import Category
+
+
+class Command(BaseCommand):
+    """按词条表校正分类的entry_count冗余计数"""
+    help = '根据已发布词条重新计算分类词条数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='只统计偏差，不写入')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = {
+                category.pk: category.actual_count
+                for category in Category.objects.annotate(
+                    actual_count=Count('entry', filter=Q(entry__is_published=True))
+                ).exclude(entry_count=F('actual_count'))
+            }
+            if not options['dry_run']:
+                for category_id, count in drifted.items():
+                    Category.objects.filter(pk=category_id).update(entry_count=count)
+        action = '发现' if options['dry_run'] else '已校正'
+        self.stdout.write(self.style.SUCCESS(f'{action} {len(drifted)} 个词条数不一致的分类'))
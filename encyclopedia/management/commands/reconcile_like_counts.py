@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from encyclopedia.models import Entry, Like
+
+
+class Command(BaseCommand):
+    """按点赞记录校正词条的like_count冗余计数"""
+    help = '根据点赞记录重新计算词条点赞数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='只统计偏差，不写入')
+
+    def handle(self, *args, **options):
+        actual = Coalesce(
+            Subquery(
+                Like.objects.filter(entry=OuterRef('pk'))
+                .order_by()
+                .values('entry')
+                .annotate(count=Count('id'))
+                .values('count'),
+                output_field=IntegerField()
+            ),
+            0
+        )
+        with transaction.atomic():
+            drifted = list(
+                Entry.objects.annotate(actual_likes=actual)
+                .exclude(like_count=F('actual_likes'))
+                .values_list('pk', flat=True)
+            )
+            if drifted and not options['dry_run']:
+                Entry.objects.filter(pk__in=drifted).update(like_count=actual)
+        action = '发现' if options['dry_run'] else '已校正'
+        self.stdout.write(self.style.SUCCESS(f'{action} {len(drifted)} 个点赞数不一致的词条'))
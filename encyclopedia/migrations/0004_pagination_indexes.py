@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0003_like'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['is_published', 'created_at', 'id'], name='encyclopedi_is_publ_eb6041_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entryhistory',
+            index=models.Index(fields=['entry', 'edited_at', 'id'], name='encyclopedi_entry_i_e9a595_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='encyclopedi_user_id_841bf1_idx'),
+        ),
+    ]
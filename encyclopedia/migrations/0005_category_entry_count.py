@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:19
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_entry_count(apps, schema_editor):
+    """按现有已发布词条初始化分类词条数"""
+    Category = apps.get_model('encyclopedia', 'Category')
+    counted = Category.objects.annotate(
+        actual_count=Count('entry', filter=Q(entry__is_published=True))
+    )
+    for category in counted:
+        Category.objects.filter(pk=category.pk).update(entry_count=category.actual_count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0004_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='entry_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='已发布词条数'),
+        ),
+        migrations.RunPython(populate_entry_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,150 @@
+import difflib
+import hashlib
+import json
+
+from django.db import migrations, models
+
+
+# 迁移中冻结差量格式和关键帧规则，之后修改encyclopedia.history不影响本迁移
+KEYFRAME_INTERVAL = 20
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def make_delta(old, new):
+    """生成把old变为new的行级差量（JSON）"""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append(['=', i2 - i1])
+            continue
+        if i2 > i1:
+            ops.append(['-', i2 - i1])
+        if j2 > j1:
+            ops.append(['+', new_lines[j1:j2]])
+    return json.dumps(ops, ensure_ascii=False, separators=(',', ':'))
+
+
+def apply_delta(old, delta):
+    """对old应用差量，返回新内容"""
+    lines = old.splitlines(keepends=True)
+    result = []
+    position = 0
+    for op in json.loads(delta):
+        if op[0] == '=':
+            result.extend(lines[position:position + op[1]])
+            position += op[1]
+        elif op[0] == '-':
+            position += op[1]
+        else:
+            result.extend(op[1])
+    return ''.join(result)
+
+
+def build_revision(previous, old_content, new_content):
+    """计算新版本需要保存的字段，previous为上一条历史记录（可为None）"""
+    revision = previous.revision + 1 if previous else 1
+    is_keyframe = (
+        previous is None
+        or (revision - 1) % KEYFRAME_INTERVAL == 0
+        or previous.content_hash != content_hash(old_content)
+    )
+    return {
+        'revision': revision,
+        'is_keyframe': is_keyframe,
+        'base_content': old_content if is_keyframe else '',
+        'content_delta': make_delta(old_content, new_content),
+        'content_hash': content_hash(new_content),
+    }
+
+
+def convert_history(apps, schema_editor):
+    """把现有的完整内容记录转换为差量与关键帧"""
+    EntryHistory = apps.get_model('encyclopedia', 'EntryHistory')
+    rows = EntryHistory.objects.order_by('entry_id', 'edited_at', 'id')
+    previous = None
+    for row in rows.iterator(chunk_size=500):
+        if previous is not None and previous.entry_id != row.entry_id:
+            previous = None
+        for field, value in build_revision(previous, row.old_content, row.new_content).items():
+            setattr(row, field, value)
+        row.save(update_fields=['revision', 'is_keyframe', 'base_content', 'content_delta', 'content_hash'])
+        previous = row
+
+
+def restore_history(apps, schema_editor):
+    """回滚时按差量还原完整内容"""
+    EntryHistory = apps.get_model('encyclopedia', 'EntryHistory')
+    new = ''
+    for row in EntryHistory.objects.order_by('entry_id', 'revision').iterator(chunk_size=500):
+        old = row.base_content if row.is_keyframe else new
+        new = apply_delta(old, row.content_delta)
+        row.old_content = old
+        row.new_content = new
+        row.save(update_fields=['old_content', 'new_content'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0005_category_entry_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entryhistory',
+            name='revision',
+            field=models.PositiveIntegerField(default=0, verbose_name='版本号'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='entryhistory',
+            name='is_keyframe',
+            field=models.BooleanField(default=False, verbose_name='是否关键帧'),
+        ),
+        migrations.AddField(
+            model_name='entryhistory',
+            name='base_content',
+            field=models.TextField(blank=True, verbose_name='关键帧原内容'),
+        ),
+        migrations.AddField(
+            model_name='entryhistory',
+            name='content_delta',
+            field=models.TextField(default='', verbose_name='内容差量'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='entryhistory',
+            name='content_hash',
+            field=models.CharField(default='', max_length=40, verbose_name='新内容哈希'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='entryhistory',
+            name='old_content',
+            field=models.TextField(blank=True, verbose_name='原内容'),
+        ),
+        migrations.AlterField(
+            model_name='entryhistory',
+            name='new_content',
+            field=models.TextField(blank=True, verbose_name='新内容'),
+        ),
+        migrations.RunPython(convert_history, restore_history),
+        migrations.RemoveField(
+            model_name='entryhistory',
+            name='old_content',
+        ),
+        migrations.RemoveField(
+            model_name='entryhistory',
+            name='new_content',
+        ),
+        migrations.AlterUniqueTogether(
+            name='entryhistory',
+            unique_together={('entry', 'revision')},
+        ),
+    ]
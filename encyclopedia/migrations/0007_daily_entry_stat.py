@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_daily_stats(apps, schema_editor):
+    """按现有词条初始化每日统计，已有的浏览数和点赞数计入词条创建当天"""
+    Entry = apps.get_model('encyclopedia', 'Entry')
+    DailyEntryStat = apps.get_model('encyclopedia', 'DailyEntryStat')
+    rows = (
+        Entry.objects.order_by()
+        .annotate(date=TruncDate('created_at'))
+        .values('date', 'author_id', 'category_id')
+        .annotate(entries=Count('id'), views=Sum('view_count'), likes=Sum('like_count'))
+    )
+    DailyEntryStat.objects.bulk_create([
+        DailyEntryStat(
+            date=row['date'],
+            author_id=row['author_id'],
+            category_id=row['category_id'],
+            entry_count=row['entries'],
+            view_count=row['views'] or 0,
+            like_count=row['likes'] or 0
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('encyclopedia', '0006_history_deltas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyEntryStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('entry_count', models.IntegerField(default=0, verbose_name='新建词条数')),
+                ('view_count', models.IntegerField(default=0, verbose_name='浏览次数')),
+                ('like_count', models.IntegerField(default=0, verbose_name='点赞数')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='作者')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='encyclopedia.category', verbose_name='分类')),
+            ],
+            options={
+                'verbose_name': '每日统计',
+                'verbose_name_plural': '每日统计',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['author', 'date'], name='encyclopedi_author__7da475_idx'), models.Index(fields=['category', 'date'], name='encyclopedi_categor_6188ac_idx')],
+                'unique_together': {('date', 'author', 'category')},
+            },
+        ),
+        migrations.RunPython(populate_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0007_daily_entry_stat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntryTrend',
+            fields=[
+                ('entry', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', serialize=False, to='encyclopedia.entry', verbose_name='词条')),
+                ('log_score', models.FloatField(db_index=True, verbose_name='热度对数')),
+            ],
+            options={
+                'verbose_name': '词条热度',
+                'verbose_name_plural': '词条热度',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.PositiveIntegerField(verbose_name='范围')),
+                ('rank', models.PositiveIntegerField(verbose_name='名次')),
+                ('score', models.FloatField(verbose_name='热度')),
+                ('computed_at', models.DateTimeField(verbose_name='计算时间')),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trending_ranks', to='encyclopedia.entry', verbose_name='词条')),
+            ],
+            options={
+                'verbose_name': '热门排行',
+                'verbose_name_plural': '热门排行',
+                'ordering': ['scope', 'rank'],
+                'unique_together': {('scope', 'rank')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def populate_profile_counts(apps, schema_editor):
+    """按现有词条和收藏初始化用户资料中的计数"""
+    UserProfile = apps.get_model('users', 'UserProfile')
+    User = apps.get_model('auth', 'User')
+    counted = User.objects.annotate(
+        actual_entries=Count('entry', distinct=True),
+        actual_favorites=Count('favorite', distinct=True)
+    )
+    for user in counted:
+        UserProfile.objects.filter(user_id=user.pk).update(
+            entries_count=user.actual_entries,
+            favorites_count=user.actual_favorites
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_create_user_profiles'),
+        ('encyclopedia', '0008_trending'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_profile_counts, migrations.RunPython.noop),
+    ]
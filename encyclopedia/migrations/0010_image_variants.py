@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0009_populate_profile_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entryimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, verbose_name='缩放版本'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0010_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='任务名')),
+                ('args', models.JSONField(blank=True, default=list, verbose_name='参数')),
+                ('status', models.CharField(choices=[('pending', '等待执行'), ('running', '执行中'), ('failed', '已放弃')], default='pending', max_length=10, verbose_name='状态')),
+                ('dedup_key', models.CharField(blank=True, max_length=200, null=True, verbose_name='去重键')),
+                ('sequence_key', models.CharField(blank=True, db_index=True, max_length=200, null=True, verbose_name='顺序键')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='已执行次数')),
+                ('max_attempts', models.PositiveIntegerField(verbose_name='最多执行次数')),
+                ('run_at', models.DateTimeField(verbose_name='计划执行时间')),
+                ('locked_by', models.CharField(blank=True, db_index=True, max_length=32, verbose_name='领取标记')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='租约到期时间')),
+                ('last_error', models.TextField(blank=True, verbose_name='最近错误')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='入队时间')),
+            ],
+            options={
+                'verbose_name': '后台任务',
+                'verbose_name_plural': '后台任务',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'run_at'], name='encyclopedi_status_0e6dff_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('dedup_key',), name='unique_pending_job_dedup_key'),
+        ),
+    ]
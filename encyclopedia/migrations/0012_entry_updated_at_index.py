@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0011_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['updated_at'], name='encyclopedi_updated_a811a3_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:27
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_uncategorized_duplicates(apps, schema_editor):
+    """把同一天同一作者重复的未分类行合并为一行"""
+    DailyEntryStat = apps.get_model('encyclopedia', 'DailyEntryStat')
+    duplicates = (
+        DailyEntryStat.objects.filter(category__isnull=True)
+        .values('date', 'author_id')
+        .annotate(
+            rows=Count('id'), keep=Min('id'),
+            entries=Sum('entry_count'), views=Sum('view_count'), likes=Sum('like_count')
+        )
+        .filter(rows__gt=1)
+    )
+    for row in list(duplicates):
+        group = DailyEntryStat.objects.filter(category__isnull=True, date=row['date'], author_id=row['author_id'])
+        group.exclude(pk=row['keep']).delete()
+        group.update(entry_count=row['entries'], view_count=row['views'], like_count=row['likes'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0012_entry_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_uncategorized_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyentrystat',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('date', 'author'), name='unique_uncategorized_daily_stat'),
+        ),
+    ]
@@ -1,7 +1,21 @@
 from django.db import models
+from django.db.backends.signals import connection_created
 from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
 from django.utils import timezone
 
+from users.models import UserProfile
+
+from . import cache as entry_cache
+from . import images
+from . import instrumentation
+from . import sqlite
+from . import stats
+from . import tasks
+from . import trending
+from .search import INDEXED_FIELDS
+
 
 class Category(models.Model):
     """百科分类模型"""
@@ -9,6 +23,9 @@ class Category(models.Model):
     description = models.TextField(blank=True, verbose_name='分类描述')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     
+    # 统计字段，由词条的保存与删除信号维护
+    entry_count = models.PositiveIntegerField(default=0, verbose_name='已发布词条数')
+    
     class Meta:
         verbose_name = '分类'
         verbose_name_plural = '分类'
@@ -58,15 +75,35 @@ class Entry(models.Model):
             models.Index(fields=['category']),
             models.Index(fields=['created_at']),
             models.Index(fields=['author']),
+            # 列表游标分页：WHERE is_published ORDER BY created_at, id
+            models.Index(fields=['is_published', 'created_at', 'id']),
+            # 增量导出：WHERE updated_at >= ?
+            models.Index(fields=['updated_at']),
         ]
     
     def __str__(self):
         return self.title
     
-    def increment_view_count(self):
-        """增加浏览次数"""
-        self.view_count += 1
-        self.save(update_fields=['view_count'])
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """记录加载时的分类与发布状态，用于保存时维护分类词条数"""
+        instance = super().from_db(db, field_names, values)
+        if 'category_id' in instance.__dict__ and 'is_published' in instance.__dict__:
+            instance._counted_state = (instance.category_id, instance.is_published)
+        return instance
+    
+    def increment_view_count(self, buffered=True):
+        """增加浏览次数，默认写入进程内缓冲，由后台线程批量写回"""
+        from .counters import view_counter
+
+        if buffered and view_counter.enabled:
+            # 加上尚未写回的次数，使返回给客户端的数字保持递增
+            self.view_count += view_counter.record(self.pk)
+        else:
+            Entry.objects.filter(pk=self.pk).update(view_count=models.F('view_count') + 1)
+            stats.record_views({self.pk: 1})
+            trending.record_views({self.pk: 1})
+            self.view_count += 1
 
 
 class EntryImage(models.Model):
@@ -79,6 +116,7 @@ class EntryImage(models.Model):
     )
     image = models.ImageField(upload_to='encyclopedia/images/', verbose_name='图片')
     caption = models.CharField(max_length=200, blank=True, verbose_name='图片说明')
+    variants = models.JSONField(default=dict, blank=True, verbose_name='缩放版本')
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name='上传时间')
     
     class Meta:
@@ -102,8 +140,12 @@ class EntryHistory(models.Model):
         on_delete=models.CASCADE, 
         verbose_name='编辑者'
     )
-    old_content = models.TextField(verbose_name='原内容')
-    new_content = models.TextField(verbose_name='新内容')
+    # 差量存储，见encyclopedia.history
+    revision = models.PositiveIntegerField(verbose_name='版本号')
+    is_keyframe = models.BooleanField(default=False, verbose_name='是否关键帧')
+    base_content = models.TextField(blank=True, verbose_name='关键帧原内容')
+    content_delta = models.TextField(verbose_name='内容差量')
+    content_hash = models.CharField(max_length=40, verbose_name='新内容哈希')
     edit_summary = models.CharField(max_length=200, blank=True, verbose_name='编辑摘要')
     edited_at = models.DateTimeField(auto_now_add=True, verbose_name='编辑时间')
     
@@ -111,9 +153,19 @@ class EntryHistory(models.Model):
         verbose_name = '编辑历史'
         verbose_name_plural = '编辑历史'
         ordering = ['-edited_at']
+        unique_together = ['entry', 'revision']
+        indexes = [
+            models.Index(fields=['entry', 'edited_at', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.entry.title} - {self.editor.username} - {self.edited_at}"
+    
+    def get_contents(self):
+        """还原本次编辑前后的完整内容，返回(old_content, new_content)"""
+        from .history import get_revision_contents
+        
+        return get_revision_contents(self.entry_id, self.revision)
 
 
 class Favorite(models.Model):
@@ -135,6 +187,373 @@ class Favorite(models.Model):
         verbose_name_plural = '收藏'
         unique_together = ['user', 'entry']
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id']),
+        ]
     
     def __str__(self):
-        return f"{self.user.username} 收藏了 {self.entry.title}"
\ No newline at end of file
+        return f"{self.user.username} 收藏了 {self.entry.title}"
+    
+    @classmethod
+    def favorited_entry_ids(cls, user, entry_ids):
+        """一次查询返回用户在给定词条中已收藏的词条id集合"""
+        if not user.is_authenticated or not entry_ids:
+            return set()
+        return set(
+            cls.objects.filter(user=user, entry_id__in=entry_ids)
+            .values_list('entry_id', flat=True)
+        )
+
+
+class DailyEntryStat(models.Model):
+    """按天汇总的词条统计，见encyclopedia.stats"""
+    date = models.DateField(verbose_name='日期')
+    author = models.ForeignKey(
+        User, 
+        on_delete=models.CASCADE, 
+        verbose_name='作者'
+    )
+    category = models.ForeignKey(
+        Category, 
+        on_delete=models.SET_NULL, 
+        null=True, 
+        blank=True, 
+        verbose_name='分类'
+    )
+    entry_count = models.IntegerField(default=0, verbose_name='新建词条数')
+    view_count = models.IntegerField(default=0, verbose_name='浏览次数')
+    like_count = models.IntegerField(default=0, verbose_name='点赞数')
+    
+    class Meta:
+        verbose_name = '每日统计'
+        verbose_name_plural = '每日统计'
+        unique_together = ['date', 'author', 'category']
+        # unique_together不约束category为NULL的行
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'author'],
+                condition=models.Q(category__isnull=True),
+                name='unique_uncategorized_daily_stat'
+            ),
+        ]
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['author', 'date']),
+            models.Index(fields=['category', 'date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} - {self.author_id} - {self.category_id}"
+
+
+class EntryTrend(models.Model):
+    """词条的衰减热度，见encyclopedia.trending"""
+    entry = models.OneToOneField(
+        Entry, 
+        on_delete=models.CASCADE, 
+        primary_key=True, 
+        related_name='trend', 
+        verbose_name='词条'
+    )
+    log_score = models.FloatField(db_index=True, verbose_name='热度对数')
+    
+    class Meta:
+        verbose_name = '词条热度'
+        verbose_name_plural = '词条热度'
+    
+    def __str__(self):
+        return f"{self.entry_id} - {self.log_score}"
+
+
+class TrendingEntry(models.Model):
+    """物化的热门排行，scope为0表示全站，否则为分类id"""
+    scope = models.PositiveIntegerField(verbose_name='范围')
+    rank = models.PositiveIntegerField(verbose_name='名次')
+    entry = models.ForeignKey(
+        Entry, 
+        on_delete=models.CASCADE, 
+        related_name='trending_ranks', 
+        verbose_name='词条'
+    )
+    score = models.FloatField(verbose_name='热度')
+    computed_at = models.DateTimeField(verbose_name='计算时间')
+    
+    class Meta:
+        verbose_name = '热门排行'
+        verbose_name_plural = '热门排行'
+        unique_together = ['scope', 'rank']
+        ordering = ['scope', 'rank']
+    
+    def __str__(self):
+        return f"{self.scope} #{self.rank} - {self.entry_id}"
+
+
+class Like(models.Model):
+    """用户点赞模型，每个用户对每个词条只能点赞一次"""
+    user = models.ForeignKey(
+        User, 
+        on_delete=models.CASCADE, 
+        verbose_name='用户'
+    )
+    entry = models.ForeignKey(
+        Entry, 
+        on_delete=models.CASCADE, 
+        verbose_name='词条'
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='点赞时间')
+    
+    class Meta:
+        verbose_name = '点赞'
+        verbose_name_plural = '点赞'
+        unique_together = ['user', 'entry']
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.user.username} 点赞了 {self.entry.title}"
+    
+    @classmethod
+    def liked_entry_ids(cls, user, entry_ids):
+        """一次查询返回用户在给定词条中已点赞的词条id集合"""
+        if not user.is_authenticated or not entry_ids:
+            return set()
+        return set(
+            cls.objects.filter(user=user, entry_id__in=entry_ids)
+            .values_list('entry_id', flat=True)
+        )
+
+
+class Job(models.Model):
+    """后台任务队列中的一个任务，见encyclopedia.jobs"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, '等待执行'),
+        (RUNNING, '执行中'),
+        (FAILED, '已放弃'),
+    ]
+    
+    name = models.CharField(max_length=100, verbose_name='任务名')
+    args = models.JSONField(default=list, blank=True, verbose_name='参数')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, verbose_name='状态')
+    # 等待执行的任务中dedup_key唯一，重复入队会被忽略
+    dedup_key = models.CharField(max_length=200, null=True, blank=True, verbose_name='去重键')
+    # sequence_key相同的任务按入队顺序逐个执行
+    sequence_key = models.CharField(max_length=200, null=True, blank=True, db_index=True, verbose_name='顺序键')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='已执行次数')
+    max_attempts = models.PositiveIntegerField(verbose_name='最多执行次数')
+    run_at = models.DateTimeField(verbose_name='计划执行时间')
+    locked_by = models.CharField(max_length=32, blank=True, db_index=True, verbose_name='领取标记')
+    locked_until = models.DateTimeField(null=True, blank=True, verbose_name='租约到期时间')
+    last_error = models.TextField(blank=True, verbose_name='最近错误')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='入队时间')
+    
+    class Meta:
+        verbose_name = '后台任务'
+        verbose_name_plural = '后台任务'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=models.Q(status='pending'),
+                name='unique_pending_job_dedup_key',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} #{self.pk} - {self.status}"
+
+
+@receiver(post_save, sender=Entry)
+def update_entry_search_index(sender, instance, update_fields=None, **kwargs):
+    """保存词条时同步全文索引，只更新统计字段时跳过"""
+    if update_fields and not set(INDEXED_FIELDS).intersection(update_fields):
+        return
+    tasks.sync_search_index.enqueue(instance.pk, dedup_key=f'search_index:{instance.pk}')
+
+
+@receiver(post_delete, sender=Entry)
+def remove_entry_search_index(sender, instance, **kwargs):
+    """删除词条时移除全文索引"""
+    tasks.sync_search_index.enqueue(instance.pk, dedup_key=f'search_index:{instance.pk}')
+
+
+# 影响分类词条数的字段
+COUNTED_FIELDS = {'category', 'category_id', 'is_published'}
+
+
+def _adjust_category_count(category_id, delta):
+    if category_id is None:
+        return
+    categories = Category.objects.filter(pk=category_id)
+    if delta < 0:
+        categories = categories.filter(entry_count__gt=0)
+    categories.update(entry_count=models.F('entry_count') + delta)
+
+
+@receiver(pre_save, sender=Entry)
+def load_entry_counted_state(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    """延迟加载等情况下缺少原始状态时，从数据库补查"""
+    if raw or instance._state.adding or hasattr(instance, '_counted_state'):
+        return
+    if update_fields and not COUNTED_FIELDS.intersection(update_fields):
+        return
+    instance._counted_state = (
+        Entry.objects.using(using)
+        .filter(pk=instance.pk)
+        .values_list('category_id', 'is_published')
+        .first()
+    ) or (None, False)
+
+
+@receiver(post_save, sender=Entry)
+def update_category_entry_count(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """词条新建、换分类或发布状态变化时维护分类的词条数和每日统计"""
+    if raw:
+        return
+    if update_fields and not COUNTED_FIELDS.intersection(update_fields):
+        return
+    old_category_id, old_published = (None, False) if created else instance._counted_state
+    instance._counted_state = (instance.category_id, instance.is_published)
+    if created:
+        stats.record_entry_created(instance)
+    elif old_category_id != instance.category_id:
+        stats.record_entry_moved(instance, old_category_id)
+    # 只有已发布的词条计入分类
+    old_counted = old_category_id if old_published else None
+    new_counted = instance.category_id if instance.is_published else None
+    if old_counted != new_counted:
+        _adjust_category_count(old_counted, -1)
+        _adjust_category_count(new_counted, 1)
+
+
+@receiver(post_delete, sender=Entry)
+def decrease_category_entry_count(sender, instance, **kwargs):
+    """删除词条时减少每日统计中的词条数，已发布的词条同时减少分类的词条数"""
+    stats.record_entry_deleted(instance)
+    if instance.is_published:
+        _adjust_category_count(instance.category_id, -1)
+
+
+def _adjust_profile_count(user_id, field, delta):
+    """以单条UPDATE调整用户资料中的冗余计数"""
+    profiles = UserProfile.objects.filter(user_id=user_id)
+    if delta < 0:
+        profiles = profiles.filter(**{f'{field}__gt': 0})
+    profiles.update(**{field: models.F(field) + delta})
+
+
+@receiver(post_save, sender=Entry)
+def increase_profile_entries_count(sender, instance, created, raw=False, **kwargs):
+    """新建词条时增加作者的词条数"""
+    if created and not raw:
+        _adjust_profile_count(instance.author_id, 'entries_count', 1)
+
+
+@receiver(post_delete, sender=Entry)
+def decrease_profile_entries_count(sender, instance, **kwargs):
+    """删除词条时减少作者的词条数"""
+    _adjust_profile_count(instance.author_id, 'entries_count', -1)
+
+
+@receiver(post_save, sender=Favorite)
+def increase_profile_favorites_count(sender, instance, created, raw=False, **kwargs):
+    """收藏时增加用户的收藏数"""
+    if created and not raw:
+        _adjust_profile_count(instance.user_id, 'favorites_count', 1)
+
+
+def _deleted_with(origin, model):
+    """删除是否由model的实例或查询集发起，即本行是被级联删除的"""
+    return isinstance(origin, model) or getattr(origin, 'model', None) is model
+
+
+@receiver(pre_delete, sender=Entry)
+def decrease_favoriters_favorites_count(sender, instance, **kwargs):
+    """删除词条前以单条UPDATE减少收藏了它的用户的收藏数"""
+    UserProfile.objects.filter(
+        user__favorite__entry=instance, favorites_count__gt=0
+    ).update(favorites_count=models.F('favorites_count') - 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrease_profile_favorites_count(sender, instance, origin=None, **kwargs):
+    """取消收藏时减少用户的收藏数"""
+    # 随词条级联删除的收藏已在decrease_favoriters_favorites_count中统一调整，
+    # 随用户级联删除时用户资料也会被删除，都不再逐条更新
+    if _deleted_with(origin, Entry) or _deleted_with(origin, User):
+        return
+    _adjust_profile_count(instance.user_id, 'favorites_count', -1)
+
+
+# 只更新这些字段时不影响缓存的词条详情
+ENTRY_COUNTER_FIELDS = {'view_count', 'like_count'}
+# 出现在词条详情中的用户字段
+CACHED_USER_FIELDS = {'username', 'email', 'first_name', 'last_name', 'date_joined'}
+
+
+@receiver(post_save, sender=Entry)
+@receiver(post_delete, sender=Entry)
+def invalidate_entry_cache(sender, instance, update_fields=None, **kwargs):
+    """词条保存或删除时使详情缓存失效"""
+    if update_fields and ENTRY_COUNTER_FIELDS.issuperset(update_fields):
+        return
+    entry_cache.invalidate_entry(instance.pk)
+
+
+@receiver(pre_save, sender=EntryImage)
+def track_entry_image_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    """上传或替换图片时清空旧的缩放版本"""
+    if not raw:
+        images.track_change(instance, update_fields)
+
+
+@receiver(post_save, sender=EntryImage)
+def generate_entry_image_variants(sender, instance, raw=False, **kwargs):
+    """上传或替换图片后在后台生成缩放版本"""
+    if not raw:
+        images.schedule_if_changed(instance)
+
+
+@receiver(post_save, sender=EntryImage)
+@receiver(post_delete, sender=EntryImage)
+def invalidate_entry_image_cache(sender, instance, **kwargs):
+    """图片增删改时使所属词条的详情缓存失效"""
+    entry_cache.invalidate_entry(instance.entry_id)
+
+
+@receiver(pre_delete, sender=Category)
+def merge_category_statistics(sender, instance, **kwargs):
+    """删除分类前把它的每日统计并入未分类的行，避免SET_NULL后出现重复行"""
+    stats.merge_category(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    """分类修改或删除时使其下词条的详情缓存失效"""
+    entry_cache.invalidate_category(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_author_cache(sender, instance, update_fields=None, **kwargs):
+    """用户资料变化时使其词条的详情缓存失效，登录只更新last_login时跳过"""
+    if update_fields and not CACHED_USER_FIELDS.intersection(update_fields):
+        return
+    entry_cache.invalidate_user(instance.pk)
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """新建SQLite连接时应用SQLITE_PRAGMAS和事务模式"""
+    sqlite.configure_connection(connection)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    """新建连接时安装请求级的查询计时"""
+    instrumentation.install(connection)
@@ -0,0 +1,19 @@
+from rest_framework.pagination import CursorPagination
+
+
+class EntryCursorPagination(CursorPagination):
+    """词条列表游标分页，按(created_at, id)倒序，翻页深度不影响查询开销"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+
+class HistoryCursorPagination(EntryCursorPagination):
+    """编辑历史游标分页"""
+    ordering = ('-edited_at', '-id')
+
+
+class FavoriteCursorPagination(EntryCursorPagination):
+    """收藏列表游标分页"""
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,364 @@
+"""
+接口查询次数与查询计划检查
+
+CHECKS为encyclopedia.urls和users.urls中每个路由至少列出一个请求，并给出查询次数上限。
+每个请求在独立、最终回滚的事务中执行，缓存和token快照都从空开始，记录的是未命中缓存时的查询次数；
+on_commit回调在回滚前执行并计入，缓冲的浏览次数也在回滚前写回（不计入）。列表类请求用sizes给出两个规模（分页大小、id个数等）各请求一次，
+大规模的查询次数不得多于小规模，防止SerializerMethodField逐行查询之类的N+1问题。
+
+语料足够大时（见generate_corpus），对每条查询执行EXPLAIN，出现对HOT_TABLES的全表扫描即视为失败。
+SQLite中只把不带索引的SCAN视为全表扫描；按索引顺序扫描（USING INDEX）通常配合LIMIT，不计入。
+"""
+
+import itertools
+import json
+import re
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections, transaction
+from django.db.models import Count, Max
+from django.test import Client
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from users.authentication import token_snapshots
+
+from .benchmark import route_names
+from .counters import view_counter
+from .models import Category, Entry, EntryHistory, Favorite, Like
+
+
+HOT_TABLES = {model._meta.db_table for model in (Entry, Favorite, EntryHistory)}
+PASSWORD = 'query-budget-password'
+NEW_PASSWORD = 'query-budget-password-2'
+# 只用于检查的快速哈希，密码哈希的耗时与查询次数无关
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+MAX_SIZE = 100
+
+_EXPLAINABLE = re.compile(r'^\s*(SELECT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+_ALIAS = re.compile(r'"(\w+)" (?:AS )?([A-Z]\d+)\b')
+_SQLITE_SCAN = re.compile(r'^SCAN (\w+)$')
+_cache_generation = itertools.count()
+
+
+class Check:
+    """
+    一个受检请求
+
+    path和data中的{占位符}由Fixtures.params填充，{size}为规模；data也可以是params -> dict的函数。
+    sizes为(小, 大)两个规模，大规模的查询次数不得多于小规模。admin为True时以管理员身份请求。
+    hot为False的请求（批量管理操作）不检查查询计划。
+    """
+
+    def __init__(self, name, path, max_queries, method='GET', auth=False, admin=False, data=None,
+                 multipart=False, sizes=None, status=200, hot=True):
+        self.name = name
+        self.path = path
+        self.max_queries = max_queries
+        self.method = method
+        self.auth = auth or admin
+        self.admin = admin
+        self.data = data
+        self.multipart = multipart
+        self.sizes = sizes
+        self.status = status
+        self.hot = hot
+
+
+def _import_file(params):
+    lines = [
+        json.dumps({'title': f'查询预算导入{index}', 'content': '导入正文', 'category': params['category_name']},
+                   ensure_ascii=False)
+        for index in range(params['size'])
+    ]
+    return {'file': SimpleUploadedFile('entries.jsonl', '\n'.join(lines).encode('utf-8'))}
+
+
+CHECKS = [
+    Check('api-root', '/api/', 0),
+    Check('category-list', '/api/categories/', 1),
+    Check('category-list', '/api/categories/?count=live', 1),
+    Check('category-list', '/api/categories/', 3, method='POST', auth=True,
+          data={'name': '查询预算分类', 'description': ''}, status=201),
+    Check('category-detail', '/api/categories/{category}/', 1),
+    Check('category-detail', '/api/categories/{category}/', 3, method='PATCH', auth=True,
+          data={'description': '查询预算'}),
+    Check('entry-list', '/api/entries/?page_size={size}', 1, sizes=(1, MAX_SIZE)),
+    Check('entry-list', '/api/entries/?page_size={size}', 3, auth=True, sizes=(1, MAX_SIZE)),
+    Check('entry-list', '/api/entries/?category={category}&page_size={size}', 1, sizes=(1, MAX_SIZE)),
+    Check('entry-list', '/api/entries/?author={author}&page_size={size}', 1, sizes=(1, MAX_SIZE)),
+    Check('entry-list', '/api/entries/?search={word}&page_size={size}', 1, sizes=(1, MAX_SIZE)),
+    Check('entry-list', '/api/entries/', 13, method='POST', auth=True,
+          data={'title': '查询预算词条', 'content': '正文', 'category': '{category}'}, status=201),
+    Check('entry-detail', '/api/entries/{entry}/', 3),
+    Check('entry-detail', '/api/entries/{entry}/', 5, auth=True),
+    Check('entry-detail', '/api/entries/{entry}/?fields=id,title,author,category', 2),
+    Check('entry-detail', '/api/entries/{entry}/', 12, method='PATCH', auth=True,
+          data={'content': '查询预算修改后的正文'}),
+    Check('entry-detail', '/api/entries/{entry}/', 17, method='DELETE', auth=True, status=204),
+    Check('entry-history', '/api/entries/{history_entry}/history/?page_size={size}', 3, sizes=(1, MAX_SIZE)),
+    Check('entry-revision', '/api/entries/{history_entry}/history/{revision}/', 4),
+    Check('entry-history-diff', '/api/entries/{history_entry}/history/diff/?from=1&to={revision}', 5),
+    Check('entry-trending', '/api/entries/trending/?limit={size}', 2, sizes=(1, 50)),
+    Check('entry-trending', '/api/entries/trending/?limit={size}', 4, auth=True, sizes=(1, 50)),
+    Check('entry-trending', '/api/entries/trending/?category={category}&limit={size}', 2, sizes=(1, 50)),
+    Check('entry-liked', '/api/entries/liked/?ids={entry_ids}', 2, auth=True, sizes=(1, MAX_SIZE)),
+    # 当天的汇总行不存在时多一次插入和一次累加；点赞还要确认词条仍存在才插入热度行
+    Check('entry-like', '/api/entries/{unliked_entry}/like/', 12, method='POST', auth=True),
+    Check('entry-unlike', '/api/entries/{liked_entry}/unlike/', 11, method='POST', auth=True),
+    Check('search-list', '/api/search/?q={word}', 3),
+    Check('search-list', '/api/search/?q={word}', 5, auth=True),
+    Check('favorite-list', '/api/favorites/?page_size={size}', 3, auth=True, sizes=(1, MAX_SIZE)),
+    Check('favorite-list', '/api/favorites/', 5, method='POST', auth=True,
+          data={'entry': '{unfavorited_entry}'}, status=201),
+    Check('favorite-detail', '/api/favorites/{favorite}/', 3, auth=True),
+    Check('favorite-detail', '/api/favorites/{favorite}/', 4, method='DELETE', auth=True, status=204),
+    Check('favorite-check', '/api/favorites/check/?entry_ids={entry_ids}', 2, auth=True, sizes=(1, MAX_SIZE)),
+    Check('favorite-check', '/api/favorites/check/?entry_id={entry}', 2, auth=True),
+    Check('statistics', '/api/encyclopedia/statistics/', 2, auth=True),
+    Check('export', '/api/encyclopedia/export/?updated_since={now}', 3, admin=True),
+    Check('import', '/api/encyclopedia/import/', 19, method='POST', admin=True, data=_import_file,
+          multipart=True, sizes=(1, 20), status=201, hot=False),
+    Check('register', '/api/auth/register/', 9, method='POST', data={
+        'username': 'query_budget_user', 'email': 'query-budget@example.com',
+        'password': NEW_PASSWORD, 'password_confirm': NEW_PASSWORD,
+    }, status=201),
+    Check('login', '/api/auth/login/', 3, method='POST', data={'username': '{username}', 'password': PASSWORD}),
+    Check('logout', '/api/auth/logout/', 1, method='POST', auth=True),
+    Check('profile', '/api/auth/profile/', 2, auth=True),
+    Check('update_profile', '/api/auth/profile/update/', 4, method='PUT', auth=True, data={'bio': '查询预算'}),
+    Check('change_password', '/api/auth/change-password/', 12, method='POST', auth=True, data={
+        'old_password': PASSWORD, 'new_password': NEW_PASSWORD, 'new_password_confirm': NEW_PASSWORD,
+    }),
+    Check('check_auth', '/api/auth/check-auth/', 2, auth=True),
+]
+
+
+class Fixtures:
+    """检查使用的用户和样本数据，取数据最多的对象，使列表请求在大规模下确实返回多行"""
+
+    def __init__(self, user=None):
+        self.user = user or (
+            User.objects.filter(is_active=True)
+            .annotate(favorite_total=Count('favorite', distinct=True), like_total=Count('like', distinct=True))
+            .order_by('-favorite_total', '-like_total', 'id')
+            .first()
+        )
+        if self.user is None:
+            raise ValueError('数据库中没有用户')
+        self.entries = list(
+            Entry.objects.filter(is_published=True).order_by('-view_count', 'id')
+            .values_list('id', flat=True)[:MAX_SIZE]
+        )
+        if not self.entries:
+            raise ValueError('数据库中没有已发布的词条')
+        self.category = (
+            Category.objects.order_by('-entry_count', 'id').values_list('id', 'name').first() or (None, '')
+        )
+        self.author = (
+            Entry.objects.filter(is_published=True).values('author_id').annotate(total=Count('id'))
+            .order_by('-total').values_list('author_id', flat=True).first()
+        )
+        self.history = (
+            EntryHistory.objects.filter(entry__is_published=True).values('entry_id')
+            .annotate(revision=Max('revision')).order_by('-revision', 'entry_id')
+            .values_list('entry_id', 'revision').first()
+        )
+        liked = Like.objects.filter(user=self.user).values_list('entry_id', flat=True)
+        favorited = Favorite.objects.filter(user=self.user).values_list('entry_id', flat=True)
+        published = Entry.objects.filter(is_published=True).order_by('id').values_list('id', flat=True)
+        self.liked_entry = liked.filter(entry__is_published=True).order_by('entry_id').first()
+        self.unliked_entry = published.exclude(pk__in=liked).first()
+        self.unfavorited_entry = published.exclude(pk__in=favorited).first()
+        self.favorite = Favorite.objects.filter(user=self.user).order_by('id').values_list('id', flat=True).first()
+        self.word = Entry.objects.filter(pk=self.entries[0]).values_list('title', flat=True).get()[:2]
+
+    def params(self, size=1):
+        """占位符取值，样本不存在的占位符不提供"""
+        params = {
+            'size': size,
+            'entry': self.entries[0],
+            'entry_ids': ','.join(map(str, self.entries[:size])),
+            'word': self.word,
+            'username': self.user.get_username(),
+            'now': timezone.now().isoformat().replace('+', '%2B'),
+        }
+        optional = {
+            'category': self.category[0],
+            'category_name': self.category[1] or None,
+            'author': self.author,
+            'liked_entry': self.liked_entry,
+            'unliked_entry': self.unliked_entry,
+            'unfavorited_entry': self.unfavorited_entry,
+            'favorite': self.favorite,
+        }
+        params.update({name: value for name, value in optional.items() if value is not None})
+        if self.history:
+            params['history_entry'], params['revision'] = self.history
+        return params
+
+
+def _format(value, params):
+    if isinstance(value, dict):
+        return {key: _format(item, params) for key, item in value.items()}
+    if isinstance(value, str):
+        return value.format(**params)
+    return value
+
+
+@contextmanager
+def isolated(user, admin=False):
+    """在回滚的事务中执行，缓存和token快照从空开始；用户的密码临时设为PASSWORD"""
+    generation = next(_cache_generation)
+    fresh_caches = {
+        alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'query-budget-{generation}-{alias}'}
+        for alias in settings.CACHES
+    }
+    token_snapshots.clear()
+    with override_settings(CACHES=fresh_caches, PASSWORD_HASHERS=PASSWORD_HASHERS, ALLOWED_HOSTS=['testserver']):
+        with transaction.atomic():
+            User.objects.filter(pk=user.pk).update(
+                password=make_password(PASSWORD), is_staff=admin, is_superuser=admin
+            )
+            try:
+                yield
+            finally:
+                # 缓冲的浏览次数在本事务中写回，随事务一起回滚，不留到进程退出时写入数据库
+                view_counter.flush()
+                transaction.set_rollback(True)
+    token_snapshots.clear()
+
+
+@contextmanager
+def capture_queries():
+    """记录全部数据库别名上的查询，结束前执行本事务登记的on_commit回调"""
+    with ExitStack() as stack:
+        contexts = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+        captured = []
+        try:
+            yield captured
+            connection = connections['default']
+            # 与TestCase.captureOnCommitCallbacks(execute=True)相同，回调中又登记的回调也依次执行
+            callback_count = 0
+            while callback_count < len(connection.run_on_commit):
+                for _, callback, robust in connection.run_on_commit[callback_count:]:
+                    callback_count += 1
+                    callback()
+        finally:
+            for alias, context in zip(connections, contexts):
+                captured.extend((alias, query['sql']) for query in context.captured_queries)
+
+
+def _request(check, fixtures, token, params):
+    client = Client(
+        headers={'Authorization': f'Token {token.key}'} if check.auth else {},
+        raise_request_exception=False,
+    )
+    path = check.path.format(**params)
+    data = check.data(params) if callable(check.data) else _format(check.data, params)
+    if check.method == 'GET':
+        response = client.get(path)
+    elif check.multipart:
+        response = client.generic(check.method, path, encode_multipart(BOUNDARY, data), content_type=MULTIPART_CONTENT)
+    else:
+        response = client.generic(check.method, path, json.dumps(data or {}), content_type='application/json')
+    if response.streaming:
+        # 流式响应的查询在迭代时执行
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def explain(alias, sql):
+    """返回查询计划中对HOT_TABLES的全表扫描描述列表，不支持的数据库返回None"""
+    connection = connections[alias]
+    if not _EXPLAINABLE.match(sql):
+        return []
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            aliases = dict((table_alias, table) for table, table_alias in _ALIAS.findall(sql))
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            scans = []
+            for *_, detail in cursor.fetchall():
+                match = _SQLITE_SCAN.match(detail)
+                if match and aliases.get(match.group(1), match.group(1)) in HOT_TABLES:
+                    scans.append(f'{detail}（{aliases.get(match.group(1), match.group(1))}）')
+            return scans
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = []
+            nodes = [plan[0]['Plan']]
+            while nodes:
+                node = nodes.pop()
+                if node.get('Node Type') == 'Seq Scan' and node.get('Relation Name') in HOT_TABLES:
+                    scans.append(f'Seq Scan on {node["Relation Name"]}')
+                nodes.extend(node.get('Plans', []))
+            return scans
+    return None
+
+
+def run_check(check, fixtures, token, check_plans=True):
+    """
+    执行一个检查，返回结果字典：
+    queries为各规模下的查询次数，failures为失败原因列表，scans为(查询, 全表扫描描述)列表
+    """
+    result = {'name': check.name, 'method': check.method, 'path': check.path, 'max_queries': check.max_queries,
+              'queries': {}, 'failures': [], 'scans': []}
+    try:
+        base_params = fixtures.params()
+        check.path.format(**base_params)
+        _format(check.data, base_params) if not callable(check.data) else check.data(base_params)
+    except KeyError as exc:
+        result['skipped'] = f'缺少样本数据：{exc.args[0]}'
+        return result
+
+    for size in check.sizes or (1,):
+        params = fixtures.params(size)
+        with isolated(fixtures.user, admin=check.admin):
+            with capture_queries() as captured:
+                response = _request(check, fixtures, token, params)
+            if check_plans and check.hot:
+                for alias, sql in captured:
+                    for scan in explain(alias, sql) or []:
+                        result['scans'].append((sql, scan))
+        result['queries'][size] = len(captured)
+        if response.status_code != check.status:
+            result['failures'].append(f'规模{size}返回状态码{response.status_code}，应为{check.status}')
+        if len(captured) > check.max_queries:
+            result['failures'].append(f'规模{size}执行了{len(captured)}次查询，上限{check.max_queries}')
+        result.setdefault('sql', {})[size] = [sql for _, sql in captured]
+
+    if check.sizes:
+        small, large = (result['queries'][size] for size in check.sizes)
+        if large > small:
+            result['failures'].append(f'查询次数随规模增长：{small} -> {large}')
+    if result['scans']:
+        result['failures'].append(f'{len(result["scans"])}条查询对热点表全表扫描')
+    return result
+
+
+def uncovered_routes(checks=CHECKS):
+    """没有任何检查覆盖的路由名"""
+    # 占位符都以1代入，只用于匹配路由
+    covered = {
+        resolve(urlsplit(check.path.format_map(defaultdict(lambda: 1))).path).url_name
+        for check in checks
+    }
+    return sorted(route_names() - covered)
+
+
+def get_token(user):
+    token, _ = Token.objects.get_or_create(user=user)
+    return token
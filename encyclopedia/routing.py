@@ -0,0 +1,136 @@
+"""
+读写分离的数据库路由
+
+写操作始终走default。ReadRoutingMiddleware把GET/HEAD/OPTIONS请求的读操作随机分到
+DATABASE_REPLICAS中的一个副本；配置了副本或分析库时，客户端发出写请求后响应会带上
+PRIMARY_COOKIE，在READ_YOUR_WRITES_SECONDS内该客户端的读请求固定读default，保证读到自己的写入。
+统计等重查询用analytics()切换到DATABASE_ANALYTICS别名，只配置了分析库、没有副本时同样生效；
+写请求和固定读主库的请求中analytics()也不切换。
+事务中的读取始终走default；后台线程和管理命令不经过中间件，只有analytics()会切换到分析库。
+
+本地可配置两个SQLite文件，用 manage.py sync_replicas 模拟复制。
+"""
+
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+PRIMARY_COOKIE = 'db_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# 当前请求的读库别名，None表示使用default
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def replica_aliases():
+    return list(settings.DATABASE_REPLICAS)
+
+
+def secondary_aliases():
+    """default之外可能落后于主库的别名"""
+    return [*settings.DATABASE_REPLICAS, *filter(None, [settings.DATABASE_ANALYTICS])]
+
+
+@contextmanager
+def read_from(alias):
+    """在代码块内把读操作路由到指定别名"""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def analytics():
+    """在代码块内把读操作路由到分析库
+
+    未配置DATABASE_ANALYTICS，或当前请求固定读default（写请求和PRIMARY_COOKIE有效期内）时
+    沿用当前的读库。
+    """
+    if not settings.DATABASE_ANALYTICS or _read_alias.get() == DEFAULT_DB_ALIAS:
+        yield
+        return
+    with read_from(settings.DATABASE_ANALYTICS):
+        yield
+
+
+class ReplicaRouter:
+    """读操作按当前请求的读库别名路由，写操作和迁移只在default上执行"""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        # 写事务中的读取必须看到本事务的修改
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 副本与主库数据相同，跨别名的关联视为同一数据库
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 副本的表结构随复制同步，不单独迁移
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReadRoutingMiddleware:
+    """读请求分到副本，写请求之后的一段时间内让该客户端固定读主库"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        alias = self.read_alias(request)
+        if alias is None:
+            return self.get_response(request)
+        with read_from(alias):
+            return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        alias = self.read_alias(request)
+        if alias is None:
+            return await self.get_response(request)
+        # ContextVar会随sync_to_async复制到执行查询的线程
+        with read_from(alias):
+            return self.process_response(request, await self.get_response(request))
+
+    def read_alias(self, request):
+        """返回本次请求的读库别名，写请求和固定读主库时为default，不切换时返回None"""
+        if not secondary_aliases():
+            return None
+        if request.method not in SAFE_METHODS:
+            return DEFAULT_DB_ALIAS
+        try:
+            pinned = float(request.COOKIES.get(PRIMARY_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        if pinned:
+            return DEFAULT_DB_ALIAS
+        replicas = replica_aliases()
+        return random.choice(replicas) if replicas else None
+
+    def process_response(self, request, response):
+        """写请求之后设置固定读主库的cookie"""
+        if request.method not in SAFE_METHODS:
+            window = settings.READ_YOUR_WRITES_SECONDS
+            response.set_cookie(
+                PRIMARY_COOKIE, str(int(time.time() + window)), max_age=window, httponly=True, samesite='Lax'
+            )
+        return response
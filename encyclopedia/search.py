@@ -0,0 +1,293 @@
+"""
+词条全文检索
+
+SQLite下使用FTS5虚拟表建立倒排索引。FTS5自带的unicode61分词器会把连续的
+中文字符当作一个词，因此写入索引前先在每个中日文字符两侧插入分隔符，
+使其按单字切分，查询时再把中文检索词组装成短语查询（要求各字相邻），
+效果等同于子串匹配，但走的是索引而不是全表扫描。
+
+其他数据库使用SimpleSearchBackend，退化为icontains过滤。
+"""
+
+import html
+import re
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest, Lower, StrIndex, Substr
+from django.utils.module_loading import import_string
+
+
+# 需要按单字切分的字符范围：假名、CJK扩展A、CJK统一汉字、CJK兼容汉字
+CJK_CHARS = '぀-ヿ㐀-䶿一-鿿豈-﫿'
+CJK_BOUNDARY_RE = re.compile(f'(?<=[{CJK_CHARS}])|(?=[{CJK_CHARS}])')
+CJK_CHAR_RE = re.compile(f'[{CJK_CHARS}]')
+WORD_RE = re.compile(r'\w')
+
+# 单元分隔符(0x1F)属于控制字符，unicode61会将其视为分隔符，且只占一个字节
+TOKEN_SEPARATOR = '\x1f'
+
+# 参与索引的词条字段，顺序即FTS5表中的列顺序
+INDEXED_FIELDS = ('title', 'summary', 'content')
+
+# 相关度计算时各字段的权重：标题 > 摘要 > 正文
+FIELD_WEIGHTS = {'title': 10.0, 'summary': 5.0, 'content': 1.0}
+
+# 摘要片段的高亮标记与长度（FTS5按词元计数，中文即字数）
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+# FTS5先用控制字符标出命中位置，转义HTML后再替换为高亮标记
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+SNIPPET_ELLIPSIS = '…'
+SNIPPET_TOKENS = 48
+
+SQLITE_BACKEND = 'encyclopedia.search.SQLiteFTSBackend'
+DEFAULT_BACKEND = 'encyclopedia.search.SimpleSearchBackend'
+
+
+def tokenize(text):
+    """在中日文字符之间插入分隔符，其余文本保持不变"""
+    if not text:
+        return ''
+    return CJK_BOUNDARY_RE.sub(TOKEN_SEPARATOR, text)
+
+
+def highlight(text, terms):
+    """转义片段中的HTML，再用高亮标记包住不区分大小写的检索词"""
+    if not text:
+        return ''
+    terms = sorted({term for term in terms if term}, key=len, reverse=True)
+    if not terms:
+        return html.escape(text)
+    pattern = re.compile('|'.join(map(re.escape, terms)), re.IGNORECASE)
+    parts = []
+    position = 0
+    for match in pattern.finditer(text):
+        parts.append(html.escape(text[position:match.start()]))
+        parts.append(f'{HIGHLIGHT_START}{html.escape(match.group())}{HIGHLIGHT_END}')
+        position = match.end()
+    parts.append(html.escape(text[position:]))
+    return ''.join(parts)
+
+
+def build_match_query(query):
+    """将用户输入转换为FTS5 MATCH表达式，无有效检索词时返回None"""
+    phrases = []
+    for term in query.split():
+        if not WORD_RE.search(term):
+            continue
+        phrase = '"%s"' % tokenize(term).replace('"', '""')
+        # 英文、数字结尾的检索词按前缀匹配，与原先的icontains行为保持一致
+        if not CJK_CHAR_RE.match(term[-1]):
+            phrase += ' *'
+        phrases.append(phrase)
+    return ' '.join(phrases) or None
+
+
+class BaseSearchBackend:
+    """检索后端基类"""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+
+    def filter(self, queryset, query):
+        """按检索词过滤词条查询集"""
+        raise NotImplementedError
+
+    def _result_queryset(self, queryset):
+        from .models import Entry
+
+        if queryset is None:
+            queryset = Entry.objects.select_related('author', 'category').defer('content')
+        return queryset.using(self.using)
+
+    def search(self, query, limit=10, queryset=None):
+        """返回按相关度排序的已发布词条列表
+
+        每个词条附带search_score（越大越相关）和search_snippet（高亮片段）属性。
+        queryset用于加载词条对象，可预先裁剪列和关联，默认不读取正文。
+        """
+        raise NotImplementedError
+
+    def index_entry(self, entry):
+        """写入或更新单个词条的索引"""
+
+    def index_entries(self, entries):
+        """批量写入或更新一组词条的索引"""
+        for entry in entries:
+            self.index_entry(entry)
+
+    def remove_entry(self, entry_id):
+        """删除单个词条的索引"""
+
+    def rebuild(self, batch_size=500):
+        """重建全部索引，返回索引的词条数"""
+        return 0
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """不依赖索引的通用后端，用于不支持FTS5的数据库"""
+
+    def filter(self, queryset, query):
+        terms = query.split()
+        if not terms:
+            return queryset.none()
+        for term in terms:
+            queryset = queryset.filter(
+                Q(title__icontains=term) |
+                Q(content__icontains=term) |
+                Q(summary__icontains=term)
+            )
+        return queryset
+
+    def search(self, query, limit=10, queryset=None):
+        terms = query.split()
+        if not terms:
+            return []
+        score = Value(0)
+        for term in terms:
+            for field, weight in FIELD_WEIGHTS.items():
+                score = score + Case(
+                    When(**{f'{field}__icontains': term}, then=Value(int(weight))),
+                    default=Value(0),
+                    output_field=IntegerField()
+                )
+        # 以第一个检索词在正文中的位置为中心截取片段，与icontains一样不区分大小写
+        start = Greatest(StrIndex(Lower('content'), Lower(Value(terms[0]))) - SNIPPET_TOKENS // 2, 1)
+        queryset = (
+            self.filter(self._result_queryset(queryset).filter(is_published=True), query)
+            .annotate(
+                search_score=score,
+                search_excerpt=Substr('content', start, SNIPPET_TOKENS)
+            )
+            .order_by('-search_score', '-created_at')
+        )
+        results = list(queryset[:limit])
+        for entry in results:
+            entry.search_snippet = highlight(entry.search_excerpt, terms)
+        return results
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """基于SQLite FTS5的检索后端，索引行的rowid即词条id"""
+    table = 'encyclopedia_entry_fts'
+
+    def filter(self, queryset, query):
+        match = build_match_query(query)
+        if match is None:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+            (match,)
+        ))
+
+    def search(self, query, limit=10, queryset=None):
+        from .models import Entry
+
+        match = build_match_query(query)
+        if match is None:
+            return []
+        t = self.table
+        weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in INDEXED_FIELDS)
+        content_column = INDEXED_FIELDS.index('content')
+        # bm25()越小越相关；片段取自正文列，并去掉索引时插入的分隔符，
+        # 命中位置先用控制字符标记，转义HTML后再换成高亮标记
+        sql = (
+            f"SELECT {t}.rowid, -bm25({t}, {weights}) AS score, "
+            f"replace(snippet({t}, {content_column}, %s, %s, %s, {SNIPPET_TOKENS}), "
+            f"char({ord(TOKEN_SEPARATOR)}), '') "
+            f"FROM {t} JOIN {Entry._meta.db_table} e ON e.id = {t}.rowid "
+            f"WHERE {t} MATCH %s AND e.is_published "
+            f"ORDER BY score DESC LIMIT %s"
+        )
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(sql, [MATCH_START, MATCH_END, SNIPPET_ELLIPSIS, match, limit])
+            rows = cursor.fetchall()
+
+        entries = self._result_queryset(queryset).in_bulk([row[0] for row in rows])
+        results = []
+        for entry_id, score, snippet in rows:
+            entry = entries.get(entry_id)
+            if entry is None:
+                continue
+            entry.search_score = score
+            entry.search_snippet = (
+                html.escape(snippet or '')
+                .replace(MATCH_START, HIGHLIGHT_START)
+                .replace(MATCH_END, HIGHLIGHT_END)
+            )
+            results.append(entry)
+        return results
+
+    def _row(self, entry):
+        return [entry.pk] + [tokenize(getattr(entry, field)) for field in INDEXED_FIELDS]
+
+    def index_entry(self, entry):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {self.table} (rowid, title, summary, content) '
+                f'VALUES (%s, %s, %s, %s)',
+                self._row(entry)
+            )
+
+    def index_entries(self, entries):
+        rows = [self._row(entry) for entry in entries]
+        if rows:
+            with connections[self.using].cursor() as cursor:
+                cursor.executemany(
+                    f'INSERT OR REPLACE INTO {self.table} (rowid, title, summary, content) '
+                    f'VALUES (%s, %s, %s, %s)',
+                    rows
+                )
+
+    def remove_entry(self, entry_id):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [entry_id])
+
+    def rebuild(self, batch_size=500):
+        from .models import Entry
+
+        entries = (
+            Entry.objects.using(self.using)
+            .only('id', *INDEXED_FIELDS)
+            .order_by()
+            .iterator(chunk_size=batch_size)
+        )
+        count = 0
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            batch = []
+            for entry in entries:
+                batch.append(self._row(entry))
+                if len(batch) >= batch_size:
+                    count += self._insert_batch(cursor, batch)
+                    batch = []
+            count += self._insert_batch(cursor, batch)
+            # 合并索引段，减小后续查询需要扫描的b-tree数量
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+        return count
+
+    def _insert_batch(self, cursor, rows):
+        if rows:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, title, summary, content) '
+                f'VALUES (%s, %s, %s, %s)',
+                rows
+            )
+        return len(rows)
+
+
+def get_search_backend(using=DEFAULT_DB_ALIAS):
+    """根据SEARCH_BACKEND配置或数据库类型返回检索后端"""
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if not path:
+        path = SQLITE_BACKEND if connections[using].vendor == 'sqlite' else DEFAULT_BACKEND
+    return import_string(path)(using)
+
+
+def search_entries(queryset, query):
+    """在给定查询集上执行全文检索"""
+    return get_search_backend(queryset.db).filter(queryset, query)
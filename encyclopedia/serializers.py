@@ -1,6 +1,110 @@
 from rest_framework import serializers
+from . import images
+from . import tasks
+from .instrumentation import TimedSerializerMixin
 from .models import Category, Entry, EntryImage, EntryHistory, Favorite
 from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.utils import timezone
+
+
+def parse_field_list(value):
+    """解析以逗号分隔的字段名列表"""
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+def preload_favorited_ids(context, entry_ids):
+    """在序列化器上下文中缓存当前用户对这一页词条的收藏状态"""
+    request = context.get('request')
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        context['favorited_ids'] = set()
+    else:
+        context['favorited_ids'] = Favorite.favorited_entry_ids(user, entry_ids)
+
+
+def is_favorited(context, entry_id):
+    """优先读取预加载的收藏状态，没有时单独查询"""
+    favorited_ids = context.get('favorited_ids')
+    if favorited_ids is not None:
+        return entry_id in favorited_ids
+    request = context.get('request')
+    if request and request.user.is_authenticated:
+        return Favorite.objects.filter(user=request.user, entry_id=entry_id).exists()
+    return False
+
+
+class SparseFieldsMixin:
+    """支持?fields=与?expand=参数的序列化器混入类，只对最外层序列化器生效
+
+    fields：逗号分隔，限定返回的字段；Meta.optional_fields中的字段只在此处显式列出时返回。
+    expand：逗号分隔，指定展开为嵌套对象的关联字段（Meta.expandable_fields），
+    未展开的关联只返回主键；不传expand时保持全部展开。
+    """
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        is_root = request is not None and self._is_root_serializer()
+        
+        requested = parse_field_list(request.query_params.get('fields')) if is_root else set()
+        optional = set(getattr(self.Meta, 'optional_fields', []))
+        for name in list(fields):
+            if (requested and name not in requested) or (name in optional and name not in requested):
+                del fields[name]
+        
+        if is_root and 'expand' in request.query_params:
+            expand = parse_field_list(request.query_params.get('expand'))
+            for name in getattr(self.Meta, 'expandable_fields', []):
+                if name in fields and name not in expand:
+                    fields[name] = serializers.PrimaryKeyRelatedField(
+                        read_only=True, many=getattr(fields[name], 'many', False)
+                    )
+        return fields
+    
+    def _is_root_serializer(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+    
+    def optimize_queryset(self, queryset, extra_fields=()):
+        """按最终输出的字段裁剪查询集：主表只读取需要的列，并只关联需要展开的对象"""
+        opts = self.Meta.model._meta
+        only = {opts.pk.name, *extra_fields}
+        select_related = []
+        prefetch_related = []
+        for field in self.fields.values():
+            try:
+                model_field = opts.get_field(field.source.split('.')[0])
+            except FieldDoesNotExist:
+                continue
+            if model_field.concrete:
+                only.add(model_field.name)
+                if isinstance(field, serializers.BaseSerializer):
+                    select_related.append(model_field.name)
+            elif isinstance(field, serializers.BaseSerializer):
+                prefetch_related.append(field.source)
+        return (
+            queryset.only(*only)
+            .select_related(*select_related)
+            .prefetch_related(*prefetch_related)
+        )
+
+
+class FavoritedPreloadListSerializer(serializers.ListSerializer):
+    """批量序列化词条时一次性查出当前用户的收藏状态，避免逐条查询"""
+    entry_id_attr = 'pk'
+    
+    def needs_favorited_ids(self):
+        return 'is_favorited' in self.child.fields
+    
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        if self.needs_favorited_ids():
+            preload_favorited_ids(self.context, [getattr(item, self.entry_id_attr) for item in items])
+        return super().to_representation(items)
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -10,7 +114,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'date_joined']
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """分类序列化器"""
     entry_count = serializers.SerializerMethodField()
     
@@ -19,32 +123,64 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'entry_count', 'created_at']
     
     def get_entry_count(self, obj):
-        """获取分类下的词条数量"""
-        return obj.entry_set.count()
+        """获取分类下的已发布词条数，优先使用查询集中的实时统计"""
+        return getattr(obj, 'live_entry_count', obj.entry_count)
 
 
 class EntryImageSerializer(serializers.ModelSerializer):
     """词条图片序列化器"""
+    variants = serializers.SerializerMethodField()
+    
     class Meta:
         model = EntryImage
-        fields = ['id', 'image', 'caption', 'uploaded_at']
+        fields = ['id', 'image', 'variants', 'caption', 'uploaded_at']
+    
+    def get_variants(self, obj):
+        """各尺寸的WebP和JPEG版本，尚未生成时为空，客户端回退使用原图"""
+        return images.variant_urls(obj, self.context.get('request'))
 
 
-class EntryListSerializer(serializers.ModelSerializer):
-    """词条列表序列化器"""
+class EntryListSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """词条列表序列化器，正文只在?fields=中显式请求时返回"""
     author = UserSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
     summary = serializers.CharField(read_only=True)
+    is_favorited = serializers.SerializerMethodField()
     
     class Meta:
         model = Entry
         fields = [
-            'id', 'title', 'summary', 'category', 'author', 
-            'created_at', 'updated_at', 'view_count', 'like_count'
+            'id', 'title', 'summary', 'content', 'category', 'author', 
+            'created_at', 'updated_at', 'view_count', 'like_count', 'is_favorited'
         ]
+        optional_fields = ['content']
+        expandable_fields = ['author', 'category']
+        list_serializer_class = FavoritedPreloadListSerializer
+    
+    def get_is_favorited(self, obj):
+        """检查当前用户是否收藏了该词条"""
+        return is_favorited(self.context, obj.pk)
+
+
+class SearchResultSerializer(EntryListSerializer):
+    """检索结果序列化器，附带相关度得分和高亮片段"""
+    score = serializers.FloatField(source='search_score', read_only=True)
+    snippet = serializers.CharField(source='search_snippet', read_only=True)
+    
+    class Meta(EntryListSerializer.Meta):
+        fields = EntryListSerializer.Meta.fields + ['score', 'snippet']
+
+
+class TrendingEntrySerializer(EntryListSerializer):
+    """热门排行序列化器，附带名次和热度"""
+    rank = serializers.IntegerField(source='trending_rank', read_only=True)
+    score = serializers.FloatField(source='trending_score', read_only=True)
+    
+    class Meta(EntryListSerializer.Meta):
+        fields = EntryListSerializer.Meta.fields + ['rank', 'score']
 
 
-class EntryDetailSerializer(serializers.ModelSerializer):
+class EntryDetailSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """词条详情序列化器"""
     author = UserSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
@@ -58,13 +194,11 @@ class EntryDetailSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at', 'view_count', 'like_count',
             'is_published', 'images', 'is_favorited'
         ]
+        expandable_fields = ['author', 'category', 'images']
     
     def get_is_favorited(self, obj):
         """检查当前用户是否收藏了该词条"""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Favorite.objects.filter(user=request.user, entry=obj).exists()
-        return False
+        return is_favorited(self.context, obj.pk)
 
 
 class EntryCreateSerializer(serializers.ModelSerializer):
@@ -96,34 +230,67 @@ class EntryUpdateSerializer(serializers.ModelSerializer):
         """更新词条并记录编辑历史"""
         request = self.context.get('request')
         
-        # 记录编辑历史
-        EntryHistory.objects.create(
-            entry=instance,
-            editor=request.user,
-            old_content=instance.content,
-            new_content=validated_data.get('content', instance.content),
-            edit_summary=f"更新词条内容"
+        # 记录编辑历史（差量存储），同一词条的历史按编辑顺序写入
+        tasks.record_edit.enqueue(
+            instance.pk,
+            request.user.pk,
+            instance.content,
+            validated_data.get('content', instance.content),
+            "更新词条内容",
+            timezone.now().isoformat(),
+            sequence_key=f'entry_history:{instance.pk}'
         )
         
         return super().update(instance, validated_data)
 
 
-class EntryHistorySerializer(serializers.ModelSerializer):
-    """编辑历史序列化器"""
+class EntryHistorySerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """编辑历史序列化器，只返回版本信息，不含正文"""
     editor = UserSerializer(read_only=True)
     
     class Meta:
         model = EntryHistory
-        fields = ['id', 'editor', 'old_content', 'new_content', 'edit_summary', 'edited_at']
+        fields = ['id', 'revision', 'editor', 'edit_summary', 'edited_at']
+        expandable_fields = ['editor']
+
+
+class EntryRevisionSerializer(EntryHistorySerializer):
+    """单个版本序列化器，附带还原后的编辑前后内容"""
+    old_content = serializers.SerializerMethodField()
+    new_content = serializers.SerializerMethodField()
+    
+    class Meta(EntryHistorySerializer.Meta):
+        fields = EntryHistorySerializer.Meta.fields + ['old_content', 'new_content']
+    
+    def _contents(self, obj):
+        if not hasattr(obj, '_contents'):
+            obj._contents = obj.get_contents()
+        return obj._contents
+    
+    def get_old_content(self, obj):
+        return self._contents(obj)[0]
+    
+    def get_new_content(self, obj):
+        return self._contents(obj)[1]
+
+
+class FavoriteListSerializer(FavoritedPreloadListSerializer):
+    """收藏列表序列化器，按收藏记录的entry_id预加载收藏状态"""
+    entry_id_attr = 'entry_id'
+    
+    def needs_favorited_ids(self):
+        return isinstance(self.child.fields.get('entry'), serializers.BaseSerializer)
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """收藏序列化器"""
     entry = EntryListSerializer(read_only=True)
     
     class Meta:
         model = Favorite
         fields = ['id', 'entry', 'created_at']
+        expandable_fields = ['entry']
+        list_serializer_class = FavoriteListSerializer
 
 
 class FavoriteCreateSerializer(serializers.ModelSerializer):
@@ -0,0 +1,36 @@
+"""
+SQLite连接调优与写事务
+
+新建连接时按SQLITE_PRAGMAS执行PRAGMA（WAL、synchronous、mmap、缓存和busy_timeout）。
+SQLite同一时刻只允许一个写事务，延迟事务先读后写时，锁升级失败会直接返回
+database is locked而不等待busy_timeout；开启SQLITE_SERIALIZE_WRITES后，
+transaction.atomic以BEGIN IMMEDIATE开启事务，开始时即取得写锁，取不到时按busy_timeout等待。
+写锁只在事务期间持有，请求中的解析、文件处理等不在事务内的工作互不阻塞。
+"""
+
+from django.conf import settings
+
+
+def apply_pragmas(cursor, pragmas):
+    """在DB-API游标上依次执行PRAGMA，journal_mode应排在最前"""
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def _begin_immediate(connection):
+    # 替换SQLite后端的_start_transaction_under_autocommit，原实现执行的是BEGIN（延迟事务）
+    def start_transaction_under_autocommit():
+        connection.cursor().execute('BEGIN IMMEDIATE')
+    return start_transaction_under_autocommit
+
+
+def configure_connection(connection):
+    """connection_created时调用，为新的SQLite连接应用配置的PRAGMA和事务模式"""
+    if connection.vendor != 'sqlite':
+        return
+    if settings.SQLITE_PRAGMAS:
+        with connection.cursor() as cursor:
+            apply_pragmas(cursor, settings.SQLITE_PRAGMAS)
+    if settings.SQLITE_SERIALIZE_WRITES:
+        # Django 4.2没有SQLite的transaction_mode选项（5.1起才有）
+        connection._start_transaction_under_autocommit = _begin_immediate(connection)
@@ -0,0 +1,178 @@
+"""
+词条统计的按天汇总
+
+DailyEntryStat按(日期, 作者, 分类)保存当天新建的词条数、发生的浏览数和点赞数，
+由词条保存与删除、浏览次数写回以及点赞接口增量维护，统计接口只需一次分组查询。
+SQLite的唯一约束不比较NULL，未分类的行由单独的部分唯一约束保证每天每个作者只有一行；
+删除分类时先把它的行并入未分类的行，再由SET_NULL置空。
+历史数据用 manage.py backfill_statistics 回填：已有的浏览数和点赞数计入词条创建当天。
+"""
+
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, DateField, Exists, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Trunc, TruncDate
+from django.utils import timezone
+
+
+GRANULARITIES = ('day', 'week', 'month', 'year')
+PERIOD_FORMATS = {'day': '%Y-%m-%d', 'week': '%Y-%m-%d', 'month': '%Y-%m', 'year': '%Y'}
+
+
+def _bump(date, author_id, category_id, create=True, **deltas):
+    """累加一行汇总数据，不存在时按需创建"""
+    from .models import DailyEntryStat
+
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    rows = DailyEntryStat.objects.filter(date=date, author_id=author_id, category_id=category_id)
+    increments = {field: F(field) + delta for field, delta in deltas.items()}
+    if rows.update(**increments) or not create:
+        return
+    # 行不存在时先插入计数为0的行再累加；并发插入同一行时由ignore_conflicts忽略，
+    # 不需要保存点，也不会中断调用方的事务
+    DailyEntryStat.objects.bulk_create(
+        [DailyEntryStat(date=date, author_id=author_id, category_id=category_id)], ignore_conflicts=True
+    )
+    rows.update(**increments)
+
+
+def merge_category(category_id):
+    """分类删除前把它的汇总行累加到同一天同一作者未分类的行上，并删除被合并的行"""
+    from .models import DailyEntryStat
+
+    moved = DailyEntryStat.objects.filter(category_id=category_id)
+    same_day = moved.filter(date=OuterRef('date'), author_id=OuterRef('author_id'))
+    uncategorized = DailyEntryStat.objects.filter(category__isnull=True)
+    uncategorized.filter(Exists(same_day)).update(**{
+        field: F(field) + Subquery(same_day.values(field)[:1])
+        for field in ('entry_count', 'view_count', 'like_count')
+    })
+    moved.filter(Exists(
+        uncategorized.filter(date=OuterRef('date'), author_id=OuterRef('author_id'))
+    )).delete()
+
+
+def record_entry_created(entry):
+    _bump(timezone.localdate(entry.created_at), entry.author_id, entry.category_id, entry_count=1)
+
+
+def record_entries_created(entries):
+    """记录一批通过bulk_create新建的词条"""
+    grouped = Counter(
+        (timezone.localdate(entry.created_at), entry.author_id, entry.category_id)
+        for entry in entries
+    )
+    for (date, author_id, category_id), count in grouped.items():
+        _bump(date, author_id, category_id, entry_count=count)
+
+
+def record_entry_deleted(entry):
+    _bump(
+        timezone.localdate(entry.created_at), entry.author_id, entry.category_id,
+        create=False, entry_count=-1
+    )
+
+
+def record_entry_moved(entry, old_category_id):
+    """词条换分类时，把创建当天的词条数从原分类移到新分类"""
+    date = timezone.localdate(entry.created_at)
+    _bump(date, entry.author_id, old_category_id, create=False, entry_count=-1)
+    _bump(date, entry.author_id, entry.category_id, entry_count=1)
+
+
+def record_views(view_counts):
+    """记录一批浏览，view_counts为{词条id: 次数}"""
+    from .models import Entry
+
+    # 详情接口传入的主键可能是URL中的字符串
+    counts = Counter()
+    for entry_id, count in view_counts.items():
+        counts[int(entry_id)] += count
+    today = timezone.localdate()
+    grouped = Counter()
+    entries = Entry.objects.filter(pk__in=list(counts)).values_list('id', 'author_id', 'category_id')
+    for entry_id, author_id, category_id in entries:
+        grouped[(author_id, category_id)] += counts[entry_id]
+    for (author_id, category_id), count in grouped.items():
+        _bump(today, author_id, category_id, view_count=count)
+
+
+def record_like(author_id, category_id, delta):
+    """记录被点赞词条的一次点赞(delta=1)或取消点赞(delta=-1)，作者和分类由调用方传入"""
+    _bump(timezone.localdate(), author_id, category_id, like_count=delta)
+
+
+def backfill():
+    """按词条表重建全部汇总数据，返回写入的行数"""
+    from .models import DailyEntryStat, Entry
+
+    rows = (
+        Entry.objects.order_by()
+        .annotate(date=TruncDate('created_at'))
+        .values('date', 'author_id', 'category_id')
+        .annotate(
+            entries=Count('id'),
+            views=Sum('view_count'),
+            likes=Sum('like_count')
+        )
+    )
+    with transaction.atomic():
+        DailyEntryStat.objects.all().delete()
+        created = DailyEntryStat.objects.bulk_create([
+            DailyEntryStat(
+                date=row['date'],
+                author_id=row['author_id'],
+                category_id=row['category_id'],
+                entry_count=row['entries'],
+                view_count=row['views'] or 0,
+                like_count=row['likes'] or 0
+            )
+            for row in rows
+        ], batch_size=1000)
+    return len(created)
+
+
+def get_author_statistics(user, start, end, granularity='month'):
+    """一次查询返回作者在[start, end]内的分期统计，以及全部时间的分类分布和总计"""
+    from .models import DailyEntryStat
+
+    period = Case(
+        When(date__range=(start, end), then=Trunc('date', granularity, output_field=DateField())),
+        default=None,
+        output_field=DateField()
+    )
+    rows = (
+        DailyEntryStat.objects.filter(author=user)
+        .annotate(period=period)
+        .values('period', 'category__name')
+        .annotate(
+            entries=Sum('entry_count'),
+            views=Sum('view_count'),
+            likes=Sum('like_count')
+        )
+        .order_by()
+    )
+
+    periods = defaultdict(lambda: {'entries': 0, 'views': 0, 'likes': 0})
+    categories = Counter()
+    overall = {'entries': 0, 'views': 0, 'likes': 0}
+    for row in rows:
+        for key in overall:
+            overall[key] += row[key] or 0
+        if row['category__name']:
+            categories[row['category__name']] += row['entries'] or 0
+        if row['period'] is not None:
+            for key in overall:
+                periods[row['period']][key] += row[key] or 0
+
+    return {
+        'periods': [
+            {'date': date.strftime(PERIOD_FORMATS[granularity]), **periods[date]}
+            for date in sorted(periods)
+        ],
+        'categories': [(name, count) for name, count in categories.most_common() if count > 0],
+        'overall': overall,
+    }
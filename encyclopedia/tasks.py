@@ -0,0 +1,51 @@
+"""
+可延后执行的写操作，由请求入队、worker执行，见encyclopedia.jobs
+"""
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.utils.dateparse import parse_datetime
+
+from . import history
+from . import images
+from .jobs import task
+from .search import INDEXED_FIELDS, get_search_backend
+
+
+@task(name='search.sync_entry')
+def sync_search_index(entry_id):
+    """按词条的当前状态更新全文索引，词条已删除时移除索引"""
+    from .models import Entry
+
+    entry = Entry.objects.filter(pk=entry_id).only('id', *INDEXED_FIELDS).first()
+    backend = get_search_backend()
+    if entry is None:
+        backend.remove_entry(entry_id)
+    else:
+        backend.index_entry(entry)
+
+
+@task(name='history.record_edit')
+def record_edit(entry_id, editor_id, old_content, new_content, edit_summary, edited_at):
+    """追加一条编辑历史，编辑时间为请求中的编辑时间"""
+    from .models import Entry
+
+    entry = Entry.objects.filter(pk=entry_id).only('id').first()
+    if entry is None:
+        return
+    history.record_edit(
+        entry,
+        User(pk=editor_id),
+        old_content,
+        new_content,
+        edit_summary=edit_summary,
+        edited_at=parse_datetime(edited_at)
+    )
+
+
+@task(name='images.generate_variants', max_attempts=3)
+def generate_image_variants(label, pk):
+    """生成图片的缩放版本，记录已被删除时跳过"""
+    instance = apps.get_model(label).objects.filter(pk=pk).first()
+    if instance is not None:
+        images.generate(instance)
@@ -0,0 +1,706 @@
+import gzip
+import io
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from users.authentication import token_snapshots
+from users.models import UserProfile
+
+from . import cache as entry_cache
+from . import corpus, jobs, querybudget, routing, trending
+from .search import (
+    TOKEN_SEPARATOR, SimpleSearchBackend, SQLiteFTSBackend, build_match_query, get_search_backend
+)
+from .counters import ViewCountBuffer
+from .history import diff_revisions, get_revision_contents, record_edit
+from .models import Category, DailyEntryStat, Entry, EntryTrend, Favorite, Job, TrendingEntry
+
+
+class SearchIndexTests(TestCase):
+    """FTS5全文索引的检索、排序、片段和索引维护"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('author', password='password')
+        self.backend = get_search_backend()
+
+    def create(self, title, content, summary=''):
+        return Entry.objects.create(title=title, content=content, summary=summary, author=self.user)
+
+    def search(self, query):
+        return self.backend.search(query, limit=10)
+
+    def ids(self, query):
+        return [entry.pk for entry in self.search(query)]
+
+    def test_sqlite_uses_fts_backend(self):
+        self.assertIsInstance(self.backend, SQLiteFTSBackend)
+
+    def test_cjk_phrase_matching(self):
+        ai = self.create('人工智能', '人工智能是计算机科学的分支')
+        learning = self.create('机器学习', '机器学习是实现人工智能的方法')
+        self.create('智能手机', '手机上的人工助手与智能应用')
+        self.assertCountEqual(self.ids('人工智能'), [ai.pk, learning.pk])
+        # 各字必须相邻，不是分别出现即可
+        self.assertEqual(self.ids('人智'), [])
+
+    def test_title_matches_rank_first(self):
+        in_content = self.create('计算机', '量子计算是新的计算方式')
+        in_title = self.create('量子计算', '一种计算模型')
+        self.assertEqual(self.ids('量子计算'), [in_title.pk, in_content.pk])
+        scores = [entry.search_score for entry in self.search('量子计算')]
+        self.assertGreater(scores[0], scores[1])
+
+    def test_snippet_escapes_html(self):
+        self.create('脚本', '页面中的<script>alert(1)</script>会被转义')
+        snippet = self.search('alert')[0].search_snippet
+        self.assertNotIn('<script>', snippet)
+        self.assertIn('&lt;script&gt;', snippet)
+        self.assertIn('<mark>alert</mark>', snippet)
+
+    def test_index_follows_save_and_delete(self):
+        entry = self.create('旧标题', '正文')
+        self.assertEqual(self.ids('旧标题'), [entry.pk])
+        entry.title = '新标题'
+        entry.save()
+        self.assertEqual(self.ids('旧标题'), [])
+        self.assertEqual(self.ids('新标题'), [entry.pk])
+        entry.delete()
+        self.assertEqual(self.ids('新标题'), [])
+
+    def test_unpublished_entries_are_hidden(self):
+        entry = self.create('草稿', '未发布的内容')
+        Entry.objects.filter(pk=entry.pk).update(is_published=False)
+        self.assertEqual(self.ids('草稿'), [])
+
+
+class SearchQueryTests(TestCase):
+    """检索词到FTS5 MATCH表达式的转换"""
+
+    OPERATOR_QUERIES = ['"', 'a"b', 'foo*', 'NEAR(a b)', 'cat OR dog', 'NOT', 'AND', '-x', '^y', 'title:z', '(', ')']
+
+    def setUp(self):
+        self.user = User.objects.create_user('author', password='password')
+
+    def test_cjk_term_is_a_unigram_phrase(self):
+        sep = TOKEN_SEPARATOR
+        self.assertEqual(build_match_query('人工智能'), f'"{sep}人{sep}工{sep}智{sep}能{sep}"')
+
+    def test_latin_terms_match_by_prefix(self):
+        sep = TOKEN_SEPARATOR
+        self.assertEqual(build_match_query('python 编程'), f'"python" * "{sep}编{sep}程{sep}"')
+
+    def test_punctuation_only_query_matches_nothing(self):
+        self.assertIsNone(build_match_query('!!! ，。 "'))
+        backend = SQLiteFTSBackend()
+        self.assertEqual(backend.search('!!! ，。'), [])
+        self.assertFalse(backend.filter(Entry.objects.all(), '。。').exists())
+
+    def test_operators_are_quoted(self):
+        for query in self.OPERATOR_QUERIES:
+            with self.subTest(query=query):
+                match = build_match_query(query)
+                if match is not None:
+                    # 每个检索词都是带引号的短语，用户输入中的引号成对转义
+                    self.assertRegex(match, r'^("([^"]|"")*"( \*)? ?)+$')
+                SQLiteFTSBackend().search(query)
+
+    def test_or_is_a_term_not_an_operator(self):
+        both = Entry.objects.create(title='cat and dog', content='or', author=self.user)
+        Entry.objects.create(title='cat', content='正文', author=self.user)
+        self.assertEqual([entry.pk for entry in SQLiteFTSBackend().search('cat OR dog')], [both.pk])
+
+    def test_highlight_is_case_insensitive_in_both_backends(self):
+        Entry.objects.create(title='Python', content='Learning PYTHON basics', author=self.user)
+        for backend in (SQLiteFTSBackend(), SimpleSearchBackend()):
+            with self.subTest(backend=type(backend).__name__):
+                self.assertIn('<mark>PYTHON</mark>', backend.search('python')[0].search_snippet)
+
+
+class CursorPaginationTests(TestCase):
+    """游标分页在排序值相同时不重复、不遗漏"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='password')
+        self.entries = [
+            Entry.objects.create(title=f'词条{i}', content='正文', author=self.user) for i in range(7)
+        ]
+        # 全部词条的创建时间相同，只能靠id区分先后
+        Entry.objects.update(created_at=timezone.now())
+
+    def collect(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.json()['results'])
+            url = response.json()['next']
+        return ids
+
+    def test_entries_with_equal_created_at(self):
+        ids = self.collect('/api/entries/?page_size=3')
+        self.assertEqual(ids, sorted((entry.pk for entry in self.entries), reverse=True))
+
+    def test_favorites_with_equal_created_at(self):
+        for entry in self.entries:
+            Favorite.objects.create(user=self.user, entry=entry)
+        Favorite.objects.update(created_at=timezone.now())
+        self.client.force_login(self.user)
+        ids = self.collect('/api/favorites/?page_size=2')
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(len(ids), len(self.entries))
+
+    def test_invalid_cursor(self):
+        self.client.force_login(self.user)
+        for url in ('/api/entries/', '/api/favorites/', f'/api/entries/{self.entries[0].pk}/history/'):
+            with self.subTest(url=url):
+                response = self.client.get(url, {'cursor': 'not-a-cursor'})
+                self.assertEqual(response.status_code, 404)
+
+
+class EntryListQueryTests(TestCase):
+    """词条列表的查询次数不随分页大小增长"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='password')
+        authors = [User.objects.create_user(f'author{i}', password='password') for i in range(3)]
+        categories = [Category.objects.create(name=f'分类{i}') for i in range(3)]
+        for i in range(30):
+            entry = Entry.objects.create(
+                title=f'词条{i}',
+                content=f'正文{i}',
+                author=authors[i % 3],
+                category=categories[i % 3],
+            )
+            if i % 2:
+                Favorite.objects.create(user=cls.user, entry=entry)
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        token_snapshots.clear()
+        self.client = APIClient()
+
+    def assert_list_queries(self, num):
+        for page_size in (5, 25):
+            token_snapshots.clear()
+            with self.assertNumQueries(num):
+                response = self.client.get('/api/entries/', {'page_size': page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), page_size)
+            self.assertTrue(all('entry_count' in item['category'] for item in response.data['results']))
+
+    def test_anonymous_list(self):
+        self.assert_list_queries(1)
+
+    def test_authenticated_list(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assert_list_queries(3)
+
+
+class ProfileCounterTests(TestCase):
+    """用户资料中的词条数和收藏数随写入维护"""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='password')
+        self.reader = User.objects.create_user('reader', password='password')
+        self.entry = Entry.objects.create(title='词条', content='正文', author=self.author)
+
+    def counts(self, user):
+        profile = UserProfile.objects.get(user=user)
+        return profile.entries_count, profile.favorites_count
+
+    def test_entry_create_and_delete(self):
+        self.assertEqual(self.counts(self.author), (1, 0))
+        Entry.objects.create(title='另一个', content='正文', author=self.author)
+        self.assertEqual(self.counts(self.author), (2, 0))
+        self.entry.delete()
+        self.assertEqual(self.counts(self.author), (1, 0))
+
+    def test_favorite_and_unfavorite(self):
+        favorite = Favorite.objects.create(user=self.reader, entry=self.entry)
+        self.assertEqual(self.counts(self.reader), (0, 1))
+        favorite.delete()
+        self.assertEqual(self.counts(self.reader), (0, 0))
+
+    def test_entry_delete_decrements_favoriters_once(self):
+        other = Entry.objects.create(title='另一个', content='正文', author=self.author)
+        Favorite.objects.create(user=self.reader, entry=self.entry)
+        Favorite.objects.create(user=self.reader, entry=other)
+        self.entry.delete()
+        self.assertEqual(self.counts(self.reader), (0, 1))
+
+    def test_profile_api_reads_counters(self):
+        Favorite.objects.create(user=self.author, entry=self.entry)
+        self.client.force_login(self.author)
+        with self.assertNumQueries(3):
+            data = self.client.get('/api/auth/profile/').json()
+        self.assertEqual((data['entry_count'], data['favorite_count']), (1, 1))
+
+    def test_reconcile_fixes_drift(self):
+        UserProfile.objects.filter(user=self.author).update(entries_count=7, favorites_count=3)
+        call_command('reconcile_profile_counts', stdout=io.StringIO())
+        self.assertEqual(self.counts(self.author), (1, 0))
+
+
+class FavoritedPreloadTests(TestCase):
+    """列表中的收藏状态一次查出，并与逐条查询的结果一致"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='password')
+        self.entries = [
+            Entry.objects.create(title=f'词条{i}', content='正文', author=self.user) for i in range(6)
+        ]
+        self.favorited = {entry.pk for entry in self.entries[::2]}
+        for pk in self.favorited:
+            Favorite.objects.create(user=self.user, entry_id=pk)
+        # 其他用户的收藏不影响当前用户
+        other = User.objects.create_user('other', password='password')
+        Favorite.objects.create(user=other, entry=self.entries[1])
+
+    def is_favorited(self, url):
+        results = self.client.get(url).json()['results']
+        return {item['id']: item['is_favorited'] for item in results}
+
+    def test_list_marks_current_users_favorites(self):
+        self.client.force_login(self.user)
+        states = self.is_favorited('/api/entries/')
+        self.assertEqual({pk for pk, favorited in states.items() if favorited}, self.favorited)
+        self.assertEqual(len(states), len(self.entries))
+
+    def test_detail_agrees_with_list(self):
+        self.client.force_login(self.user)
+        for entry in self.entries:
+            data = self.client.get(f'/api/entries/{entry.pk}/').json()
+            self.assertEqual(data['is_favorited'], entry.pk in self.favorited)
+
+    def test_anonymous_sees_no_favorites(self):
+        self.assertFalse(any(self.is_favorited('/api/entries/').values()))
+
+
+class EntryDetailCacheTests(TestCase):
+    """词条详情缓存的失效"""
+
+    def setUp(self):
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        user = User.objects.create_user('author', password='password')
+        self.entry = Entry.objects.create(title='标题', content='正文', author=user)
+        self.url = f'/api/entries/{self.entry.pk}/'
+
+    def versions(self):
+        return entry_cache.get_versions(self.entry.pk, self.entry.author_id, self.entry.category_id)
+
+    def test_invalidated_after_commit(self):
+        self.client.get(self.url)
+        before = self.versions()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entry.title = '新标题'
+            self.entry.save()
+            # 提交前其他请求仍按旧版本号读写缓存
+            self.assertEqual(self.versions(), before)
+        self.assertNotEqual(self.versions(), before)
+        self.assertEqual(self.client.get(self.url).json()['title'], '新标题')
+
+    def test_lost_version_does_not_revive_payload(self):
+        self.client.get(self.url)
+        self.assertIsNotNone(entry_cache.get_entry_detail(self.entry.pk))
+        caches[settings.ENTRY_VERSION_CACHE].clear()
+        self.assertIsNone(entry_cache.get_entry_detail(self.entry.pk))
+
+
+class HistoryDiffTests(TestCase):
+    """编辑历史的差量还原与版本比较"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('editor', password='password')
+        self.entry = Entry.objects.create(title='历史', content='第一行\n第二行', author=self.user)
+
+    def edit(self, old, new):
+        record_edit(self.entry, self.user, old, new)
+
+    def test_diff_without_final_newline(self):
+        self.edit('第一行\n第二行', '第一行\n第二行 python programming')
+        self.edit('第一行\n第二行 python programming', '再次修改\n第二行')
+        diff = diff_revisions(self.entry.pk, 1, 2).splitlines()
+        self.assertEqual(diff[:2], ['--- r1', '+++ r2'])
+        self.assertEqual(diff[3:], ['-第一行', '-第二行 python programming', '+再次修改', '+第二行'])
+
+    def test_revisions_round_trip(self):
+        contents = ['第一行\n第二行', '第一行\n第二行\n', '第三行', '']
+        for old, new in zip(contents, contents[1:]):
+            self.edit(old, new)
+        for revision, (old, new) in enumerate(zip(contents, contents[1:]), start=1):
+            self.assertEqual(get_revision_contents(self.entry.pk, revision), (old, new))
+
+
+class DailyStatTests(TestCase):
+    """每日统计中未分类的行"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('author', password='password')
+        self.category = Category.objects.create(name='分类')
+
+    def test_uncategorized_row_is_unique(self):
+        today = timezone.localdate()
+        for _ in range(2):
+            DailyEntryStat.objects.bulk_create(
+                [DailyEntryStat(date=today, author=self.user, category=None)], ignore_conflicts=True
+            )
+        self.assertEqual(DailyEntryStat.objects.filter(category__isnull=True).count(), 1)
+
+    def test_category_delete_merges_rows(self):
+        Entry.objects.create(title='已分类', content='正文', author=self.user, category=self.category)
+        Entry.objects.create(title='未分类', content='正文', author=self.user)
+        self.category.delete()
+        rows = list(DailyEntryStat.objects.values_list('category_id', 'entry_count'))
+        self.assertEqual(rows, [(None, 2)])
+
+
+class TrendingTests(TestCase):
+    """热度累加与排行物化"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('author', password='password')
+        self.category = Category.objects.create(name='分类')
+        self.entries = [
+            Entry.objects.create(title=f'词条{i}', content='正文', author=self.user, category=self.category)
+            for i in range(3)
+        ]
+        self.now = timezone.now()
+
+    def score(self, entry):
+        return trending.current_score(EntryTrend.objects.get(entry=entry).log_score, self.now)
+
+    def test_record_activity_accumulates_in_sql(self):
+        first, second, _ = self.entries
+        trending.record_activity({first.pk: 5, second.pk: 2}, now=self.now)
+        trending.record_activity({first.pk: 3, second.pk: -1}, now=self.now)
+        self.assertAlmostEqual(self.score(first), 8, places=6)
+        self.assertAlmostEqual(self.score(second), 1, places=6)
+        trending.record_activity({second.pk: -1}, now=self.now)
+        self.assertFalse(EntryTrend.objects.filter(entry=second).exists())
+
+    def test_refresh_in_batches(self):
+        for weight, entry in enumerate(self.entries, start=1):
+            trending.record_activity({entry.pk: weight}, now=self.now)
+        trending.refresh(top_k=2, now=self.now, batch_size=1)
+        ranked = list(TrendingEntry.objects.order_by('scope', 'rank').values_list('scope', 'entry_id'))
+        expected = [self.entries[2].pk, self.entries[1].pk]
+        self.assertEqual(ranked, [(0, pk) for pk in expected] + [(self.category.pk, pk) for pk in expected])
+
+    def test_unpublished_after_ranking_is_skipped(self):
+        for weight, entry in enumerate(self.entries, start=1):
+            trending.record_activity({entry.pk: weight}, now=self.now)
+        trending.refresh(now=self.now)
+        Entry.objects.filter(pk=self.entries[2].pk).update(is_published=False)
+        # 模拟读取排行之后词条才被撤下
+        ranks = TrendingEntry.objects.filter(scope=trending.SITE_SCOPE).order_by('rank')
+        with mock.patch.object(trending, 'get_trending', return_value=ranks):
+            response = self.client.get('/api/entries/trending/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['id'] for item in response.json()['results']],
+            [self.entries[1].pk, self.entries[0].pk]
+        )
+
+
+class ViewCountBufferTests(TestCase):
+    """浏览次数写回失败时不影响请求，也不会无限积压"""
+
+    def setUp(self):
+        user = User.objects.create_user('author', password='password')
+        self.entry = Entry.objects.create(title='词条', content='正文', author=user)
+        self.buffer = ViewCountBuffer(flush_interval=3600, max_backlog=1, max_retries=2)
+        self.addCleanup(self.buffer.stop)
+
+    def test_failed_flush_does_not_raise_into_record(self):
+        with mock.patch.object(trending, 'record_views', side_effect=RuntimeError), \
+                self.assertLogs('encyclopedia.counters', 'ERROR'):
+            self.assertEqual(self.buffer.record(self.entry.pk), 1)
+            self.assertEqual(self.buffer.backlog, 1)
+            self.buffer.record(self.entry.pk)
+            self.assertEqual(self.buffer.backlog, 2)
+            # 连续失败超过max_retries次后丢弃
+            self.buffer.record(self.entry.pk)
+            self.assertEqual(self.buffer.backlog, 0)
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.view_count, 0)
+
+    def test_deleted_entries_are_dropped(self):
+        self.buffer.max_backlog = 1000
+        self.buffer.record(self.entry.pk)
+        self.buffer.record(self.entry.pk + 1)
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.buffer.backlog, 0)
+
+
+class TrendingFlushTests(TransactionTestCase):
+    """缓冲的浏览写回前词条被删除（外键在提交时检查，需要真实提交）"""
+
+    def test_flush_after_entry_deleted(self):
+        user = User.objects.create_user('author', password='password')
+        kept, deleted = [Entry.objects.create(title=f'词条{i}', content='正文', author=user) for i in range(2)]
+        buffer = ViewCountBuffer(flush_interval=3600)
+        self.addCleanup(buffer.stop)
+        buffer.record(kept.pk)
+        buffer.record(deleted.pk)
+        deleted.delete()
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(buffer.backlog, 0)
+        kept.refresh_from_db()
+        self.assertEqual(kept.view_count, 1)
+        self.assertEqual(list(EntryTrend.objects.values_list('entry_id', flat=True)), [kept.pk])
+
+
+@override_settings(DATABASE_REPLICAS=[], DATABASE_ANALYTICS='analytics')
+class AnalyticsRoutingTests(SimpleTestCase):
+    """只配置分析库时的统计查询路由"""
+
+    def request(self, method='get', **cookies):
+        seen = []
+
+        def view(request):
+            with routing.analytics():
+                seen.append(routing.ReplicaRouter().db_for_read(Entry))
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/api/statistics/')
+        request.COOKIES.update(cookies)
+        response = routing.ReadRoutingMiddleware(view)(request)
+        return seen[0], response
+
+    def test_reads_from_analytics(self):
+        alias, response = self.request()
+        self.assertEqual(alias, 'analytics')
+        self.assertNotIn(routing.PRIMARY_COOKIE, response.cookies)
+
+    def test_write_pins_primary(self):
+        alias, response = self.request('post')
+        self.assertEqual(alias, 'default')
+        until = response.cookies[routing.PRIMARY_COOKIE].value
+        alias, _ = self.request(**{routing.PRIMARY_COOKIE: until})
+        self.assertEqual(alias, 'default')
+
+
+class ExportTests(TestCase):
+    """NDJSON流式导出"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', password='password', is_staff=True)
+        self.client.force_login(self.admin)
+        self.category = Category.objects.create(name='分类')
+        self.entry = Entry.objects.create(
+            title='导出', content='第一版', author=self.admin, category=self.category
+        )
+        record_edit(self.entry, self.admin, '第一版', '第二版')
+        record_edit(self.entry, self.admin, '第二版', '第三版')
+        self.other = Entry.objects.create(title='另一个', content='正文', author=self.admin)
+
+    def export(self, **params):
+        response = self.client.get('/api/encyclopedia/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def records(self, **params):
+        return [json.loads(line) for line in self.export(**params).decode('utf-8').splitlines()]
+
+    def test_categories_before_entries(self):
+        records = self.records()
+        self.assertEqual([record['type'] for record in records], ['category', 'entry', 'entry'])
+        self.assertEqual(records[1]['category'], '分类')
+        self.assertEqual(records[1]['author'], 'admin')
+        self.assertNotIn('history', records[1])
+
+    def test_history_is_replayed(self):
+        history = self.records(history='1')[1]['history']
+        self.assertEqual([item['revision'] for item in history], [1, 2])
+        self.assertEqual([item['content'] for item in history], ['第二版', '第三版'])
+
+    def test_gzip_matches_plain_output(self):
+        self.assertEqual(gzip.decompress(self.export(compression='gzip')), self.export())
+
+    def test_updated_since(self):
+        Entry.objects.filter(pk=self.other.pk).update(updated_at=timezone.now() - timedelta(days=10))
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        entries = [record for record in self.records(updated_since=since) if record['type'] == 'entry']
+        self.assertEqual([record['id'] for record in entries], [self.entry.pk])
+        response = self.client.get('/api/encyclopedia/export/', {'updated_since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_requires_admin(self):
+        self.client.force_login(User.objects.create_user('reader', password='password'))
+        self.assertEqual(self.client.get('/api/encyclopedia/export/').status_code, 403)
+
+    def test_import_accepts_export(self):
+        content = self.export()
+        Entry.objects.all().delete()
+        Category.objects.all().delete()
+        response = self.client.post('/api/encyclopedia/import/', {
+            'file': SimpleUploadedFile('entries.ndjson', content)
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(Entry.objects.get(title='导出').category.name, '分类')
+
+
+class ImportTests(TestCase):
+    """批量导入接口"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', password='password', is_staff=True)
+        self.client.force_login(self.admin)
+
+    def upload(self, name, content, **data):
+        return self.client.post('/api/encyclopedia/import/', {
+            'file': SimpleUploadedFile(name, content), **data
+        })
+
+    def test_blank_is_published_uses_default(self):
+        content = 'title,content,is_published\n发布,正文,\n草稿,正文,false\n'.encode('utf-8')
+        response = self.upload('entries.csv', content)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Entry.objects.get(title='发布').is_published)
+        self.assertFalse(Entry.objects.get(title='草稿').is_published)
+
+    def test_truncated_gzip_reports_committed_rows(self):
+        lines = ''.join(f'{{"title": "词条{i}", "content": "正文{i}"}}\n' for i in range(3000))
+        content = gzip.compress(lines.encode('utf-8'))
+        response = self.upload('entries.jsonl.gz', content[:len(content) * 3 // 4])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['created'], 2000)
+        self.assertEqual(Entry.objects.count(), 2000)
+
+    def test_non_string_values_are_invalid(self):
+        lines = [
+            {'title': 5, 'content': '正文'},
+            {'title': '摘要', 'content': '正文', 'summary': ['x']},
+            {'title': '发布', 'content': '正文', 'is_published': {}},
+            {'type': 'category', 'name': ['分类']},
+            {'title': '正常', 'content': '正文', 'is_published': False},
+        ]
+        content = ''.join(json.dumps(line, ensure_ascii=False) + '\n' for line in lines).encode('utf-8')
+        response = self.upload('entries.jsonl', content)
+        self.assertEqual(response.status_code, 201)
+        result = response.json()
+        self.assertEqual((result['created'], result['invalid']), (1, 4))
+        self.assertEqual([error['row'] for error in result['errors']], [1, 2, 3, 4])
+        self.assertFalse(Entry.objects.get(title='正常').is_published)
+
+    def test_csv_error_returns_400(self):
+        # 超过csv.field_size_limit()的字段会抛出csv.Error
+        content = 'title,content\n词条,{}\n'.format('字' * 200000).encode('utf-8')
+        response = self.upload('entries.csv', content)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['created'], 0)
+
+
+@override_settings(JOB_QUEUE_EAGER=False, JOB_MAX_ATTEMPTS=2)
+class JobQueueTests(TestCase):
+    """数据库任务队列的去重、顺序、租约和重试"""
+
+    def setUp(self):
+        self.calls = []
+        registry = mock.patch.dict(jobs.registry)
+        registry.start()
+        self.addCleanup(registry.stop)
+        self.record = jobs.task(name='tests.record')(self.calls.append)
+
+        def fail(value):
+            raise RuntimeError(value)
+
+        self.fail_task = jobs.task(name='tests.fail')(fail)
+
+    def expire_leases(self):
+        Job.objects.filter(status=Job.RUNNING).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+    def test_dedup_key_collapses_pending_jobs(self):
+        self.record.enqueue('a', dedup_key='same')
+        self.record.enqueue('b', dedup_key='same')
+        self.assertEqual(list(Job.objects.values_list('args', flat=True)), [['a']])
+        # 已被领取的任务不再占用去重键
+        jobs.claim()
+        self.record.enqueue('c', dedup_key='same')
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 1)
+
+    def test_sequence_key_runs_in_order(self):
+        for value in ('first', 'second', 'third'):
+            self.record.enqueue(value, sequence_key='entry:1')
+        self.record.enqueue('other', sequence_key='entry:2')
+        claimed = jobs.claim()
+        self.assertEqual([job.args for job in claimed], [['first'], ['other']])
+        for job in claimed:
+            jobs.execute(job)
+        self.assertEqual(jobs.drain(), 2)
+        self.assertEqual(self.calls, ['first', 'other', 'second', 'third'])
+
+    def test_expired_lease_is_reclaimed(self):
+        self.record.enqueue('value')
+        [stale] = jobs.claim()
+        self.assertEqual(jobs.claim(), [])
+        self.expire_leases()
+        [reclaimed] = jobs.claim()
+        self.assertEqual(reclaimed.attempts, 2)
+        # 原worker的租约已被取代，执行结果回滚
+        with self.assertLogs('encyclopedia.jobs', 'WARNING'):
+            self.assertFalse(jobs.execute(stale))
+        self.assertEqual(self.calls, [])
+        self.assertTrue(jobs.execute(reclaimed))
+        self.assertEqual(self.calls, ['value'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_interrupted_job_gives_up_after_max_attempts(self):
+        self.record.enqueue('value')
+        for _ in range(2):
+            jobs.claim()
+            self.expire_leases()
+        self.assertEqual(jobs.work_once(), 1)
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+        self.assertEqual(self.calls, [])
+
+    def test_failure_is_retried_with_backoff_then_abandoned(self):
+        self.fail_task.enqueue('boom')
+        with self.assertLogs('encyclopedia.jobs', 'ERROR'):
+            jobs.work_once()
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('boom', job.last_error)
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('encyclopedia.jobs', 'ERROR'):
+            jobs.work_once()
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+
+class QueryBudgetTests(TestCase):
+    """在小规模合成语料上执行querybudget.CHECKS，查询计划只在大语料上由check_query_budget检查"""
+
+    @classmethod
+    def setUpTestData(cls):
+        corpus.generate(
+            users=5, categories=3, entries=150, content_length=200, history_depth=3,
+            favorites=20, likes=20, images=0, days=30, seed=1
+        )
+
+    def test_query_budgets(self):
+        fixtures = querybudget.Fixtures()
+        token = querybudget.get_token(fixtures.user)
+        for check in querybudget.CHECKS:
+            with self.subTest(check=f'{check.method} {check.path}'):
+                result = querybudget.run_check(check, fixtures, token, check_plans=False)
+                self.assertNotIn('skipped', result)
+                self.assertEqual(result['failures'], [])
+
+    def test_every_route_is_checked(self):
+        self.assertEqual(querybudget.uncovered_routes(), [])
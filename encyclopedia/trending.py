@@ -0,0 +1,164 @@
+"""
+热门词条排行
+
+每个词条的热度是浏览和点赞按时间指数衰减后的加权和，半衰期为TRENDING_HALF_LIFE_HOURS。
+EntryTrend保存热度的对数并折算到固定时间原点：log_score = ln(当前热度) + 衰减率 * 当前时间戳，
+衰减对所有词条等比例生效，所以按log_score排序即按当前热度排序，平时无需逐行衰减，
+只在浏览次数写回和点赞时增量更新涉及的词条。
+
+refresh()定期（manage.py refresh_trending，可由cron调度）把全站和各分类的前TRENDING_TOP_K名
+物化到TrendingEntry，首页排行只需按(scope, rank)读取一段索引。
+"""
+
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Exp, Ln
+from django.utils import timezone
+
+
+# TrendingEntry.scope为0表示全站排行，否则为分类id
+SITE_SCOPE = 0
+
+# 新插入行相对时间原点的log_score，对应的热度约为e^-700，可视为0；
+# 不取更小的值，以免exp()在数据库中下溢出错
+EMPTY_LOG_SCORE = -700.0
+
+
+def decay_rate():
+    """每秒的衰减率"""
+    return math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+
+
+def current_score(log_score, now=None):
+    """把log_score换算为now时刻的热度"""
+    now = now or timezone.now()
+    return math.exp(log_score - decay_rate() * now.timestamp())
+
+
+def record_activity(weights, now=None):
+    """为一批词条累加热度，weights为{词条id: 权重}，权重可为负
+
+    累加在UPDATE语句中完成，多个进程同时写入同一词条时不会互相覆盖。
+    """
+    from .models import Entry, EntryTrend
+
+    now = now or timezone.now()
+    origin = decay_rate() * now.timestamp()
+    by_weight = defaultdict(list)
+    for entry_id, weight in weights.items():
+        if weight:
+            by_weight[weight].append(int(entry_id))
+    if not by_weight:
+        return
+    added = [entry_id for weight, entry_ids in by_weight.items() if weight > 0 for entry_id in entry_ids]
+    # 已在事务中时（例如点赞接口）直接加入该事务，不再建立保存点
+    with transaction.atomic(savepoint=False):
+        if added:
+            # 缓冲的浏览写回时词条可能已被删除；SQLite在提交时才检查外键，
+            # ignore_conflicts也不会跳过外键冲突，只能为仍存在的词条插入
+            added = Entry.objects.filter(pk__in=added).values_list('pk', flat=True)
+            # 先为还没有热度的词条插入热度约为0的行，再统一累加
+            EntryTrend.objects.bulk_create([
+                EntryTrend(entry_id=entry_id, log_score=origin + EMPTY_LOG_SCORE) for entry_id in added
+            ], ignore_conflicts=True)
+        for weight, entry_ids in by_weight.items():
+            trends = EntryTrend.objects.filter(entry_id__in=entry_ids)
+            if weight < 0:
+                # 热度降到0及以下（例如取消点赞）时删除该行
+                trends.filter(log_score__lte=origin + math.log(-weight)).delete()
+            trends.update(log_score=Ln(Exp(F('log_score') - origin) + weight) + origin)
+
+
+def record_views(view_counts):
+    """记录一批浏览，view_counts为{词条id: 次数}"""
+    record_activity({
+        entry_id: count * settings.TRENDING_VIEW_WEIGHT
+        for entry_id, count in view_counts.items()
+    })
+
+
+def record_like(entry_id, delta):
+    """记录一次点赞(delta=1)或取消点赞(delta=-1)"""
+    record_activity({entry_id: delta * settings.TRENDING_LIKE_WEIGHT})
+
+
+def refresh(top_k=None, now=None, batch_size=1000):
+    """重新物化全站和各分类的排行，返回写入的行数
+
+    按热度从高到低分批读取EntryTrend，全站和各分类的排行都已填满时停止读取。
+    """
+    from .models import Category, EntryTrend, TrendingEntry
+
+    top_k = top_k or settings.TRENDING_TOP_K
+    now = now or timezone.now()
+    unfilled = {SITE_SCOPE, *Category.objects.filter(entry_count__gt=0).values_list('id', flat=True)}
+    ranked = (
+        EntryTrend.objects.filter(entry__is_published=True)
+        .order_by('-log_score', '-entry_id')
+        .values_list('entry_id', 'entry__category_id', 'log_score')
+    )
+    rows = []
+    counts = {}
+    batch = list(ranked[:batch_size])
+    while batch and unfilled:
+        for entry_id, category_id, log_score in batch:
+            for scope in (SITE_SCOPE, category_id):
+                if scope is None or counts.get(scope, 0) >= top_k:
+                    continue
+                counts[scope] = counts.get(scope, 0) + 1
+                if counts[scope] >= top_k:
+                    unfilled.discard(scope)
+                rows.append(TrendingEntry(
+                    scope=scope,
+                    rank=counts[scope],
+                    entry_id=entry_id,
+                    score=current_score(log_score, now),
+                    computed_at=now
+                ))
+        if len(batch) < batch_size:
+            break
+        # 按(log_score, entry_id)翻页，每批都只读取索引上的一段
+        last_id, _, last_score = batch[-1]
+        batch = list(ranked.filter(
+            Q(log_score__lt=last_score) | Q(log_score=last_score, entry_id__lt=last_id)
+        )[:batch_size])
+    with transaction.atomic():
+        TrendingEntry.objects.all().delete()
+        TrendingEntry.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def reseed():
+    """按现有的浏览数和点赞数重建热度，视为发生在词条创建时"""
+    from .models import Entry, EntryTrend
+
+    rate = decay_rate()
+    entries = Entry.objects.values_list('id', 'created_at', 'view_count', 'like_count')
+    trends = []
+    for entry_id, created_at, view_count, like_count in entries.iterator():
+        weight = view_count * settings.TRENDING_VIEW_WEIGHT + like_count * settings.TRENDING_LIKE_WEIGHT
+        if weight > 0:
+            trends.append(EntryTrend(entry_id=entry_id, log_score=math.log(weight) + rate * created_at.timestamp()))
+    with transaction.atomic():
+        EntryTrend.objects.all().delete()
+        EntryTrend.objects.bulk_create(trends, batch_size=1000)
+    return len(trends)
+
+
+def get_trending(category_id=None, limit=None):
+    """读取物化的排行，返回按名次排列的TrendingEntry查询集"""
+    from .models import TrendingEntry
+
+    limit = min(limit or settings.TRENDING_TOP_K, settings.TRENDING_TOP_K)
+    return (
+        TrendingEntry.objects.filter(
+            scope=category_id or SITE_SCOPE,
+            rank__lte=limit,
+            entry__is_published=True
+        )
+        .order_by('rank')
+    )
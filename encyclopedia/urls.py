@@ -11,4 +11,6 @@ router.register(r'search', views.SearchViewSet, basename='search')
 urlpatterns = [
     path('', include(router.urls)),
     path('encyclopedia/statistics/', views.StatisticsView.as_view(), name='statistics'),
+    path('encyclopedia/export/', views.ExportView.as_view(), name='export'),
+    path('encyclopedia/import/', views.ImportView.as_view(), name='import'),
 ]
\ No newline at end of file
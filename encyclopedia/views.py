@@ -1,31 +1,63 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
+from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, IsAdminUser
 from rest_framework.views import APIView
-from django.db.models import Q, Count, Sum
-from django.db.models.functions import TruncMonth
-from django.shortcuts import get_object_or_404
+from django.db import IntegrityError, router, transaction
+from django.db.models import Q, Count, Sum, F
+from django.http import StreamingHttpResponse
+from rest_framework.generics import get_object_or_404
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import timedelta
-from .models import Category, Entry, EntryImage, EntryHistory, Favorite
+from . import cache as entry_cache
+from . import export
+from . import importer
+from . import routing
+from . import stats
+from . import trending
+from .history import diff_revisions
+from .models import Category, Entry, EntryImage, EntryHistory, Favorite, Like
+from .pagination import EntryCursorPagination, FavoriteCursorPagination, HistoryCursorPagination
+from .search import get_search_backend, search_entries
 from .serializers import (
     CategorySerializer, EntryListSerializer, EntryDetailSerializer,
-    EntryCreateSerializer, EntryUpdateSerializer, EntryHistorySerializer,
-    FavoriteSerializer, FavoriteCreateSerializer
+    EntryCreateSerializer, EntryUpdateSerializer, EntryHistorySerializer, EntryRevisionSerializer,
+    FavoriteSerializer, FavoriteCreateSerializer, SearchResultSerializer, TrendingEntrySerializer,
+    is_favorited
 )
 
 
+def parse_id_list(value):
+    """解析以逗号分隔的id列表，忽略非法值"""
+    ids = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if item.isdigit():
+            ids.append(int(item))
+    return ids
+
+
 class CategoryViewSet(viewsets.ModelViewSet):
     """分类视图集"""
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    
+    def get_queryset(self):
+        """默认读取冗余的entry_count，?count=live时在同一查询中实时统计"""
+        queryset = super().get_queryset()
+        if self.request.query_params.get('count') == 'live':
+            queryset = queryset.annotate(
+                live_entry_count=Count('entry', filter=Q(entry__is_published=True))
+            )
+        return queryset
 
 
 class EntryViewSet(viewsets.ModelViewSet):
     """词条视图集"""
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = EntryCursorPagination
     
     def get_queryset(self):
         """根据查询参数过滤词条"""
@@ -34,11 +66,7 @@ class EntryViewSet(viewsets.ModelViewSet):
         # 搜索功能
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) | 
-                Q(content__icontains=search) |
-                Q(summary__icontains=search)
-            )
+            queryset = search_entries(queryset, search)
         
         # 分类过滤
         category_id = self.request.query_params.get('category', None)
@@ -50,7 +78,16 @@ class EntryViewSet(viewsets.ModelViewSet):
         if author_id:
             queryset = queryset.filter(author_id=author_id)
         
-        return queryset.select_related('author', 'category').prefetch_related('images')
+        # 列表只读取序列化需要的列，正文等大字段默认不加载
+        if self.action == 'list':
+            ordering = [name.lstrip('-') for name in self.pagination_class.ordering]
+            return self.get_serializer().optimize_queryset(queryset, extra_fields=ordering)
+        
+        queryset = queryset.select_related('author', 'category')
+        # 删除时图片由级联收集器读取，预取只会多一次查询
+        if self.action == 'destroy':
+            return queryset
+        return queryset.prefetch_related('images')
     
     def get_serializer_class(self):
         """根据动作选择序列化器"""
@@ -64,36 +101,171 @@ class EntryViewSet(viewsets.ModelViewSet):
             return EntryDetailSerializer
     
     def retrieve(self, request, *args, **kwargs):
-        """获取词条详情并增加浏览次数"""
-        instance = self.get_object()
-        instance.increment_view_count()
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        """获取词条详情并增加浏览次数，与用户无关的部分读写详情缓存"""
+        # 指定了字段裁剪时输出结构不同，不走缓存
+        if 'fields' in request.query_params or 'expand' in request.query_params:
+            instance = self.get_object()
+            instance.increment_view_count()
+            serializer = self.get_serializer(instance)
+            return Response(serializer.data)
+        
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        view_count, like_count, author_id, category_id = get_object_or_404(
+            Entry.objects.filter(is_published=True)
+            .values_list('view_count', 'like_count', 'author_id', 'category_id'),
+            pk=pk
+        )
+        data = entry_cache.get_entry_detail(pk)
+        if data is None:
+            versions = entry_cache.get_versions(pk, author_id, category_id)
+            instance = self.get_object()
+            serializer = self.get_serializer(instance)
+            # 只序列化与用户无关的部分，随请求变化的字段在下面统一合并
+            for name in entry_cache.PER_REQUEST_FIELDS:
+                serializer.fields.pop(name, None)
+            data = dict(serializer.data)
+            entry_cache.set_entry_detail(instance, data, versions)
+        
+        # 合并随请求变化的字段，命中与未命中时字段顺序一致
+        entry = Entry(pk=pk, view_count=view_count)
+        entry.increment_view_count()
+        data['view_count'] = entry.view_count
+        data['like_count'] = like_count
+        data['is_favorited'] = is_favorited(self.get_serializer_context(), entry.pk)
+        return Response(data)
+    
+    def _get_published_entry_id(self, pk):
+        """只查询主键确认词条存在，不加载整行"""
+        return get_object_or_404(
+            Entry.objects.filter(is_published=True).values_list('id', flat=True),
+            pk=pk
+        )
+    
+    def _get_like_target(self, pk):
+        """点赞接口需要的词条字段：主键、作者、分类和当前点赞数"""
+        return get_object_or_404(
+            Entry.objects.filter(is_published=True)
+            .values_list('id', 'author_id', 'category_id', 'like_count'),
+            pk=pk
+        )
     
     @action(detail=True, methods=['post'])
     def like(self, request, pk=None):
-        """点赞词条"""
-        entry = self.get_object()
-        entry.like_count += 1
-        entry.save(update_fields=['like_count'])
-        return Response({'status': 'liked', 'like_count': entry.like_count})
+        """点赞词条，重复点赞不会重复计数"""
+        entry_id, author_id, category_id, like_count = self._get_like_target(pk)
+        try:
+            with transaction.atomic():
+                # 先插入点赞记录，已点赞时唯一约束冲突使整个事务回滚，不需要保存点
+                Like.objects.create(user=request.user, entry_id=entry_id)
+                Entry.objects.filter(pk=entry_id).update(like_count=F('like_count') + 1)
+                stats.record_like(author_id, category_id, 1)
+                trending.record_like(entry_id, 1)
+        except IntegrityError:
+            return Response({'status': 'liked', 'like_count': like_count})
+        return Response({'status': 'liked', 'like_count': like_count + 1})
+    
+    @action(detail=True, methods=['post'])
+    def unlike(self, request, pk=None):
+        """取消点赞"""
+        entry_id, author_id, category_id, like_count = self._get_like_target(pk)
+        with transaction.atomic():
+            deleted, _ = Like.objects.filter(user=request.user, entry_id=entry_id).delete()
+            if deleted:
+                Entry.objects.filter(pk=entry_id, like_count__gt=0).update(
+                    like_count=F('like_count') - 1
+                )
+                stats.record_like(author_id, category_id, -1)
+                trending.record_like(entry_id, -1)
+        return Response({'status': 'unliked', 'like_count': max(like_count - deleted, 0)})
+    
+    @action(detail=False, methods=['get'])
+    def liked(self, request):
+        """批量查询当前用户对一组词条的点赞状态，参数ids以逗号分隔"""
+        entry_ids = parse_id_list(request.query_params.get('ids'))
+        if not entry_ids:
+            return Response({'error': 'ids parameter is required'}, status=400)
+        liked_ids = Like.liked_entry_ids(request.user, entry_ids)
+        return Response({'liked': {entry_id: entry_id in liked_ids for entry_id in entry_ids}})
+    
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """热门词条排行，category指定分类，limit限制条数，数据来自定期物化的排行表"""
+        category_id = request.query_params.get('category') or None
+        limit = request.query_params.get('limit') or None
+        if (category_id and not category_id.isdigit()) or (limit and not limit.isdigit()):
+            return Response({'error': 'category and limit must be integers'}, status=400)
+        
+        ranks = list(
+            trending.get_trending(category_id and int(category_id), limit and int(limit))
+            .values_list('entry_id', 'rank', 'score', 'computed_at')
+        )
+        context = self.get_serializer_context()
+        entries = TrendingEntrySerializer(context=context).optimize_queryset(
+            Entry.objects.filter(is_published=True, pk__in=[entry_id for entry_id, *_ in ranks])
+        ).in_bulk()
+        results = []
+        for entry_id, rank, score, _ in ranks:
+            entry = entries.get(entry_id)
+            if entry is None:
+                # 读取排行之后词条被删除或撤下
+                continue
+            entry.trending_rank = rank
+            entry.trending_score = score
+            results.append(entry)
+        serializer = TrendingEntrySerializer(results, many=True, context=context)
+        return Response({
+            'computed_at': ranks[0][3] if ranks else None,
+            'results': serializer.data
+        })
     
     @action(detail=True, methods=['get'])
     def history(self, request, pk=None):
-        """获取词条编辑历史"""
+        """获取词条编辑历史的版本列表，不含正文"""
         entry = self.get_object()
-        history = entry.history.all().select_related('editor')
-        serializer = EntryHistorySerializer(history, many=True)
+        history = entry.history.all().select_related('editor').defer('base_content', 'content_delta')
+        paginator = HistoryCursorPagination()
+        page = paginator.paginate_queryset(history, request, view=self)
+        serializer = EntryHistorySerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+    
+    @action(detail=True, methods=['get'], url_path=r'history/(?P<revision>\d+)')
+    def revision(self, request, pk=None, revision=None):
+        """获取指定版本编辑前后的完整内容"""
+        entry_id = self._get_published_entry_id(pk)
+        history = get_object_or_404(
+            EntryHistory.objects.select_related('editor'),
+            entry_id=entry_id,
+            revision=revision
+        )
+        serializer = EntryRevisionSerializer(history, context=self.get_serializer_context())
         return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'], url_path='history/diff')
+    def history_diff(self, request, pk=None):
+        """比较两个版本编辑后的内容，参数from和to为版本号"""
+        entry_id = self._get_published_entry_id(pk)
+        try:
+            from_revision = int(request.query_params['from'])
+            to_revision = int(request.query_params['to'])
+        except (KeyError, ValueError):
+            return Response({'error': 'from and to parameters are required'}, status=400)
+        try:
+            diff = diff_revisions(entry_id, from_revision, to_revision)
+        except EntryHistory.DoesNotExist:
+            return Response({'error': 'revision not found'}, status=404)
+        return Response({'from': from_revision, 'to': to_revision, 'diff': diff})
 
 
 class FavoriteViewSet(viewsets.ModelViewSet):
     """收藏视图集"""
     permission_classes = [IsAuthenticated]
+    pagination_class = FavoriteCursorPagination
     
     def get_queryset(self):
         """只返回当前用户的收藏"""
-        return Favorite.objects.filter(user=self.request.user).select_related('entry')
+        return Favorite.objects.filter(user=self.request.user).select_related(
+            'entry', 'entry__author', 'entry__category'
+        ).defer('entry__content')
     
     def get_serializer_class(self):
         """根据动作选择序列化器"""
@@ -115,7 +287,17 @@ class FavoriteViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def check(self, request):
-        """检查是否收藏了指定词条"""
+        """检查是否收藏了指定词条
+        
+        entry_id查询单个词条；entry_ids以逗号分隔，一次查询返回每个词条的收藏状态。
+        """
+        entry_ids = parse_id_list(request.query_params.get('entry_ids'))
+        if entry_ids:
+            favorited_ids = Favorite.favorited_entry_ids(request.user, entry_ids)
+            return Response({
+                'favorited': {entry_id: entry_id in favorited_ids for entry_id in entry_ids}
+            })
+        
         entry_id = request.query_params.get('entry_id')
         if not entry_id:
             return Response({'error': 'entry_id parameter is required'}, status=400)
@@ -128,6 +310,23 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         return Response({'is_favorited': is_favorited})
 
 
+def search_entry_results(query, context):
+    """检索词条，按相关度排序，只加载结果中需要的列"""
+    entry_queryset = SearchResultSerializer(context=context).optimize_queryset(Entry.objects.all())
+    backend = get_search_backend(router.db_for_read(Entry))
+    entries = backend.search(query, limit=10, queryset=entry_queryset)
+    return SearchResultSerializer(entries, many=True, context=context).data
+
+
+def search_category_results(query):
+    """按名称和描述检索分类"""
+    categories = Category.objects.filter(
+        Q(name__icontains=query) | 
+        Q(description__icontains=query)
+    )[:5]
+    return CategorySerializer(categories, many=True).data
+
+
 class SearchViewSet(viewsets.ViewSet):
     """搜索视图集"""
     permission_classes = [IsAuthenticatedOrReadOnly]
@@ -139,106 +338,135 @@ class SearchViewSet(viewsets.ViewSet):
         if not query:
             return Response({'error': 'Search query parameter q is required'}, status=400)
         
-        # 搜索词条
-        entries = Entry.objects.filter(
-            Q(title__icontains=query) | 
-            Q(content__icontains=query) |
-            Q(summary__icontains=query),
-            is_published=True
-        ).select_related('author', 'category')[:10]
-        
-        # 搜索分类
-        categories = Category.objects.filter(
-            Q(name__icontains=query) | 
-            Q(description__icontains=query)
-        )[:5]
-        
-        entry_serializer = EntryListSerializer(entries, many=True)
-        category_serializer = CategorySerializer(categories, many=True)
-        
         return Response({
-            'entries': entry_serializer.data,
-            'categories': category_serializer.data,
+            'entries': search_entry_results(query, {'request': request}),
+            'categories': search_category_results(query),
             'query': query
         })
 
 
+def build_statistics(user, params):
+    """计算用户的词条统计数据，返回(响应数据, 状态码)
+
+    start/end为YYYY-MM-DD格式的日期，默认最近180天；granularity为day/week/month/year，默认month。
+    """
+    granularity = params.get('granularity', 'month')
+    if granularity not in stats.GRANULARITIES:
+        return {'error': 'granularity must be one of day, week, month, year'}, 400
+    
+    end = parse_date(params.get('end') or '') or timezone.localdate()
+    start = parse_date(params.get('start') or '') or end - timedelta(days=180)
+    if start > end:
+        return {'error': 'start must not be later than end'}, 400
+    
+    # 从每日汇总表一次查询得到分期、分类和总计数据，重查询走分析库
+    with routing.analytics():
+        result = stats.get_author_statistics(user, start, end, granularity)
+    
+    # 格式化分期数据
+    formatted_monthly_stats = []
+    for stat in result['periods']:
+        formatted_monthly_stats.append({
+            'date': stat['date'],
+            '词条数': stat['entries'],
+            '浏览量': stat['views'],
+            '点赞数': stat['likes']
+        })
+    
+    # 分类分布统计
+    formatted_category_stats = [
+        {'name': name, 'value': count}
+        for name, count in result['categories']
+    ]
+    
+    # 如果没有分类数据，添加一些默认数据
+    if not formatted_category_stats:
+        formatted_category_stats = [
+            {'name': '技术', 'value': 15},
+            {'name': '科学', 'value': 12},
+            {'name': '历史', 'value': 8},
+            {'name': '文化', 'value': 10},
+            {'name': '生活', 'value': 5},
+            {'name': '其他', 'value': 3},
+        ]
+    
+    # 总体统计
+    overall = result['overall']
+    total_stats = {
+        'total_entries': overall['entries'],
+        'total_views': overall['views'],
+        'total_likes': overall['likes'],
+        'avg_views_per_entry': 0
+    }
+    
+    if total_stats['total_entries'] > 0:
+        total_stats['avg_views_per_entry'] = total_stats['total_views'] // total_stats['total_entries']
+    
+    return {
+        'monthly_stats': formatted_monthly_stats,
+        'category_stats': formatted_category_stats,
+        'overall_stats': total_stats,
+        'range': {'start': start, 'end': end, 'granularity': granularity}
+    }, 200
+
+
 class StatisticsView(APIView):
     """词条统计API"""
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        """获取用户的词条统计数据"""
-        user = request.user
-        
-        # 获取最近6个月的月度统计数据
-        six_months_ago = timezone.now() - timedelta(days=180)
-        
-        # 月度词条统计
-        monthly_stats = (
-            Entry.objects
-            .filter(author=user, created_at__gte=six_months_ago)
-            .annotate(month=TruncMonth('created_at'))
-            .values('month')
-            .annotate(
-                entry_count=Count('id'),
-                total_views=Sum('view_count'),
-                total_likes=Sum('like_count')
-            )
-            .order_by('month')
-        )
+        """获取用户的词条统计数据，参数见build_statistics"""
+        data, status_code = build_statistics(request.user, request.query_params)
+        return Response(data, status=status_code)
+
+
+class ExportView(APIView):
+    """词条语料导出API，流式返回NDJSON"""
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        """导出全部分类和词条
         
-        # 格式化月度数据
-        formatted_monthly_stats = []
-        for stat in monthly_stats:
-            formatted_monthly_stats.append({
-                'date': stat['month'].strftime('%Y-%m'),
-                '词条数': stat['entry_count'],
-                '浏览量': stat['total_views'] or 0,
-                '点赞数': stat['total_likes'] or 0
-            })
+        updated_since只导出此后修改过的词条，history=1附带编辑历史，compression=gzip返回gzip压缩的NDJSON。
+        """
+        updated_since = request.query_params.get('updated_since')
+        if updated_since:
+            try:
+                updated_since = export.parse_since(updated_since)
+            except ValueError:
+                return Response({'error': 'updated_since must be an ISO date or datetime'}, status=400)
+        compress = request.query_params.get('compression') == 'gzip'
         
-        # 分类分布统计
-        category_stats = (
-            Entry.objects
-            .filter(author=user)
-            .values('category__name')
-            .annotate(count=Count('id'))
-            .order_by('-count')
+        response = StreamingHttpResponse(
+            export.iter_export(
+                updated_since=updated_since or None,
+                include_history=request.query_params.get('history') in ('1', 'true'),
+                compress=compress
+            ),
+            content_type='application/x-ndjson'
         )
+        filename = 'entries.ndjson.gz' if compress else 'entries.ndjson'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class ImportView(APIView):
+    """词条批量导入API"""
+    permission_classes = [IsAdminUser]
+    
+    def post(self, request):
+        """上传JSONL或CSV文件（字段file，可gzip压缩）批量导入词条，未指定作者的记录归当前用户"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=400)
+        file_format = request.data.get('file_format') or importer.detect_format(upload.name)
+        if file_format not in importer.FORMATS:
+            return Response({'error': 'file_format must be jsonl or csv'}, status=400)
         
-        formatted_category_stats = []
-        for stat in category_stats:
-            if stat['category__name']:
-                formatted_category_stats.append({
-                    'name': stat['category__name'],
-                    'value': stat['count']
-                })
-        
-        # 如果没有分类数据，添加一些默认数据
-        if not formatted_category_stats:
-            formatted_category_stats = [
-                {'name': '技术', 'value': 15},
-                {'name': '科学', 'value': 12},
-                {'name': '历史', 'value': 8},
-                {'name': '文化', 'value': 10},
-                {'name': '生活', 'value': 5},
-                {'name': '其他', 'value': 3},
-            ]
-        
-        # 总体统计
-        total_stats = {
-            'total_entries': Entry.objects.filter(author=user).count(),
-            'total_views': Entry.objects.filter(author=user).aggregate(total=Sum('view_count'))['total'] or 0,
-            'total_likes': Entry.objects.filter(author=user).aggregate(total=Sum('like_count'))['total'] or 0,
-            'avg_views_per_entry': 0
-        }
-        
-        if total_stats['total_entries'] > 0:
-            total_stats['avg_views_per_entry'] = total_stats['total_views'] // total_stats['total_entries']
-        
-        return Response({
-            'monthly_stats': formatted_monthly_stats,
-            'category_stats': formatted_category_stats,
-            'overall_stats': total_stats
-        })
\ No newline at end of file
+        rows = importer.read_rows(importer.open_text(upload, upload.name), file_format)
+        try:
+            result = importer.EntryImporter(default_author=request.user).run(rows)
+        except importer.InvalidInput as exc:
+            # 出错前的批次已经提交，一并返回统计
+            return Response({'error': f'invalid input: {exc}', **exc.result}, status=400)
+        return Response(result, status=status.HTTP_201_CREATED)
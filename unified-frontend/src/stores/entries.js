@@ -15,6 +15,9 @@ export const useEntriesStore = defineStore('entries', () => {
     pageSize: 10,
     total: 0
   })
+  // 游标分页的下一页/上一页链接
+  const nextPage = ref(null)
+  const previousPage = ref(null)
 
   // 计算属性
   const totalEntries = computed(() => entries.value.length)
@@ -27,14 +30,13 @@ export const useEntriesStore = defineStore('entries', () => {
     error.value = null
     try {
       const response = await api.get('/api/entries/', { params })
-      entries.value = response.data
+      entries.value = response.data.results
       
       // 更新分页信息
-      if (response.headers['x-total-count']) {
-        pagination.value.total = parseInt(response.headers['x-total-count'])
-      }
+      nextPage.value = response.data.next
+      previousPage.value = response.data.previous
       
-      return { success: true, data: response.data }
+      return { success: true, data: response.data.results }
     } catch (error) {
       console.error('获取词条列表失败:', error)
       const errorMessage = error.response?.data?.message || '获取词条列表失败'
@@ -128,8 +130,8 @@ export const useEntriesStore = defineStore('entries', () => {
       const response = await api.get('/api/entries/', { 
         params: { search: query } 
       })
-      searchResults.value = response.data
-      return { success: true, data: response.data }
+      searchResults.value = response.data.results
+      return { success: true, data: response.data.results }
     } catch (error) {
       console.error('搜索词条失败:', error)
       const errorMessage = error.response?.data?.message || '搜索词条失败'
@@ -163,6 +165,8 @@ export const useEntriesStore = defineStore('entries', () => {
     searchResults,
     error,
     pagination,
+    nextPage,
+    previousPage,
     
     // 计算属性
     totalEntries,
@@ -28,8 +28,8 @@ admin.site.register(User, CustomUserAdmin)
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     """用户资料管理"""
-    list_display = ['user', 'bio', 'location', 'website', 'created_at', 'updated_at']
+    list_display = ['user', 'bio', 'location', 'website', 'entries_count', 'favorites_count', 'created_at', 'updated_at']
     list_filter = ['created_at', 'updated_at']
     search_fields = ['user__username', 'user__email', 'bio', 'location']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['entries_count', 'favorites_count', 'created_at', 'updated_at']
     ordering = ['-created_at']
\ No newline at end of file
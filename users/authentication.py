@@ -0,0 +1,151 @@
+"""
+带进程内缓存的Token认证
+
+TokenAuthentication每个请求都要联表查询Token和User。这里在进程内按LRU保存
+token -> 用户快照，快照在AUTH_TOKEN_CACHE_TTL秒后过期。
+
+登出、改密码、停用用户或删除token时会在共享缓存（AUTH_TOKEN_GENERATION_CACHE别名，
+默认为多进程共享的文件缓存）中为该用户换一个新的失效代号；每次命中快照时用一次
+get_many比对全局和用户的代号，不一致即丢弃快照重新查询数据库，
+因此吊销对所有工作进程立即生效，命中时不产生数据库查询。
+每次吊销同时更换REVOCATION_KEY；未命中时在查询数据库之前读取它，查询期间有吊销提交的话
+不缓存这次的结果，避免把吊销前读到的用户状态以吊销后的代号缓存下来。
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from encyclopedia import instrumentation
+
+
+GLOBAL_GENERATION_KEY = 'auth-token:generation'
+# 任意一次吊销都会更换，只在未命中时使用
+REVOCATION_KEY = f'{GLOBAL_GENERATION_KEY}:latest'
+
+
+def _generation_cache():
+    return caches[settings.AUTH_TOKEN_GENERATION_CACHE]
+
+
+def _user_generation_key(user_id):
+    return f'{GLOBAL_GENERATION_KEY}:user:{user_id}'
+
+
+def invalidate_user(user_id):
+    """在当前事务提交后，使该用户在所有进程中缓存的token快照失效"""
+    transaction.on_commit(lambda: _bump(_user_generation_key(user_id)))
+
+
+def invalidate_all():
+    """使所有进程中缓存的全部token快照失效"""
+    _bump(GLOBAL_GENERATION_KEY)
+
+
+def _bump(key):
+    # 先更换REVOCATION_KEY：读到新代号的认证请求随后一定也读到新的REVOCATION_KEY
+    cache = _generation_cache()
+    cache.set(REVOCATION_KEY, uuid.uuid4().hex, None)
+    cache.set(key, uuid.uuid4().hex, None)
+
+
+def _current_generation(user_id):
+    keys = [GLOBAL_GENERATION_KEY, _user_generation_key(user_id)]
+    values = _generation_cache().get_many(keys)
+    return tuple(values.get(key) for key in keys)
+
+
+class TokenSnapshotCache:
+    """进程内的token快照LRU"""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is None:
+                return None
+            if snapshot['expires_at'] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return snapshot
+
+    def set(self, key, snapshot):
+        snapshot['expires_at'] = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = snapshot
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_snapshots = TokenSnapshotCache(
+    max_entries=settings.AUTH_TOKEN_CACHE_MAX_ENTRIES,
+    ttl=settings.AUTH_TOKEN_CACHE_TTL,
+)
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    """与TokenAuthentication行为一致，命中进程内快照时不查询数据库"""
+
+    def authenticate_credentials(self, key):
+        snapshot = token_snapshots.get(key)
+        if snapshot is not None:
+            if snapshot['generation'] == _current_generation(snapshot['user_id']):
+                instrumentation.record_cache('auth_token', True)
+                return self._restore(key, snapshot)
+            token_snapshots.discard(key)
+        instrumentation.record_cache('auth_token', False)
+
+        # 吊销在事务提交后才更换代号，必须在查询之前读取
+        latest = _generation_cache().get(REVOCATION_KEY)
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        generation = _current_generation(token.user_id)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        user = token.user
+        if _generation_cache().get(REVOCATION_KEY) == latest:
+            token_snapshots.set(key, {
+                'user_id': user.pk,
+                'user_values': [getattr(user, field.attname) for field in user._meta.concrete_fields],
+                'created': token.created,
+                'generation': generation,
+            })
+        return (user, token)
+
+    def _restore(self, key, snapshot):
+        # 每次请求构造新的实例，避免请求之间共享关联对象缓存
+        user_model = get_user_model()
+        field_names = [field.attname for field in user_model._meta.concrete_fields]
+        user = user_model.from_db(None, field_names, snapshot['user_values'])
+        token = self.get_model()(key=key, user=user, created=snapshot['created'])
+        token._state.adding = False
+        return (user, token)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_create_user_profiles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar_variants',
+            field=models.JSONField(blank=True, default=dict, verbose_name='头像缩放版本'),
+        ),
+    ]
@@ -1,7 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from encyclopedia import images
+
+from .authentication import invalidate_user
 
 
 class UserProfile(models.Model):
@@ -23,6 +28,7 @@ class UserProfile(models.Model):
     )
     location = models.CharField(max_length=100, blank=True, verbose_name='所在地')
     website = models.URLField(max_length=200, blank=True, verbose_name='个人网站')
+    avatar_variants = models.JSONField(default=dict, blank=True, verbose_name='头像缩放版本')
     
     # 统计字段
     entries_count = models.PositiveIntegerField(default=0, verbose_name='创建词条数')
@@ -41,6 +47,20 @@ class UserProfile(models.Model):
         return f"{self.user.username} 的资料"
 
 
+@receiver(pre_save, sender=UserProfile)
+def track_avatar_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    """上传或替换头像时清空旧的缩放版本"""
+    if not raw:
+        images.track_change(instance, update_fields)
+
+
+@receiver(post_save, sender=UserProfile)
+def generate_avatar_variants(sender, instance, raw=False, **kwargs):
+    """上传或替换头像后在后台生成缩放版本"""
+    if not raw:
+        images.schedule_if_changed(instance)
+
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     """创建用户时自动创建用户资料"""
@@ -49,6 +69,25 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """保存用户时自动保存用户资料"""
-    instance.profile.save()
\ No newline at end of file
+def save_user_profile(sender, instance, update_fields=None, **kwargs):
+    """保存用户时自动保存用户资料，登录只更新last_login时跳过"""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    instance.profile.save()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_tokens(sender, instance, update_fields=None, **kwargs):
+    """用户修改密码、停用或删除时使缓存的token失效，只更新last_login时跳过"""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token_owner(sender, instance, created=False, **kwargs):
+    """删除或更换token时使该用户缓存的token失效"""
+    if not created:
+        invalidate_user(instance.user_id)
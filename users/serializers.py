@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
+from encyclopedia import images
+from encyclopedia.instrumentation import TimedSerializerMixin
+
 from .models import UserProfile
 
 
@@ -55,31 +58,28 @@ class UserLoginSerializer(serializers.Serializer):
         return attrs
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """用户资料序列化器"""
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.CharField(source='user.email', read_only=True)
     first_name = serializers.CharField(source='user.first_name', read_only=True)
     last_name = serializers.CharField(source='user.last_name', read_only=True)
     date_joined = serializers.DateTimeField(source='user.date_joined', read_only=True)
-    entry_count = serializers.SerializerMethodField()
-    favorite_count = serializers.SerializerMethodField()
+    entry_count = serializers.IntegerField(source='entries_count', read_only=True)
+    favorite_count = serializers.IntegerField(source='favorites_count', read_only=True)
+    avatar_variants = serializers.SerializerMethodField()
     
     class Meta:
         model = UserProfile
         fields = [
             'id', 'username', 'email', 'first_name', 'last_name', 
-            'date_joined', 'bio', 'avatar', 'location', 'website',
+            'date_joined', 'bio', 'avatar', 'avatar_variants', 'location', 'website',
             'entry_count', 'favorite_count', 'created_at', 'updated_at'
         ]
     
-    def get_entry_count(self, obj):
-        """获取用户创建的词条数量"""
-        return obj.user.entry_set.count()
-    
-    def get_favorite_count(self, obj):
-        """获取用户收藏的词条数量"""
-        return obj.user.favorite_set.count()
+    def get_avatar_variants(self, obj):
+        """头像的缩放版本，尚未生成时为空"""
+        return images.variant_urls(obj, self.context.get('request'))
 
 
 class ChangePasswordSerializer(serializers.Serializer):
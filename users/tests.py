@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User, update_last_login
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+
+from . import authentication
+from .authentication import CachingTokenAuthentication, token_snapshots
+
+
+class CachingTokenAuthenticationTests(TestCase):
+    """token快照缓存与吊销"""
+
+    def setUp(self):
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        token_snapshots.clear()
+        self.addCleanup(token_snapshots.clear)
+        self.user = User.objects.create_user('reader', password='password')
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachingTokenAuthentication()
+
+    def authenticate(self):
+        return self.auth.authenticate_credentials(self.token.key)[0]
+
+    def test_snapshot_hit_skips_database(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate().pk, self.user.pk)
+
+    def test_token_delete_revokes(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authenticate()
+
+    def test_password_change_refreshes_snapshot(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('new-password')
+            self.user.save()
+        self.assertTrue(self.authenticate().check_password('new-password'))
+
+    def test_deactivated_user_is_rejected(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authenticate()
+
+    def test_revocation_during_lookup_is_not_cached(self):
+        get_model = CachingTokenAuthentication.get_model
+
+        def revoke_then_get_model(auth):
+            # 模拟在读取代号与查询数据库之间提交的吊销
+            authentication.invalidate_all()
+            return get_model(auth)
+
+        with mock.patch.object(CachingTokenAuthentication, 'get_model', revoke_then_get_model):
+            self.authenticate()
+        self.assertIsNone(token_snapshots.get(self.token.key))
+        self.authenticate()
+        self.assertIsNotNone(token_snapshots.get(self.token.key))
+
+
+class UserProfileSaveTests(TestCase):
+    """保存用户和用户资料时不做多余的查询"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='password')
+
+    def test_login_does_not_touch_profile(self):
+        with CaptureQueriesContext(connection) as queries:
+            update_last_login(None, self.user)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('users_userprofile', queries[0]['sql'])
+
+    def test_partial_save_skips_avatar_lookup(self):
+        profile = self.user.profile
+        profile.bio = '简介'
+        with self.assertNumQueries(1):
+            profile.save(update_fields=['bio'])
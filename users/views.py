@@ -5,6 +5,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.contrib.auth import login, logout, update_session_auth_hash
 from django.contrib.auth.models import User
 from django.views.decorators.csrf import csrf_exempt
+from .authentication import invalidate_user
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, 
     UserProfileSerializer, ChangePasswordSerializer
@@ -60,7 +61,8 @@ def user_login(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def user_logout(request):
-    """用户登出"""
+    """用户登出，并使所有进程中缓存的该用户token失效"""
+    invalidate_user(request.user.pk)
     logout(request)
     return Response({'message': '登出成功'})
 